@@ -1,7 +1,14 @@
+# Patch the standard library before anything else is imported so Redis sockets and
+# locks cooperate with the eventlet server used by Flask-SocketIO
+import eventlet
+eventlet.monkey_patch()
+from eventlet import tpool
+
 from flask import Flask, request, jsonify, send_file, send_from_directory, redirect
 from flask_cors import CORS
 import util.gpt as gpt 
 import util.llm_modules as llm
+import shutil
 from pathlib import Path
 import os
 import re
@@ -17,19 +24,20 @@ from datetime import datetime, timedelta
 import hashlib
 import secrets
 import logging
-from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
 from flask import after_this_request
 from util import redis_api, user_logging
 import util.user_logging
 import socketio
-import eventlet
 import random
 import util.youtube_music as youtube_music
 from io import BytesIO
 from PIL import Image
 import util.redis_api as redis_api
+from util.redis_pool import get_redis_client
+from util.log_policy import log_event, log_payload
+from util.room_throttle import RoomThrottle
 from util.redis_api import *
-import redis
 import util.all_utils as all_utils
 from util.all_utils import *
 from util.generation import *
@@ -41,7 +49,7 @@ from routes.activity_routes import activity_routes
 from routes.payment_routes import payment_routes
 from routes.coin_routes import coin_routes
 from placeholder import init_placeholder_routes
-from util.coin_manager import get_user_coins, set_user_coins, add_user_coins, use_user_coins
+from util.coin_manager import get_user_coins, set_user_coins, transfer_coins
 
 # Import the example prompts
 from data.example_prompts import EXAMPLE_PROMPTS
@@ -56,7 +64,7 @@ log_path = Path(__file__).parent.parent / "logs" / "backend.online.log"
 logger_setup(log_path=log_path, debug=True)
 logger = logging.getLogger(__name__)
 
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+redis_client = get_redis_client()
 
 redis_version = '_v1'
 
@@ -88,20 +96,42 @@ AVATARS_DIR = STATIC_DIR / 'avatars'
 AVATARS_DIR.mkdir(parents=True, exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-# Initialize SocketIO with Flask app
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
-
-# Store room player state
-# Store room player state
+# Initialize SocketIO with Flask app. When several worker processes serve the app, set
+# SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0) so emits reach clients connected to
+# any worker; the load balancer must keep each client on one worker (sticky sessions).
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', message_queue=SOCKETIO_MESSAGE_QUEUE)
+
+# Room player states live in Redis (room_player_states_v1); room_player_states is this
+# worker's read-through cache of them. Entries are trusted for PLAYER_STATE_CACHE_TTL
+# seconds after they were read or written by this worker, and dropped once none of the
+# worker's clients is in the room.
+PLAYER_STATE_CACHE_TTL = float(os.environ.get('PLAYER_STATE_CACHE_TTL', 1))
 room_player_states = {}
+room_player_state_fetched_at = {}
+
+def get_cached_player_state(room_name):
+    """Get a room's player state from the local cache, reading through to Redis when stale."""
+    fetched_at = room_player_state_fetched_at.get(room_name)
+    if fetched_at is not None and time.monotonic() - fetched_at < PLAYER_STATE_CACHE_TTL:
+        return room_player_states.get(room_name)
+    player_state = redis_api.get_room_player_state(room_name)
+    if player_state:
+        room_player_states[room_name] = player_state
+    else:
+        room_player_states.pop(room_name, None)
+    room_player_state_fetched_at[room_name] = time.monotonic()
+    return player_state
 
 @socketio.on('connect')
 def handle_connect():
-    logger.info(f"Client connected: {request.sid}")
+    log_event(logger, 'socket_connect', sid=request.sid)
     
 @socketio.on('disconnect')
 def handle_disconnect():
-    logger.info(f"Client disconnected: {request.sid}")
+    log_event(logger, 'socket_disconnect', sid=request.sid)
+    # The client leaves its rooms after this handler returns, so check them afterwards
+    socketio.start_background_task(forget_idle_rooms, [room for room in rooms() if room != request.sid])
 
 @socketio.on('join_room')
 def handle_join_room(data):
@@ -109,7 +139,7 @@ def handle_join_room(data):
     is_host = data.get('is_host', False)
     username = data.get('username', 'Guest')
     
-    logger.info(f"User {username} joining room {room_name}, is_host: {is_host}")
+    log_event(logger, 'socket_join_room', room=room_name, username=username, is_host=is_host)
     
     # Join the socket room
     join_room(room_name)
@@ -122,8 +152,9 @@ def handle_join_room(data):
     }, room=room_name)
     
     # Send current player state to the joining client if exists
-    if room_name in room_player_states:
-        emit('player_state_update', room_player_states[room_name])
+    current_state = get_cached_player_state(room_name)
+    if current_state:
+        emit('player_state_update', current_state)
     
     # Log user activity if it's a registered user (not a guest)
     if username != 'Guest':
@@ -138,9 +169,10 @@ def handle_join_room(data):
 def handle_leave_room(data):
     room_name = data.get('room_name')
     username = data.get('username', 'Guest')
-    logger.info(f"User {username} leaving room {room_name}")
+    log_event(logger, 'socket_leave_room', room=room_name, username=username)
     
     leave_room(room_name)
+    forget_idle_rooms([room_name])
     emit('user_left', {
         'username': username,
         'message': f"{username} left the room"
@@ -154,27 +186,126 @@ def handle_leave_room(data):
             room_name=room_name
         )
 
+# Player state events from hosts (seek, progress) can arrive several times per second.
+# Bursts are coalesced per room: clients get at most PLAYER_STATE_MAX_BROADCASTS_PER_SEC
+# updates per second. Position updates reach Redis at most every PLAYER_STATE_PERSIST_INTERVAL
+# seconds, always with the latest state; track changes and play/pause are written at once.
+PLAYER_STATE_MAX_BROADCASTS_PER_SEC = float(os.environ.get('PLAYER_STATE_MAX_BROADCASTS_PER_SEC', 4))
+PLAYER_STATE_PERSIST_INTERVAL = float(os.environ.get('PLAYER_STATE_PERSIST_INTERVAL', 2))
+
+def _broadcast_player_state(room_name, player_state):
+    socketio.emit('player_state_update', player_state, room=room_name)
+
+def _persist_player_state(room_name, state):
+    redis_api.update_room_player_state(room_name, state['state'], state['position'],
+                                       index=state['index'], player_state=state)
+
+player_state_broadcasts = RoomThrottle(socketio, 1.0 / PLAYER_STATE_MAX_BROADCASTS_PER_SEC,
+                                       _broadcast_player_state, name='player_state_broadcast')
+player_state_writes = RoomThrottle(socketio, PLAYER_STATE_PERSIST_INTERVAL,
+                                   _persist_player_state, name='player_state_persist')
+
+# Every playlist change is pushed to the room as a versioned playlist_delta event; clients
+# patch their copy and re-fetch /api/room-playlist only when they see a version gap
+def _emit_playlist_delta(room_name, delta):
+    socketio.emit('playlist_delta', dict(delta, room_name=room_name), room=room_name)
+
+redis_api.add_playlist_listener(_emit_playlist_delta)
+
+# A song replayed in a room within this many seconds is not logged as a new play
+PLAY_LOG_DEDUP_SECONDS = 3600
+
+# Last (track, video, time) a play was logged for, per room, so repeated "playing" events
+# for the same track do not start the play-logging task. Cleared when playback pauses and
+# when nobody on this worker is left in the room
+last_logged_tracks = {}
+
+def _room_has_local_clients(room_name):
+    """Check whether any client connected to this worker is in the room."""
+    return next(socketio.server.manager.get_participants('/', room_name), None) is not None
+
+def forget_idle_rooms(room_names):
+    """Drop this worker's per-room state for rooms none of its clients are in any more."""
+    for room_name in room_names:
+        try:
+            if _room_has_local_clients(room_name):
+                continue
+            last_logged_tracks.pop(room_name, None)
+            room_player_states.pop(room_name, None)
+            room_player_state_fetched_at.pop(room_name, None)
+            player_state_broadcasts.forget(room_name)
+            player_state_writes.forget(room_name)
+        except Exception as e:
+            logger.error(f"Error forgetting idle room {room_name}: {str(e)}")
+
+def _log_room_play(room_name, username, current_track, video_id, position):
+    """Log a song play and bump its play count (runs as a background task)."""
+    try:
+        # Use the room host as username for guests
+        if not username or username.lower() == 'guest':
+            try:
+                host_data = redis_client.hgetall(f"room_host{redis_version}:{room_name}")
+                if host_data and b'username' in host_data:
+                    username = host_data[b'username'].decode('utf-8')
+            except Exception as e:
+                logger.error(f"Error getting room host: {str(e)}")
+        
+        # Look up only the song at currentTrack instead of decoding the whole playlist
+        current_song = redis_api.get_playlist_track_at(room_name, current_track)
+        
+        if not current_song and not video_id:
+            return
+        
+        # Use actual username if available, otherwise use 'guest'
+        log_username = username if username and username.lower() != 'guest' else 'guest'
+        song_id = current_song.get('song_id') if current_song else video_id
+        
+        # Check if this song was recently logged to avoid duplicate logs (also across processes)
+        last_played_key = f"last_played:{room_name}"
+        last_played = redis_client.get(last_played_key)
+        
+        # Only log if this is a different song than the last one played in this room
+        if last_played and last_played.decode('utf-8') == song_id:
+            return
+        
+        # Update the last played song for this room
+        redis_client.set(last_played_key, song_id, ex=PLAY_LOG_DEDUP_SECONDS)
+        
+        # Log the play action
+        title = current_song.get('title', '') if current_song else 'Unknown'
+        artist = current_song.get('artist', '') if current_song else 'Unknown'
+        
+        log_event(logger, 'song_play_logged', room=room_name, username=log_username, song_id=song_id)
+        
+        # Log the play action using user_logging module
+        user_logging.log_user_activity(
+            username=log_username,
+            action="play_song",
+            song_id=song_id,
+            room_name=room_name,
+            details={
+                "title": title,
+                "artist": artist,
+                "position": position
+            }
+        )
+        
+        # Increment play count in Redis
+        redis_api.increment_song_play_count(song_id, title=title, artist=artist)
+    except Exception as e:
+        logger.error(f"Error logging play for room {room_name}: {str(e)}")
+
 @socketio.on('player_state_change')
 def handle_player_state_change(data):
     """Handle player state changes (play, pause, etc.)"""
     try:
         room_name = data.get('room_name')
         username = data.get('username')
+        if not room_name:
+            return
         
-        # Log the data for debugging
-        logger.info(f"Player state change: {data}")
-        
-        # Try to get username from the socket session
-        if not username or username.lower() == 'guest':
-            # Get username from the room host data
-            if room_name:
-                try:
-                    host_data = redis_client.hgetall(f"room_host{redis_version}:{room_name}")
-                    if host_data and b'username' in host_data:
-                        username = host_data[b'username'].decode('utf-8')
-                        logger.info(f"Using room host as username: {username}")
-                except Exception as e:
-                    logger.error(f"Error getting room host: {str(e)}")
+        # Full payloads only go to the DEBUG payload log; the event itself is sampled
+        log_payload(logger, 'player_state_change', data)
         
         # Check for both state and player_state for backward compatibility
         player_state = data.get('player_state', {})
@@ -185,62 +316,37 @@ def handle_player_state_change(data):
         
         # Convert isPlaying to state format
         state = "playing" if is_playing else "paused"
-        
-        # Update the room's player state in Redis
-        redis_api.update_room_player_state(room_name, state, position)
-        
-        # Always log song plays, even for guest users, but only once per song session
-        if room_name and is_playing:
-            # First try to get song info from the room playlist
-            room_data = redis_api.get_room_data(room_name)
-            current_playlist = room_data.get('playlist', [])
-            current_song = None
-            
-            # Try to get the song from the playlist using currentTrack
-            if current_playlist and 0 <= current_track < len(current_playlist):
-                current_song = current_playlist[current_track]
-            
-            # If we have a song and the state is playing
-            if current_song or video_id:
-                # Use actual username if available, otherwise use 'guest'
-                log_username = username if username and username.lower() != 'guest' else 'guest'
-                song_id = current_song.get('song_id') if current_song else video_id
-                
-                # Check if this song was recently logged to avoid duplicate logs
-                last_played_key = f"last_played:{room_name}"
-                last_played = redis_client.get(last_played_key)
-                
-                # Only log if this is a different song than the last one played in this room
-                if not last_played or last_played.decode('utf-8') != song_id:
-                    # Update the last played song for this room
-                    redis_client.set(last_played_key, song_id)
-                    redis_client.expire(last_played_key, 3600)  # Expire after 1 hour
-                    
-                    # Log the play action
-                    title = current_song.get('title', '') if current_song else 'Unknown'
-                    artist = current_song.get('artist', '') if current_song else 'Unknown'
-                    
-                    logger.info(f"Logging play_song for user {log_username}, song {title if title else video_id} in room {room_name}")
-                    
-                    # Log the play action using user_logging module
-                    user_logging.log_user_activity(
-                        username=log_username,
-                        action="play_song",
-                        song_id=song_id,
-                        room_name=room_name,
-                        details={
-                            "title": title,
-                            "artist": artist,
-                            "position": position
-                        }
-                    )
-                    
-                    # Increment play count in Redis
-                    new_count = redis_api.increment_song_play_count(song_id, title=title, artist=artist)
-                    logger.info(f"Incremented play count for song {song_id} to {new_count}")
-        
-        # Broadcast the player state to all clients in the room
-        emit('player_state_update', player_state, room=room_name)
+        log_event(logger, 'player_state_change', sample_rate=0.05, room=room_name,
+                  state=state, track=current_track, position=position)
+        
+        # Broadcast the player state to all clients in the room (coalesced)
+        player_state_broadcasts.submit(room_name, player_state)
+        
+        # Update this worker's cache now and the room's player state in Redis
+        stored_state = dict(player_state, state=state, position=position, index=current_track)
+        previous_state = room_player_states.get(room_name)
+        room_player_states[room_name] = stored_state
+        if (not previous_state or previous_state.get('index') != current_track
+                or previous_state.get('videoId') != video_id or previous_state.get('state') != state):
+            # Track changes and play/pause are written through so other workers see them at once
+            player_state_writes.flush(room_name, stored_state)
+            room_player_state_fetched_at[room_name] = time.monotonic()
+        else:
+            # Position updates are debounced; trust the local copy until the write reaches Redis
+            room_player_state_fetched_at[room_name] = time.monotonic() + PLAYER_STATE_PERSIST_INTERVAL
+            player_state_writes.submit(room_name, stored_state)
+        
+        # Always log song plays, even for guest users, but only once per song session.
+        # Logging reads the playlist and writes several keys, so it runs off the event loop;
+        # _log_room_play still skips a song replayed within PLAY_LOG_DEDUP_SECONDS
+        if is_playing:
+            last_logged = last_logged_tracks.get(room_name)
+            if (not last_logged or last_logged[:2] != (current_track, video_id)
+                    or time.monotonic() - last_logged[2] >= PLAY_LOG_DEDUP_SECONDS):
+                last_logged_tracks[room_name] = (current_track, video_id, time.monotonic())
+                socketio.start_background_task(_log_room_play, room_name, username, current_track, video_id, position)
+        else:
+            last_logged_tracks.pop(room_name, None)
         
     except Exception as e:
         logger.error(f"Error handling player state change: {str(e)}")
@@ -249,61 +355,17 @@ def handle_player_state_change(data):
 @app.route('/api/room/player-state', methods=['GET'])
 def get_player_state():
     room_name = request.args.get('room_name')
-    if not room_name or room_name not in room_player_states:
+    current_state = get_cached_player_state(room_name) if room_name else None
+    if not current_state:
         return jsonify({"error": "Room not found or no player state available"}), 404
         
-    return jsonify(room_player_states[room_name])
+    return jsonify(current_state)
 
 # if not os.path.exists(UPLOAD_FOLDER):
 #     os.makedirs(UPLOAD_FOLDER)
 
 # Update to the generate-playlist endpoint in app.py
 
-def deduplicate_playlist(existing_playlist, new_playlist):
-    """
-    Deduplicate songs when appending to an existing playlist.
-    
-    Args:
-        existing_playlist: List of existing song dictionaries
-        new_playlist: List of new song dictionaries to append
-        
-    Returns:
-        tuple: (deduplicated_new_playlist, combined_playlist)
-    """
-    # Create a set of existing song IDs for quick lookup
-    existing_ids = set()
-    for song in existing_playlist:
-        # Use song_id as the unique identifier if available
-        if 'song_id' in song:
-            existing_ids.add(song['song_id'])
-        # Fallback to title + artist if song_id is not available
-        elif 'title' in song and 'artist' in song:
-            existing_ids.add(f"{song['title']}:{song['artist']}")
-    
-    # Filter out duplicates from the new playlist
-    deduplicated_new_playlist = []
-    for song in new_playlist:
-        # Check if song is already in existing playlist
-        is_duplicate = False
-        if 'song_id' in song and song['song_id'] in existing_ids:
-            is_duplicate = True
-        elif 'title' in song and 'artist' in song and f"{song['title']}:{song['artist']}" in existing_ids:
-            is_duplicate = True
-        
-        # Add to deduplicated list if not a duplicate
-        if not is_duplicate:
-            deduplicated_new_playlist.append(song)
-            # Add to existing_ids to prevent duplicates within new_playlist
-            if 'song_id' in song:
-                existing_ids.add(song['song_id'])
-            elif 'title' in song and 'artist' in song:
-                existing_ids.add(f"{song['title']}:{song['artist']}")
-    
-    # Combine playlists
-    combined_playlist = existing_playlist + deduplicated_new_playlist
-    
-    return deduplicated_new_playlist, combined_playlist
-
 @app.route('/api/generate-playlist', methods=['POST'])
 def generate_playlist():
     data = request.json
@@ -396,16 +458,14 @@ def generate_playlist():
         
         logger.info(f'Final unique song count: {len(unique_titles)} out of {target_song_count} requested')
         
-        # Now get song info for all unique songs
-        new_playlist = []
-        
-        for title, artist in zip(all_titles, all_artists):
-            try:
-                logger.info(f'getting links for {title}...')
-                song_info = youtube_music.get_song_info(song_name=title, artist_name=artist)
-                new_playlist.append(song_info)
-            except Exception as e:
-                logger.info(f'----failed for {title}, {artist}', e)
+        # Now resolve song info for all unique songs concurrently, keeping the LLM's order
+        logger.info(f'Resolving links for {len(all_titles)} songs...')
+        resolved = youtube_music.resolve_songs(all_titles, all_artists)
+        new_playlist = [song_info for song_info in resolved if 'error' not in song_info]
+        failed_songs = [song_info for song_info in resolved if 'error' in song_info]
+        for failed in failed_songs:
+            logger.info(f"----failed for {failed['title']}, {failed['artist']}: {failed['error']}")
+        logger.info(f'Resolved {len(new_playlist)} of {len(resolved)} songs')
         
         logger.info(str(new_playlist))
 
@@ -414,16 +474,11 @@ def generate_playlist():
 
         # If append mode is enabled and room exists, append to existing playlist
         if append_to_room:
-            existing_playlist_json = redis_api.get_hash(f"room_playlists{redis_version}", room_name)
-            if existing_playlist_json:
+            if redis_api.get_playlist_length(room_name):
                 try:
-                    existing_playlist = json.loads(existing_playlist_json)
-                    
-                    # Deduplicate the playlist
-                    deduplicated_new_playlist, combined_playlist = deduplicate_playlist(existing_playlist, new_playlist)
-                    
-                    # Update the playlist in Redis
-                    redis_api.write_hash(f"room_playlists{redis_version}", room_name, json.dumps(combined_playlist))
+                    # Append only the songs that are not already in the room
+                    deduplicated_new_playlist = redis_api.append_tracks_to_playlist(room_name, new_playlist)
+                    combined_playlist_length = redis_api.get_playlist_length(room_name)
                     
                     # Log playlist append activity
                     if username:
@@ -434,14 +489,14 @@ def generate_playlist():
                             details={
                                 "songs_added": len(deduplicated_new_playlist),
                                 "duplicates_removed": len(new_playlist) - len(deduplicated_new_playlist),
-                                "total_songs": len(combined_playlist)
+                                "total_songs": combined_playlist_length
                             }
                         )
                     
                     # Return the deduplicated new playlist and combined length
                     return jsonify({
                         "playlist": deduplicated_new_playlist, 
-                        "combined_playlist_length": len(combined_playlist),
+                        "combined_playlist_length": combined_playlist_length,
                         "duplicates_removed": len(new_playlist) - len(deduplicated_new_playlist)
                     })
                 except Exception as e:
@@ -449,9 +504,11 @@ def generate_playlist():
                     # If there's an error, fall back to just returning the new playlist
         
         # If not in append mode or append failed, write the new playlist
-        redis_api.write_hash(f"room_playlists{redis_version}", room_name, json.dumps(new_playlist))
+        # Settings and intro go first so the room summary built with the playlist includes them
         redis_api.write_hash(f"settings{redis_version}", room_name, json.dumps(settings))
         redis_api.write_hash(f"intro{redis_version}", room_name, introduction)
+        new_playlist = redis_api.set_room_playlist(room_name, new_playlist)
+        schedule_room_qr_codes(room_name)
         
         # Store host information if user is logged in
         if username:
@@ -478,45 +535,91 @@ def generate_playlist():
         logger.error(f"Error generating playlist: {str(e)}")
         return jsonify({"error": "Failed to generate playlist"}), 500
 
+QR_CODE_DIRS = [
+    Path(__file__).parent.parent / 'frontend' / 'react_dj' / 'public' / 'images',
+    Path(__file__).parent.parent / 'frontend' / 'react_dj' / 'build' / 'images',
+]
+_pending_qr_codes = set()
+
+
+def room_qr_code_paths(room_name):
+    """
+    Paths of a room's QR code image in the public and build image folders.
+
+    Args:
+        room_name (str): Name of the room
+
+    Returns:
+        list: One Path per folder in QR_CODE_DIRS
+    """
+    # Sanitize room name for file path (replace slashes and other unsafe characters)
+    safe_room_name = room_name.replace('/', '_').replace('\\', '_')
+    return [directory / f"qr_code_{safe_room_name}.png" for directory in QR_CODE_DIRS]
+
+
+def ensure_room_qr_codes(room_name):
+    """
+    Write the room's QR code into every image folder that does not have it yet.
+
+    The code is rendered once and copied to the other folders.
+
+    Args:
+        room_name (str): Name of the room
+    """
+    paths = room_qr_code_paths(room_name)
+    missing = [path for path in paths if not path.exists()]
+    if not missing:
+        return
+    try:
+        source = next((path for path in paths if path.exists()), None)
+        if source is None:
+            source = missing.pop(0)
+            source.parent.mkdir(parents=True, exist_ok=True)
+            generate_qr_code_with_logo(f'http://aico-music.com/playroom?room_name={room_name}', source)
+        for path in missing:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, path)
+        log_event(logger, 'room_qr_code_generated', room=room_name, paths=[source] + missing)
+    except Exception as e:
+        logger.error(f"Error generating QR code for room {room_name}: {str(e)}")
+
+
+def _generate_room_qr_codes(room_name):
+    try:
+        # Image rendering is CPU bound, so run it on a native thread instead of the hub
+        tpool.execute(ensure_room_qr_codes, room_name)
+    finally:
+        _pending_qr_codes.discard(room_name)
+
+
+def schedule_room_qr_codes(room_name):
+    """
+    Generate the room's QR codes in a background task if any are missing.
+
+    Args:
+        room_name (str): Name of the room
+    """
+    if room_name in _pending_qr_codes or all(path.exists() for path in room_qr_code_paths(room_name)):
+        return
+    _pending_qr_codes.add(room_name)
+    socketio.start_background_task(_generate_room_qr_codes, room_name)
+
+
 @app.route('/api/room-playlist', methods=['GET'])
 def get_room_playlist():
     room_name = request.args.get('room_name')
 
-    # Sanitize room name for file path (replace slashes and other unsafe characters)
-    safe_room_name = room_name.replace('/', '_').replace('\\', '_')
-    
-    # Only generate QR code if it doesn't exist
-    qr_code_path = Path(__file__).parent.parent / 'frontend' / 'react_dj' / 'public' / 'images' / f"qr_code_{safe_room_name}.png"
-    build_path = Path(__file__).parent.parent / 'frontend' / 'react_dj' / 'build' / 'images' / f"qr_code_{safe_room_name}.png"
-    if not build_path.exists():
-        # Create images directory if it doesn't exist
-        qr_code_path.parent.mkdir(parents=True, exist_ok=True)
-        generate_qr_code_with_logo(f'http://aico-music.com/playroom?room_name={room_name}', qr_code_path)
-        logger.info(f"Generated QR code for room: {room_name} into {qr_code_path}")
-        
-        # build_path = Path(__file__).parent.parent / 'frontend' / 'react_dj' / 'build' / 'images' / f"qr_code_{safe_room_name}.png"
-        build_path.parent.mkdir(parents=True, exist_ok=True)
-        generate_qr_code_with_logo(f'http://aico-music.com/playroom?room_name={room_name}', build_path)
-        logger.info(f"Generated QR code for room: {room_name} into {build_path}")
+    # Rooms created before QR codes were generated at creation time get theirs in the background
+    schedule_room_qr_codes(room_name)
 
     try:
-        # Get existing playlist data
-        time.sleep(0.5)
-        playlist_data = get_hash(f"room_playlists{redis_version}", room_name)
-        if not playlist_data:
+        # Get existing playlist data. The version is read first: deltas published after it
+        # may already be reflected in the playlist, and clients apply them idempotently
+        # Playlists are deduplicated by title when they are written
+        version = redis_api.get_room_playlist_version(room_name)
+        playlist = redis_api.get_room_playlist(room_name)
+        if not playlist:
             logger.warning(f"No playlist data found for room: {room_name}")
-            playlist = []
-        else:
-            playlist = json.loads(playlist_data)
-            # Deduplicate playlist based on song title (case-insensitive)
-            deduped_playlist = []
-            seen_titles = set()
-            for song in playlist:
-                title_key = song.get('title', '').strip().lower()
-                if title_key and title_key not in seen_titles:
-                    deduped_playlist.append(song)
-                    seen_titles.add(title_key)
-            playlist = deduped_playlist
         
         settings_data = get_hash(f"settings{redis_version}", room_name)
         if not settings_data:
@@ -532,6 +635,7 @@ def get_room_playlist():
         
         return jsonify({
             "playlist": playlist,
+            "version": version,
             "introduction": introduction,
             "settings": settings,
             "host": host_data  # Add host information to response
@@ -579,14 +683,11 @@ def search_music():
             song_count = 10
             titles, artists, _, _ = llm.llm_generate_playlist(query, "", "", song_count)
             
-            results = []
-            for title, artist in zip(titles, artists):
-                try:
-                    logger.info(f'getting links for {title}...')
-                    song_info = youtube_music.get_song_info(song_name=title, artist_name=artist)
-                    results.append(song_info)
-                except Exception as e:
-                    logger.info(f'----failed for {title}, {artist}', e)
+            resolved = youtube_music.resolve_songs(titles, artists)
+            results = [song_info for song_info in resolved if 'error' not in song_info]
+            for failed in resolved:
+                if 'error' in failed:
+                    logger.info(f"----failed for {failed['title']}, {failed['artist']}: {failed['error']}")
             
             logger.info(f"Prompt search results: {results}")
         except Exception as e:
@@ -693,17 +794,15 @@ def add_to_playlist():
                 logger.info(f"Song '{track.get('title')}' needs manual approval from host for room {room_name}")
                 return jsonify({"error": "This room requires host approval for songs"}), 403
         
-        # Fetch the existing playlist
-        playlist_json = get_hash(f"room_playlists{redis_version}", room_name)
-        playlist = json.loads(playlist_json) if playlist_json else []
-
-        # Add the new track to the playlist
-        playlist.append(track)
+        # Add the new track to the end of the playlist; nothing is appended if it is already there
+        if not redis_api.append_tracks_to_playlist(room_name, [track]):
+            logger.info(f'Track already in playlist: {track.get("title")} in room: {room_name}')
+            return jsonify({
+                "error": "Track already in playlist",
+                "already_in_playlist": True
+            }), 409
         logger.info(f'Added track: {track.get("title")} by {track.get("artist")} in room: {room_name}')
 
-        # Update the playlist in Redis
-        write_hash(f"room_playlists{redis_version}", room_name, json.dumps(playlist))
-
         # Log user activity if logged in
         if username:
             user_logging.log_user_activity(
@@ -740,25 +839,12 @@ def remove_from_playlist():
     if auth_token:
         username = get_hash(f"sessions{redis_version}", auth_token)
 
-    # Fetch the existing playlist for the given room_name
-    playlist = json.loads(redis_api.get_hash(f"room_playlists{redis_version}", room_name))
-
-    # Find track details before removing for logging
-    removed_track = None
-    for track in playlist:
-        if track.get('song_id') == track_id:
-            removed_track = track
-            break
-
-    # Find and remove the track with the matching song_id instead of id
-    updated_playlist = [track for track in playlist if track.get('song_id') != track_id]
+    # Remove the track with the matching song_id, keeping its details for logging.
+    # The room is told about the removal through a playlist_delta socket event
+    removed_track = redis_api.remove_track_from_playlist(room_name, track_id)
     
     # Log the removal operation
     logger.info(f'removed track with song_id:{track_id} from room:{room_name}')
-    logger.info(f'new playlist:{updated_playlist}')
-
-    # Update the playlist in Redis
-    redis_api.write_hash(f"room_playlists{redis_version}", room_name, json.dumps(updated_playlist))
 
     # Log user activity if logged in and track was found
     if username and removed_track:
@@ -773,7 +859,12 @@ def remove_from_playlist():
             }
         )
 
-    return jsonify({"message": "Track removed successfully", "playlist": updated_playlist})
+    response = {"message": "Track removed successfully",
+                "version": redis_api.get_room_playlist_version(room_name)}
+    # Clients that apply playlist deltas pass return_playlist=false to skip the full list
+    if data.get('return_playlist', True):
+        response["playlist"] = redis_api.get_room_playlist(room_name)
+    return jsonify(response)
 
 # Redis hash structure:
 # users:{version} -> Hash containing username -> password_hash mappings
@@ -817,6 +908,7 @@ def register():
             "has_avatar": False,  # Initialize with no avatar
         }
         write_hash(f"user_profiles{redis_version}", username, json.dumps(profile))
+        redis_api.invalidate_profile_cache(username)
         
         # Set initial coins using the unified coin management system
         set_user_coins(username, 1000, "Initial allocation for new user")
@@ -892,6 +984,7 @@ def login():
                 "coins": 0
             }
             write_hash(f"user_profiles{redis_version}", username, json.dumps(profile))
+            redis_api.invalidate_profile_cache(username)
         
         # Get coins using the unified coin management system
         profile["coins"] = get_user_coins(username)
@@ -966,12 +1059,10 @@ def get_current_user_direct():
         auth_token = auth_header
         if auth_header.startswith('Bearer '):
             auth_token = auth_header[7:]  # Remove 'Bearer ' prefix
-            logger.info(f"Auth endpoint: Extracted token from Bearer format: {auth_token[:10]}...")
         
         # Get username from session
         # redis_version = os.environ.get('REDIS_VERSION', '')
         username = redis_api.get_hash(f"sessions{redis_version}", auth_token)
-        logger.info(f"Auth endpoint: Username from token: {username}")
         
         if not username:
             logger.warning(f"Auth endpoint: Invalid or expired token: {auth_token[:10]}...")
@@ -979,7 +1070,6 @@ def get_current_user_direct():
         
         # Get user data
         user_data = redis_api.get_user_data(username)
-        logger.info(f"Auth endpoint: User data for {username}: {user_data}")
         
         # Check admin status
         is_admin_from_data = user_data.get('is_admin', False)
@@ -989,7 +1079,8 @@ def get_current_user_direct():
         # Get user coins using the unified coin management system
         coins = get_user_coins(username)
         
-        logger.info(f"Auth endpoint: Admin status for {username}: from data={is_admin_from_data}, from username={is_admin_from_username}, final={final_admin_status}")
+        log_event(logger, 'auth_user_checked', sample_rate=0.1, username=username,
+                  is_admin=final_admin_status, coins=coins)
         
         return jsonify({
             "success": True,
@@ -1096,12 +1187,13 @@ def set_room_host(room_name, username, avatar, update_timestamp=True):
         # Otherwise, use current time
         created_at = datetime.now().isoformat()
     
-    host_data = json.dumps({
+    host_data = {
         "username": username,
         "avatar": avatar,
         "created_at": created_at
-    })
-    write_hash(f"room_hosts{redis_version}", room_name, host_data)
+    }
+    write_hash(f"room_hosts{redis_version}", room_name, json.dumps(host_data))
+    redis_api.update_room_summary(room_name, host=host_data)
 
 def add_room_to_user_profile(username, room_name):
     """Add room to user's created rooms list."""
@@ -1115,6 +1207,7 @@ def add_room_to_user_profile(username, room_name):
         if room_name not in profile['created_rooms']:
             profile['created_rooms'].append(room_name)
         write_hash(f"user_profiles{redis_version}", username, json.dumps(profile))
+        redis_api.invalidate_profile_cache(username)
 
 
 @app.route('/api/user/rooms', methods=['GET'])
@@ -1144,28 +1237,15 @@ def get_user_rooms_helper(username):
     created_rooms = profile.get('created_rooms', [])
     
     rooms_data = []
-    for room_name in created_rooms:
-        # Get room data
-        playlist_json = get_hash(f"room_playlists{redis_version}", room_name)
-        settings_json = get_hash(f"settings{redis_version}", room_name)
-        intro = get_hash(f"intro{redis_version}", room_name)
-        
-        if not playlist_json:
-            continue  # Skip if room no longer exists
-            
-        playlist = json.loads(playlist_json)
-        settings = json.loads(settings_json) if settings_json else {}
-        
-        # Get first song's cover image as room cover
-        cover_image = playlist[0].get('cover_img_url', '') if playlist and len(playlist) > 0 else ''
-        
+    # Room cards come from the per-room summaries; rooms that no longer exist are skipped
+    for summary in redis_api.get_room_summaries(created_rooms):
         rooms_data.append({
-            "name": room_name,
-            "cover_image": cover_image,
-            "introduction": intro[:100] + '...' if intro and len(intro) > 100 else intro,
-            "song_count": len(playlist),
-            "genre": settings.get('genre', ''),
-            "occasion": settings.get('occasion', ''),
+            "name": summary['name'],
+            "cover_image": summary['cover_image'],
+            "introduction": summary['introduction'],
+            "song_count": summary['song_count'],
+            "genre": summary['genre'],
+            "occasion": summary['occasion'],
             "created_at": profile.get('created_at', '')
         })
         
@@ -1215,6 +1295,7 @@ def follow_user():
         # Update Redis
         write_hash(f"user_following{redis_version}", username, json.dumps(following))
         write_hash(f"user_followers{redis_version}", target_username, json.dumps(followers))
+        redis_api.invalidate_profile_cache(username, target_username)
 
         return jsonify({"message": f"Successfully {action}ed user"})
 
@@ -1254,6 +1335,7 @@ def favorite_room():
 
         # Update Redis
         write_hash(f"user_favorites{redis_version}", username, json.dumps(favorites))
+        redis_api.invalidate_profile_cache(username)
 
         # Also update user profile stats
         profile_json = get_hash(f"user_profiles{redis_version}", username)
@@ -1289,117 +1371,61 @@ def get_user_profile(username=None):
             return jsonify({"error": "Invalid session"}), 401
 
     try:
-        # Get basic profile data
-        profile_json = get_hash(f"user_profiles{redis_version}", username)
-        if not profile_json:
-            if username:  # For public profile requests
-                return jsonify({"error": "User not found"}), 404
-            # For authenticated requests, create default profile
-            profile = format_user_profile(username)
-        else:
-            profile = json.loads(profile_json)
+        cached_profile = redis_api.get_cached_profile(username)
+        if cached_profile:
+            # Coins change too often to cache; the balance is a single HGET
+            cached_profile["coins"] = get_user_coins(username)
+            return jsonify(cached_profile)
+
+        # Gather the profile, its rooms, favorites and follows in a few pipelined batches
+        bundle = redis_api.get_profile_bundle(username)
+        if not bundle:
+            return jsonify({"error": "User not found"}), 404
+        profile = bundle["profile"]
 
         # Get user rooms with details
         rooms_data = []
-        created_rooms = profile.get('created_rooms', [])
-        for room_name in created_rooms:
-            # Get room data
-            playlist_json = get_hash(f"room_playlists{redis_version}", room_name)
-            settings_json = get_hash(f"settings{redis_version}", room_name)
-            intro = get_hash(f"intro{redis_version}", room_name)
-            
-            if not playlist_json:
-                continue  # Skip if room no longer exists
-                
-            playlist = json.loads(playlist_json)
-            settings = json.loads(settings_json) if settings_json else {}
-            
-            # Get first song's cover image as room cover
-            cover_image = playlist[0].get('cover_img_url', '') if playlist and len(playlist) > 0 else ''
-            
+        for summary in bundle["rooms"]:
             rooms_data.append({
-                "name": room_name,
-                "cover_image": cover_image,
-                "introduction": intro[:100] + '...' if intro and len(intro) > 100 else intro,
-                "song_count": len(playlist),
-                "genre": settings.get('genre', ''),
-                "occasion": settings.get('occasion', ''),
+                "name": summary['name'],
+                "cover_image": summary['cover_image'],
+                "introduction": summary['introduction'],
+                "song_count": summary['song_count'],
+                "genre": summary['genre'],
+                "occasion": summary['occasion'],
                 "created_at": profile.get('created_at', '')
             })
         
         # Get favorites with details
         favorites_data = []
-        favorites_json = get_hash(f"user_favorites{redis_version}", username)
-        if favorites_json:
-            favorites = json.loads(favorites_json)
-            for room_name in favorites:
-                try:
-                    playlist_json = get_hash(f"room_playlists{redis_version}", room_name)
-                    settings_json = get_hash(f"settings{redis_version}", room_name)
-                    intro = get_hash(f"intro{redis_version}", room_name)
-                    
-                    if not playlist_json:
-                        continue
-                        
-                    playlist = json.loads(playlist_json)
-                    settings = json.loads(settings_json) if settings_json else {}
-                    
-                    cover_image = playlist[0].get('cover_img_url', '') if playlist and len(playlist) > 0 else ''
-                    
-                    favorites_data.append({
-                        "name": room_name,
-                        "cover_image": cover_image,
-                        "introduction": intro[:100] + '...' if intro and len(intro) > 100 else intro,
-                        "song_count": len(playlist),
-                        "genre": settings.get('genre', ''),
-                        "occasion": settings.get('occasion', '')
-                    })
-                except:
-                    continue
+        for summary in bundle["favorites"]:
+            favorites_data.append({
+                "name": summary['name'],
+                "cover_image": summary['cover_image'],
+                "introduction": summary['introduction'],
+                "song_count": summary['song_count'],
+                "genre": summary['genre'],
+                "occasion": summary['occasion']
+            })
 
         # Get following/followers with details
-        following_data = []
-        followers_data = []
-        
-        following_json = get_hash(f"user_following{redis_version}", username)
-        followers_json = get_hash(f"user_followers{redis_version}", username)
-        
-        if following_json:
-            following_usernames = json.loads(following_json)
-            for follow_username in following_usernames:
-                try:
-                    follow_profile_json = get_hash(f"user_profiles{redis_version}", follow_username)
-                    if follow_profile_json:
-                        follow_profile = json.loads(follow_profile_json)
-                        following_data.append({
-                            "username": follow_username,
-                            "avatar": get_user_avatar_url(follow_username),
-                            "bio": follow_profile.get('bio', ''),
-                            "country": follow_profile.get('country', '')
-                        })
-                except:
-                    continue
-        
-        if followers_json:
-            follower_usernames = json.loads(followers_json)
-            for follower_username in follower_usernames:
-                try:
-                    follower_profile_json = get_hash(f"user_profiles{redis_version}", follower_username)
-                    if follower_profile_json:
-                        follower_profile = json.loads(follower_profile_json)
-                        followers_data.append({
-                            "username": follower_username,
-                            "avatar": get_user_avatar_url(follower_username),
-                            "bio": follower_profile.get('bio', ''),
-                            "country": follower_profile.get('country', '')
-                        })
-                except:
-                    continue
+        following_data = [{
+            "username": follow_username,
+            "avatar": get_user_avatar_url(follow_username),
+            "bio": follow_profile.get('bio', ''),
+            "country": follow_profile.get('country', '')
+        } for follow_username, follow_profile in bundle["following"]]
+
+        followers_data = [{
+            "username": follower_username,
+            "avatar": get_user_avatar_url(follower_username),
+            "bio": follower_profile.get('bio', ''),
+            "country": follower_profile.get('country', '')
+        } for follower_username, follower_profile in bundle["followers"]]
 
         # Get user tags
-        user_tags_json = get_hash(f"user_tags{redis_version}", username)
-        if user_tags_json:
-            profile['tags'] = json.loads(user_tags_json)
+        if bundle["tags"]:
+            profile['tags'] = bundle["tags"]
 
         # Update stats
         profile["stats"] = {
@@ -1415,6 +1441,8 @@ def get_user_profile(username=None):
         profile["following"] = following_data
         profile["followers"] = followers_data
 
+        redis_api.cache_profile(username, profile)
+        profile["coins"] = get_user_coins(username)
         return jsonify(profile)
 
     except Exception as e:
@@ -1453,6 +1481,7 @@ def update_user_profile():
         
         # Save updated profile
         write_hash(f"user_profiles{redis_version}", username, json.dumps(profile))
+        redis_api.invalidate_profile_cache(username)
         
         return jsonify({
             "message": "Profile updated successfully",
@@ -1481,82 +1510,37 @@ def get_tag_suggestions():
     
     return jsonify({category: suggestions.get(category, [])})
 
+def _rebuild_explore_index():
+    try:
+        redis_api.rebuild_explore_index()
+    except Exception as e:
+        redis_api.release_explore_index_rebuild()
+        logger.error(f"Error rebuilding explore index: {str(e)}")
+
 @app.route('/api/explore/rooms', methods=['GET'])
 def get_explore_rooms():
-    """Get paginated list of all rooms, sorted by created_at timestamp (newest first)"""
+    """Get paginated list of all rooms, sorted by created_at timestamp (newest first).
+    Pass the returned next_cursor as ?cursor= to get the next page; ?page= is still accepted."""
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 12))
         offset = (page - 1) * limit
 
-        # Get all rooms and their playlists
-        all_rooms = get_all_hash(f"room_playlists{redis_version}")
-        
-        all_room_names = list(all_rooms.keys())
-        logger.info(f"all_room_names:{all_room_names}")
-        total_rooms = len(all_room_names)
+        cursor = request.args.get('cursor')
 
-        # Collect all room data with their creation timestamps
-        room_data_list = []
-        for room_name in all_room_names:
-            try:
-                # Get playlist data
-                playlist = json.loads(all_rooms[room_name])
-                
-                # Get additional room data
-                settings_json = get_hash(f"settings{redis_version}", room_name)
-                intro = get_hash(f"intro{redis_version}", room_name)
-                host_data = get_room_host(room_name)
-
-                settings = json.loads(settings_json) if settings_json else {}
-                
-                # Get first song's cover image as room cover
-                cover_image = playlist[0].get('cover_img_url', '') if playlist and len(playlist) > 0 else ''
-                
-                # Get created_at timestamp (default to oldest possible date if not available)
-                created_at = None
-                if host_data and 'created_at' in host_data:
-                    created_at = host_data['created_at']
-                else:
-                    # Use a very old date as default for sorting
-                    created_at = "1970-01-01T00:00:00"
-
-                room_data = {
-                    "name": room_name,
-                    "cover_image": cover_image,
-                    "introduction": intro,
-                    "song_count": len(playlist),
-                    "genre": settings.get('genre', ''),
-                    "occasion": settings.get('occasion', ''),
-                    "host": host_data,
-                    "created_at": created_at  # Add created_at for sorting
-                }
-                room_data_list.append(room_data)
-            except Exception as e:
-                logger.error(f"Error processing room {room_name}: {str(e)}")
-                continue
-
-        # Sort rooms by created_at (newest first)
-        sorted_rooms = sorted(room_data_list, key=lambda x: x['created_at'], reverse=True)
-        
-        # Apply pagination after sorting
-        paginated_rooms = sorted_rooms[offset:offset + limit]
-        
-        # Remove the created_at field from the response (it's already in host data)
-        for room in paginated_rooms:
-            if 'created_at' in room:
-                del room['created_at']
+        # Pages come from the precomputed explore index, so the cost is O(limit). One request
+        # per EXPLORE_INDEX_TTL starts the periodic rebuild in the background.
+        if redis_api.claim_explore_index_rebuild():
+            socketio.start_background_task(_rebuild_explore_index)
+        page_data = redis_api.get_explore_page(limit, cursor=cursor, offset=None if cursor else offset)
+        for room in page_data['rooms']:
+            room.pop('created_at', None)  # already in host data
 
-        res = {
-            "rooms": paginated_rooms,
-            "total": total_rooms,
-            "hasMore": offset + limit < total_rooms
-        }
-        logger.info(str(res))
         return jsonify({
-            "rooms": paginated_rooms,
-            "total": total_rooms,
-            "hasMore": offset + limit < total_rooms
+            "rooms": page_data['rooms'],
+            "total": page_data['total'],
+            "hasMore": page_data['next_cursor'] is not None,
+            "next_cursor": page_data['next_cursor']
         })
     except Exception as e:
         logger.error(f"Error fetching explore rooms: {str(e)}")
@@ -1661,11 +1645,10 @@ def upload_avatar():
         profile = json.loads(profile_json) if profile_json else format_user_profile(username)
         profile['has_avatar'] = True
         write_hash(f"user_profiles{redis_version}", username, json.dumps(profile))
+        redis_api.invalidate_profile_cache(username)
         
         # Update room host avatars if needed
-        all_rooms = get_all_hash(f"room_playlists{redis_version}")
-        all_room_names = list(all_rooms.keys())
-        for room_name in all_room_names:
+        for room_name in redis_api.get_all_room_names():
             host_data = get_room_host(room_name)
             if host_data and host_data.get('username') == username:
                 set_room_host(room_name, username, f"/api/avatar/{username}", update_timestamp=False)
@@ -1805,9 +1788,14 @@ def request_track():
     if not username:
         return jsonify({"error": "Authentication required to request tracks"}), 401
 
-    # Deduct coins atomically from requester
-    coin_result = use_user_coins(
+    # Charge the requester and credit the room host (if different) in one atomic call
+    host_info = get_room_host(room_name)
+    host_username = None
+    if host_info:
+        host_username = host_info.get("username") if isinstance(host_info, dict) else host_info
+    coin_result = transfer_coins(
         username=username,
+        recipient=host_username,
         amount=request_price,
         feature="express_request" if express_request else "song_request"
     )
@@ -1817,14 +1805,6 @@ def request_track():
             "coins": coin_result.get("coins", 0)
         }), 402
 
-    # Credit coins to the room host (if different from requester)
-    host_info = get_room_host(room_name)
-    host_username = None
-    if host_info:
-        host_username = host_info.get("username") if isinstance(host_info, dict) else host_info
-    if host_username and host_username != username:
-        add_user_coins(host_username, request_price, reason="track_request_reward")
-
     # Annotate track metadata
     track['express'] = express_request
     track['price'] = request_price
@@ -1879,35 +1859,14 @@ def request_track():
         if not moderation_enabled:
             logger.info(f"Moderation is off, adding track directly to playlist for {room_name}")
             
-            # Get existing playlist
-            playlist_json = get_hash(f"room_playlists{redis_version}", room_name)
-            if not playlist_json:
-                logger.warning(f"No playlist found for room {room_name}, creating new playlist")
-                playlist = []
-            else:
-                try:
-                    playlist = json.loads(playlist_json)
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON in playlist for room {room_name}: {playlist_json}")
-                    playlist = []
-            
             # Insert the track respecting express flag
             if track.get('express'):
-                current_state = room_player_states.get(room_name, {}) if 'room_player_states' in globals() else {}
+                current_state = get_cached_player_state(room_name) or {}
                 current_index = current_state.get('index', -1)
-                if current_index is not None and current_index >= 0 and current_index < len(playlist):
-                    insert_pos = current_index + 1
-                else:
-                    insert_pos = 1 if len(playlist) >= 1 else 0
-                playlist.insert(insert_pos, track)
+                insert_pos = redis_api.insert_track_after_current(room_name, current_index, track)
                 logger.info(f"Inserted express track at position {insert_pos} in playlist for {room_name}")
             else:
-                playlist.append(track)
-            
-            # Update the playlist in Redis
-            # redis_client.set(f"playlist:{room_name}", json.dumps(playlist))
-            
-            redis_api.write_hash(f"room_playlists{redis_version}", room_name, json.dumps(playlist))
+                redis_api.append_tracks_to_playlist(room_name, [track])
 
             logger.info(f"Track added directly to playlist for room {room_name} (moderation off)")
             
@@ -1973,33 +1932,14 @@ def request_track():
             if moderation_result.get('approved', False):
                 logger.info(f"AI moderation approved song '{song_title}' by '{song_artist}' for room {room_name}, adding to playlist")
                 
-                # Get existing playlist
-                playlist_json = get_hash(f"room_playlists{redis_version}", room_name)
-                if not playlist_json:
-                    logger.warning(f"No playlist found for room {room_name}, creating new playlist")
-                    playlist = []
-                else:
-                    try:
-                        playlist = json.loads(playlist_json)
-                    except json.JSONDecodeError:
-                        logger.error(f"Invalid JSON in playlist for room {room_name}: {playlist_json}")
-                        playlist = []
-                
                 # Insert the track respecting express flag
                 if track.get('express'):
-                    current_state = room_player_states.get(room_name, {}) if 'room_player_states' in globals() else {}
+                    current_state = get_cached_player_state(room_name) or {}
                     current_index = current_state.get('index', -1)
-                    if current_index is not None and current_index >= 0 and current_index < len(playlist):
-                        insert_pos = current_index + 1
-                    else:
-                        insert_pos = 1 if len(playlist) >= 1 else 0
-                    playlist.insert(insert_pos, track)
+                    insert_pos = redis_api.insert_track_after_current(room_name, current_index, track)
                     logger.info(f"Inserted express track at position {insert_pos} in playlist for {room_name}")
                 else:
-                    playlist.append(track)
-                
-                # Update the playlist in Redis
-                redis_api.write_hash(f"room_playlists{redis_version}", room_name, json.dumps(playlist))
+                    redis_api.append_tracks_to_playlist(room_name, [track])
 
                 logger.info(f"Track added directly to playlist for room {room_name} (AI moderation approved)")
                 
@@ -2203,42 +2143,16 @@ def approve_track_request():
         # ------------------------------------------------------------------
         # Add the track to the room's playlist – handle express insertion
         # ------------------------------------------------------------------
-        playlist_json = get_hash(f"room_playlists{redis_version}", room_name)
-        try:
-            playlist = json.loads(playlist_json) if playlist_json else []
-        except Exception:
-            logger.error(f"Invalid JSON in playlist for room {room_name}: {playlist_json}")
-            playlist = []
-
         # If express flag, insert right after currently playing song
         if track.get("express"):
             # Determine the current playing index for express insertion
-            current_state = {}
-            # 1) Try in-memory state first
-            if 'room_player_states' in globals():
-                current_state = room_player_states.get(room_name, {})
-
-            # 2) Fallback to Redis if in-memory state is unavailable / empty (e.g. different process)
-            if not current_state:
-                current_state_json = get_hash(f"room_player_states{redis_version}", room_name)
-                if current_state_json:
-                    try:
-                        current_state = json.loads(current_state_json)
-                    except json.JSONDecodeError:
-                        logger.error(f"Invalid JSON in stored player state for room {room_name}: {current_state_json}")
-                        current_state = {}
+            current_state = get_cached_player_state(room_name) or {}
 
             current_index = current_state.get('index', -1)
-            if current_index is not None and isinstance(current_index, int) and 0 <= current_index < len(playlist):
-                insert_pos = current_index + 1
-            else:
-                insert_pos = 1 if len(playlist) >= 1 else 0
-            playlist.insert(insert_pos, track)
+            insert_pos = redis_api.insert_track_after_current(room_name, current_index, track)
             logger.info(f"Approved EXPRESS request – inserted track at position {insert_pos} for room {room_name}")
         else:
-            playlist.append(track)
-
-        write_hash(f"room_playlists{redis_version}", room_name, json.dumps(playlist))
+            redis_api.append_tracks_to_playlist(room_name, [track])
         
         # Create notification for the requester
         if requester_id and requester_id != "Guest":
@@ -2558,8 +2472,7 @@ def get_ai_moderation_hints():
     
     try:
         # Get room playlist data
-        playlist_json = get_hash(f"playlist{redis_version}", room_name)
-        playlist = json.loads(playlist_json) if playlist_json else []
+        playlist = redis_api.get_room_playlist(room_name)
         
         # Get room description if available
         room_data = get_room_data(room_name)
@@ -2646,6 +2559,7 @@ def update_playlist_info():
     try:
         # Update the playlist introduction
         write_hash(f"intro{redis_version}", room_name, introduction)
+        redis_api.update_room_summary(room_name, introduction=introduction)
         
         logger.info(f"Updated playlist info for room {room_name}")
         
@@ -2773,6 +2687,7 @@ def toggle_follow_user():
         # Update Redis
         write_hash(f"user_following{redis_version}", username, json.dumps(following))
         write_hash(f"user_followers{redis_version}", target_username, json.dumps(followers))
+        redis_api.invalidate_profile_cache(username, target_username)
 
         return jsonify({"message": f"Successfully {action}ed user", "following": following})
 
@@ -2814,6 +2729,7 @@ def toggle_favorite_room():
 
         # Update Redis
         write_hash(f"user_favorites{redis_version}", username, json.dumps(favorites))
+        redis_api.invalidate_profile_cache(username)
 
         # Also update user profile stats
         profile_json = get_hash(f"user_profiles{redis_version}", username)
@@ -2855,25 +2771,21 @@ def favorite_song():
         # Create or get the user's favorites room
         favorites_room_name = f"favorites_{username}"
         
-        # Get existing playlist or create new one
-        existing_playlist_json = get_hash(f"room_playlists{redis_version}", favorites_room_name)
-        if existing_playlist_json:
-            existing_playlist = json.loads(existing_playlist_json)
-            
+        # Add to the existing favorites playlist or create a new one
+        if redis_api.room_playlist_exists(favorites_room_name):
             # Check if song already exists in favorites
-            for song in existing_playlist:
-                if song.get('song_id') == track.get('song_id'):
-                    return jsonify({
-                        "message": "Song already in favorites",
-                        "already_favorited": True
-                    })
+            if redis_api.get_playlist_index(favorites_room_name, redis_api.playlist_track_key(track)) is not None:
+                return jsonify({
+                    "message": "Song already in favorites",
+                    "already_favorited": True
+                })
             
             # Add the new song to favorites
-            existing_playlist.append(track)
-            playlist = existing_playlist
+            redis_api.append_tracks_to_playlist(favorites_room_name, [track])
         else:
             # Create new favorites playlist with this song
-            playlist = [track]
+            redis_api.set_room_playlist(favorites_room_name, [track])
+            schedule_room_qr_codes(favorites_room_name)
             
             # Create default settings for the room
             settings = {
@@ -2886,6 +2798,7 @@ def favorite_song():
             
             # Save settings
             write_hash(f"settings{redis_version}", favorites_room_name, json.dumps(settings))
+            redis_api.update_room_summary(favorites_room_name, settings=settings)
             
             # Set user as host of the room
             profile_json = get_hash(f"user_profiles{redis_version}", username)
@@ -2897,9 +2810,6 @@ def favorite_song():
             # Add room to user's rooms
             add_room_to_user_profile(username, favorites_room_name)
         
-        # Save updated playlist
-        write_hash(f"room_playlists{redis_version}", favorites_room_name, json.dumps(playlist))
-        
         # Log user activity
         user_logging.log_user_activity(
             username=username,
@@ -2915,7 +2825,7 @@ def favorite_song():
         return jsonify({
             "message": "Song added to favorites",
             "favorites_room": favorites_room_name,
-            "playlist_length": len(playlist)
+            "playlist_length": redis_api.get_playlist_length(favorites_room_name)
         })
         
     except Exception as e:
@@ -2935,13 +2845,14 @@ def pin_track():
         if not all([room_name, track_id]):
             return jsonify({"error": "Missing required parameters"}), 400
         
-        # Get current playlist from Redis
-        playlist_json = get_hash(f"room_playlists{redis_version}", room_name)
-        if not playlist_json:
+        # Make sure the room has a playlist
+        if not redis_api.room_playlist_exists(room_name):
             return jsonify({"error": "Playlist not found"}), 404
-        
-        playlist = json.loads(playlist_json)
-        
+
+        # Check the track before any coins are charged for pinning it
+        if redis_api.get_playlist_index(room_name, track_id) is None:
+            return jsonify({"error": "Track not found in playlist"}), 404
+
         # If this is a guest pin, verify user authentication and deduct coins
         if is_guest_pin:
             # Get auth token from header
@@ -2989,10 +2900,13 @@ def pin_track():
             if not room_host:
                 return jsonify({"error": "Room host not found"}), 404
                 
-            # Use coins for pinning
-            result = use_user_coins(
+            # Charge the pin and credit 50% of it to the host in one atomic call
+            # (no reward when pinning in own room)
+            result = transfer_coins(
                 username=username,
+                recipient=room_host,
                 amount=pin_price,
+                reward=pin_price // 2,  # Integer division to get 50%
                 feature=f"Pin track in room {room_name}"
             )
             
@@ -3003,15 +2917,8 @@ def pin_track():
                     "required_coins": pin_price
                 }), 400
             
-            # Add 50% of the coins to the host's balance
-            host_reward = pin_price // 2  # Integer division to get 50%
-            if host_reward > 0 and room_host != username:  # Don't reward if pinning in own room
-                add_user_coins(
-                    username=room_host,
-                    amount=host_reward,
-                    reason=f"Reward for guest pinning track in room {room_name}"
-                )
-                
+            host_reward = result["reward"]
+            if host_reward > 0:
                 # Log the host reward
                 user_logging.log_user_activity(
                     username=room_host,
@@ -3070,19 +2977,19 @@ def pin_track():
         # Calculate the actual position to insert the track (after current playing track)
         insert_position = current_playing_index + 1
         
-        # Remove the track from its current position
-        track_to_pin = playlist.pop(selected_index)
+        # Move the selected track to just after the currently playing track. The track is
+        # looked up by song_id so a stale selected_index cannot move the wrong track.
+        if redis_api.move_track(room_name, track_id, insert_position) is None:
+            return jsonify({"error": "Track not found in playlist"}), 404
         
-        # Insert the track after the currently playing track
-        playlist.insert(insert_position, track_to_pin)
-        
-        # Update Redis with the new playlist order
-        redis_api.write_hash(f"room_playlists{redis_version}", room_name, json.dumps(playlist))
-        
-        return jsonify({
+        response = {
             "message": "Track pinned successfully",
-            "playlist": playlist
-        })
+            "version": redis_api.get_room_playlist_version(room_name)
+        }
+        # Clients that apply playlist deltas pass return_playlist=false to skip the full list
+        if data.get('return_playlist', True):
+            response["playlist"] = redis_api.get_room_playlist(room_name)
+        return jsonify(response)
         
     except Exception as e:
         logger.error(f"Error pinning track: {str(e)}")
@@ -3102,8 +3009,7 @@ def verify_room_host():
     # If room exists but has no host, allow anyone to be host
     if not host_data:
         # Check if room exists in playlist
-        playlist_data = get_hash(f"room_playlists{redis_version}", room_name)
-        if playlist_data:  # Room exists but has no host
+        if redis_api.room_playlist_exists(room_name):  # Room exists but has no host
             return jsonify({
                 "host_username": None,
                 "host_avatar": None,
@@ -3152,17 +3058,11 @@ def check_favorite_song():
         # Get the user's favorites room
         favorites_room_name = f"favorites_{username}"
         
-        # Get existing playlist if it exists
-        existing_playlist_json = get_hash(f"room_playlists{redis_version}", favorites_room_name)
-        if existing_playlist_json:
-            existing_playlist = json.loads(existing_playlist_json)
-            
-            # Check if song exists in favorites
-            for song in existing_playlist:
-                if song.get('song_id') == song_id:
-                    return jsonify({
-                        "is_favorited": True
-                    })
+        # Check if song exists in favorites
+        if redis_api.get_playlist_index(favorites_room_name, song_id) is not None:
+            return jsonify({
+                "is_favorited": True
+            })
         
         # If we get here, the song is not favorited
         return jsonify({
@@ -3204,9 +3104,10 @@ def get_user_logs():
         # Get pagination parameters
         limit = int(request.args.get('limit', 50))
         start = int(request.args.get('start', 0))
+        before = request.args.get('before')
         
         # Get logs for the user
-        logs = user_logging.get_user_logs(username, start=start, limit=limit)
+        logs = user_logging.get_user_logs(username, start=start, limit=limit, before=before)
         
         return jsonify({
             "success": True,
@@ -3214,6 +3115,8 @@ def get_user_logs():
             "count": len(logs),
             "start": start,
             "limit": limit,
+            # Pass as before= to read the next page by stream id
+            "next_before": logs[-1]['log_id'] if len(logs) == limit else None,
             "username": username
         })
     except Exception as e:
@@ -3248,16 +3151,19 @@ def get_global_logs():
         # Get pagination parameters
         limit = int(request.args.get('limit', 50))
         start = int(request.args.get('start', 0))
+        before = request.args.get('before')
         
         # Get global logs
-        logs = user_logging.get_global_logs(start=start, limit=limit)
+        logs = user_logging.get_global_logs(start=start, limit=limit, before=before)
         
         return jsonify({
             "success": True,
             "logs": logs,
             "count": len(logs),
             "start": start,
-            "limit": limit
+            "limit": limit,
+            # Pass as before= to read the next page by stream id
+            "next_before": logs[-1]['log_id'] if len(logs) == limit else None
         })
     except Exception as e:
         logger.error(f"Error getting global logs: {str(e)}")
@@ -3280,9 +3186,10 @@ def get_room_logs(room_name):
         # Get pagination parameters
         limit = int(request.args.get('limit', 50))
         start = int(request.args.get('start', 0))
+        before = request.args.get('before')
         
         # Get logs for the room
-        logs = user_logging.get_room_logs(room_name, start=start, limit=limit)
+        logs = user_logging.get_room_logs(room_name, start=start, limit=limit, before=before)
         
         return jsonify({
             "success": True,
@@ -3290,6 +3197,8 @@ def get_room_logs(room_name):
             "count": len(logs),
             "start": start,
             "limit": limit,
+            # Pass as before= to read the next page by stream id
+            "next_before": logs[-1]['log_id'] if len(logs) == limit else None,
             "room_name": room_name
         }), 200
     except Exception as e:
@@ -3577,19 +3486,8 @@ def format_user_profile(username, profile=None):
     return profile
 
 def get_user_avatar_url(username):
-    """Get the avatar URL for a user."""
-    # Find the most recent avatar file for this user
-    try:
-        avatar_files = list(AVATARS_DIR.glob(f"{username}_*.jpg"))
-        if avatar_files:
-            # Get the most recent file
-            latest_avatar = max(avatar_files, key=lambda x: x.stat().st_mtime)
-            filename = latest_avatar.name
-            return f"/api/avatar/{username}"
-    except Exception as e:
-        logger.error(f"Error getting avatar URL for {username}: {str(e)}")
-    
-    # If no uploaded avatar or error, return the default avatar URL
+    """Get the avatar URL for a user. /api/avatar/<username> picks the latest uploaded
+    avatar (or the default one) itself, so no file lookup is needed here."""
     return f"/api/avatar/{username}"
 
 # def set_room_host(room_name, username, avatar, update_timestamp=True):
@@ -3678,6 +3576,7 @@ def google_login():
                 
                 # Store user profile in user_profiles{redis_version}
                 write_hash(f"user_profiles{redis_version}", username, json.dumps(profile))
+                redis_api.invalidate_profile_cache(username)
                 
                 # Store a placeholder password hash for Google users
                 # This ensures consistency with regular user accounts
@@ -3716,6 +3615,7 @@ def google_login():
                 
                 # Update user profile in Redis
                 write_hash(f"user_profiles{redis_version}", username, json.dumps(profile))
+                redis_api.invalidate_profile_cache(username)
                 
                 logger.info(f"Updated existing user account for Google user: {username}")
             
@@ -3802,18 +3702,10 @@ def get_my_requests():
         user_requests = []
 
         # Pre-load playlist and player state once for efficiency
-        playlist_json = get_hash(f"room_playlists{redis_version}", room_name)
-        playlist = json.loads(playlist_json) if playlist_json else []
+        playlist = redis_api.get_room_playlist(room_name)
         logger.info(f"Playlist for {room_name} ({username}): {playlist}")
 
-        current_state = room_player_states.get(room_name, {})
-        if not current_state:
-            current_state_json = get_hash(f"room_player_states{redis_version}", room_name)
-            if current_state_json:
-                try:
-                    current_state = json.loads(current_state_json)
-                except json.JSONDecodeError:
-                    current_state = {}
+        current_state = get_cached_player_state(room_name) or {}
         current_index = current_state.get('index', -1)
 
         # Iterate through each request ID and build the response list for this user
@@ -3912,7 +3804,7 @@ def get_my_requests():
 
 if __name__ == '__main__':
     # app.run(port=3000, host='10.72.252.213', debug=True)
-     socketio.run(app, port=5000, host='0.0.0.0', debug=True)    # http://13.56.253.58/
+     socketio.run(app, port=int(os.environ.get('PORT', 5000)), host='0.0.0.0', debug=True)    # http://13.56.253.58/
 
 # @app.route('/images/<path:filename>')
 def serve_image_file(filename):
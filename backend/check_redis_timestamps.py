@@ -10,6 +10,7 @@ redis_port = int(os.environ.get('REDIS_PORT', 6379))
 redis_db = int(os.environ.get('REDIS_DB', 0))
 redis_password = os.environ.get('REDIS_PASSWORD', None)
 redis_version = '_v1'  # Hardcoded to match the correct version
+GLOBAL_ACTIVITY_STREAM = f"activity_stream{redis_version}"
 
 # Create Redis client
 redis_client = redis.Redis(
@@ -20,6 +21,12 @@ redis_client = redis.Redis(
     decode_responses=False  # We'll handle decoding manually
 )
 
+def _latest_log_entries(r, key, count):
+    """Newest log entries of an activity stream (or a legacy sorted set) as raw JSON."""
+    if r.type(key) == b'stream':
+        return [fields[b'entry'] for _, fields in r.xrevrange(key, count=count)]
+    return r.zrevrange(key, 0, count - 1)
+
 def test_timestamp_formatting():
     """Test our timestamp formatting code with real data from Redis"""
     print("Testing timestamp formatting with real data from Redis...")
@@ -33,9 +40,8 @@ def test_timestamp_formatting():
         decode_responses=False
     )
     
-    # Get a sample entry from global_logs_v1
-    global_log_key = f"global_logs{redis_version}"
-    sample = r.zrevrange(global_log_key, 0, 0)
+    # Get a sample entry from the global activity stream
+    sample = _latest_log_entries(r, GLOBAL_ACTIVITY_STREAM, 1)
     
     if not sample:
         print("No sample found in global logs")
@@ -91,7 +97,7 @@ def scan_redis_for_logs():
         log_keys = []
         
         while True:
-            cursor, keys = r.scan(cursor, match="*log*", count=100)
+            cursor, keys = r.scan(cursor, match="*activity_stream*", count=100)
             for key in keys:
                 key_str = key.decode('utf-8')
                 log_keys.append(key_str)
@@ -108,14 +114,14 @@ def scan_redis_for_logs():
                 key_type = r.type(key).decode('utf-8')
                 print(f"    Type: {key_type}")
                 
-                # For sorted sets, get the count
-                if key_type == 'zset':
-                    count = r.zcard(key)
+                # For streams, get the length
+                if key_type == 'stream':
+                    count = r.xlen(key)
                     print(f"    Count: {count}")
                     
                     if count > 0:
                         # Check a sample entry
-                        sample = r.zrevrange(key, 0, 0)
+                        sample = _latest_log_entries(r, key, 1)
                         if sample:
                             try:
                                 sample_data = json.loads(sample[0].decode('utf-8'))
@@ -140,7 +146,7 @@ def scan_redis_for_logs():
             print(f"No log-related keys found in database {db}")
 
 def check_redis_timestamps(db_num=0, key_name=None):
-    """Check the format of timestamps stored in Redis global logs"""
+    """Check the format of timestamps stored in the Redis global activity stream"""
     try:
         # Connect to the specified database
         r = redis.Redis(
@@ -151,9 +157,9 @@ def check_redis_timestamps(db_num=0, key_name=None):
             decode_responses=False
         )
         
-        # Get the global logs key
+        # Get the global activity stream key
         if key_name is None:
-            key_name = f"global_logs{redis_version}"
+            key_name = GLOBAL_ACTIVITY_STREAM
             
         print(f"Checking timestamps in Redis key: {key_name} (DB: {db_num})")
         
@@ -166,12 +172,12 @@ def check_redis_timestamps(db_num=0, key_name=None):
         key_type = r.type(key_name).decode('utf-8')
         print(f"Key type: {key_type}")
         
-        if key_type != 'zset':
-            print(f"Key {key_name} is not a sorted set, cannot process as logs")
+        if key_type not in ('stream', 'zset'):
+            print(f"Key {key_name} is not a stream or sorted set, cannot process as logs")
             return
         
-        # Get all logs from sorted set (newest first, limit to 10 for brevity)
-        all_log_entries = r.zrevrange(key_name, 0, 10)
+        # Get the newest logs (limit to 10 for brevity)
+        all_log_entries = _latest_log_entries(r, key_name, 10)
         
         if not all_log_entries:
             print("No log entries found in Redis.")
@@ -216,4 +222,4 @@ if __name__ == "__main__":
     scan_redis_for_logs()
     
     # Then check specific keys if found
-    check_redis_timestamps(db_num=0, key_name="global_logs_v1")
+    check_redis_timestamps(db_num=0, key_name=GLOBAL_ACTIVITY_STREAM)
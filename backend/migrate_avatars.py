@@ -1,17 +1,16 @@
 #!/usr/bin/env python3
 import json
-import redis
 import logging
 from pathlib import Path
 from datetime import datetime
 
+from util.redis_pool import get_redis_client
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Redis configuration
-REDIS_HOST = 'localhost'
-REDIS_PORT = 6379
 redis_version = '_v1'  # Same as in app.py
 
 # Define paths
@@ -23,7 +22,7 @@ AVATARS_DIR = STATIC_DIR / 'avatars'
 logger.info(f"Using avatars directory: {AVATARS_DIR}")
 
 # Connect to Redis
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+redis_client = get_redis_client(decode_responses=True)
 
 def get_hash(hash_name, key):
     """Get a hash value from Redis."""
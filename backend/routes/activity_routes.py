@@ -1,12 +1,16 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import os
 import json
 import logging
 import zipfile
-from io import BytesIO
+import shutil
+import tempfile
+from io import StringIO
 import csv
 import util.redis_api as redis_api
+import util.youtube_music as youtube_music
 from util import user_logging
+from util.coin_manager import get_user_coins_bulk
 import sys
 
 # Configure logging
@@ -169,62 +173,169 @@ def export_recommendation_dataset():
             })
         
         elif format_type == 'csv':
-            # Create in-memory zip file
-            memory_file = BytesIO()
-            with zipfile.ZipFile(memory_file, 'w') as zf:
-                # Add song interactions CSV
-                song_interactions = user_logging.export_user_song_interactions()
-                if song_interactions:
-                    si_file = BytesIO()
-                    si_writer = csv.DictWriter(si_file, fieldnames=song_interactions[0].keys())
-                    si_writer.writeheader()
-                    si_writer.writerows(song_interactions)
-                    zf.writestr('song_interactions.csv', si_file.getvalue())
-                
-                # Add room interactions CSV
-                room_interactions = user_logging.export_user_room_interactions()
-                if room_interactions:
-                    ri_file = BytesIO()
-                    ri_writer = csv.DictWriter(ri_file, fieldnames=room_interactions[0].keys())
-                    ri_writer.writeheader()
-                    ri_writer.writerows(room_interactions)
-                    zf.writestr('room_interactions.csv', ri_file.getvalue())
-                
-                # Add song features CSV
-                song_features = user_logging.export_song_features()
-                if song_features:
-                    sf_file = BytesIO()
-                    sf_writer = csv.DictWriter(sf_file, fieldnames=song_features[0].keys())
-                    sf_writer.writeheader()
-                    sf_writer.writerows(song_features)
-                    zf.writestr('song_features.csv', sf_file.getvalue())
-                
-                # Add room features CSV
-                room_features = user_logging.export_room_features()
-                if room_features:
-                    rf_file = BytesIO()
-                    rf_writer = csv.DictWriter(rf_file, fieldnames=room_features[0].keys())
-                    rf_writer.writeheader()
-                    rf_writer.writerows(room_features)
-                    zf.writestr('room_features.csv', rf_file.getvalue())
-            
-            # Reset file pointer
-            memory_file.seek(0)
+            # Same archive as /export/dataset/stream, built chunk by chunk as it is sent
+            return Response(
+                stream_with_context(_stream_dataset_zip('csv')),
+                mimetype='application/zip',
+                headers={'Content-Disposition': 'attachment; filename=recommendation_dataset.zip'}
+            )
+        
+        elif format_type == 'parquet':
+            # Write the partitioned Parquet dataset to a scratch directory and stream it as a zip
+            partition_by_date = request.args.get('partition_by_date', 'true').lower() != 'false'
+            export_dir = tempfile.mkdtemp(prefix='aico_parquet_')
+            try:
+                user_logging.export_parquet_dataset(export_dir, partition_by_date=partition_by_date)
+            except Exception:
+                shutil.rmtree(export_dir, ignore_errors=True)
+                raise
             
-            return send_file(
-                memory_file,
+            response = Response(
+                stream_with_context(_stream_directory_zip(export_dir)),
                 mimetype='application/zip',
-                as_attachment=True,
-                download_name='recommendation_dataset.zip'
+                headers={'Content-Disposition': 'attachment; filename=recommendation_dataset_parquet.zip'}
             )
+            # Runs whether or not the client read the whole archive
+            response.call_on_close(lambda: shutil.rmtree(export_dir, ignore_errors=True))
+            return response
         
         else:
-            return jsonify({"error": "Invalid format. Use 'json' or 'csv'"}), 400
+            return jsonify({"error": "Invalid format. Use 'json', 'csv' or 'parquet'"}), 400
             
     except Exception as e:
         logger.error(f"Error exporting recommendation dataset: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Rows encoded before the buffered zip bytes are sent to the client
+STREAM_CHUNK_ROWS = 500
+# Bytes of a file copied into the zip before the buffered zip bytes are sent to the client
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+class _ZipStream:
+    """Write-only file object that collects zipfile output so it can be yielded as it is produced."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _encode_rows(rows, fields, format_type):
+    """Encode a chunk of rows as CSV (list values as JSON) or NDJSON."""
+    if format_type == 'ndjson':
+        return ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+    text = StringIO()
+    writer = csv.DictWriter(text, fieldnames=fields, extrasaction='ignore')
+    for row in rows:
+        writer.writerow({key: json.dumps(value) if isinstance(value, list) else value
+                         for key, value in row.items()})
+    return text.getvalue().encode('utf-8')
+
+def _stream_dataset_zip(format_type):
+    """Yield a zip archive of the four datasets, one chunk of rows at a time."""
+    datasets = [
+        ('song_interactions', user_logging.SONG_INTERACTION_FIELDS, user_logging.iter_song_interactions()),
+        ('room_interactions', user_logging.ROOM_INTERACTION_FIELDS, user_logging.iter_room_interactions()),
+        ('song_features', user_logging.SONG_FEATURE_FIELDS, user_logging.iter_song_features()),
+        ('room_features', user_logging.ROOM_FEATURE_FIELDS, user_logging.iter_room_features()),
+    ]
+    out = _ZipStream()
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, fields, rows in datasets:
+            # The archive is never seeked, so entries use data descriptors; zip64 allows any size
+            with zf.open(f"{name}.{format_type}", 'w', force_zip64=True) as entry:
+                if format_type == 'csv':
+                    entry.write((','.join(fields) + '\r\n').encode('utf-8'))
+                chunk = []
+                for row in rows:
+                    chunk.append(row)
+                    if len(chunk) >= STREAM_CHUNK_ROWS:
+                        entry.write(_encode_rows(chunk, fields, format_type))
+                        chunk = []
+                        yield out.drain()
+                if chunk:
+                    entry.write(_encode_rows(chunk, fields, format_type))
+            yield out.drain()
+    yield out.drain()
+
+def _stream_directory_zip(directory):
+    """Yield a zip archive of every file under directory, one block of file data at a time."""
+    out = _ZipStream()
+    # Parquet files are already compressed, so entries are stored as they are
+    with zipfile.ZipFile(out, 'w') as zf:
+        for root, _, files in os.walk(directory):
+            for file_name in files:
+                file_path = os.path.join(root, file_name)
+                with open(file_path, 'rb') as source, \
+                        zf.open(os.path.relpath(file_path, directory), 'w', force_zip64=True) as entry:
+                    for block in iter(lambda: source.read(STREAM_CHUNK_BYTES), b''):
+                        entry.write(block)
+                        yield out.drain()
+                yield out.drain()
+    yield out.drain()
+
+@activity_routes.route('/export/dataset/stream', methods=['GET'])
+def stream_recommendation_dataset():
+    """API endpoint to stream the recommendation dataset as a zip of CSV or NDJSON files"""
+    try:
+        username, error = verify_admin_access()
+        if error:
+            return error
+
+        format_type = request.args.get('format', 'csv')
+        if format_type not in ('csv', 'ndjson'):
+            return jsonify({"error": "Invalid format. Use 'csv' or 'ndjson'"}), 400
+
+        return Response(
+            stream_with_context(_stream_dataset_zip(format_type)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=recommendation_dataset.zip'}
+        )
+    except Exception as e:
+        logger.error(f"Error streaming recommendation dataset: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@activity_routes.route('/stats/song-cache', methods=['GET'])
+def get_song_cache_stats():
+    """API endpoint to report hit/miss counters of the song resolution cache"""
+    try:
+        username, error = verify_admin_access()
+        if error:
+            return error
+
+        return jsonify({
+            "success": True,
+            "data": youtube_music.get_song_cache_stats()
+        })
+    except Exception as e:
+        logger.error(f"Error getting song cache stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@activity_routes.route('/stats/activity-writer', methods=['GET'])
+def get_activity_writer_stats():
+    """API endpoint to report queue and drop counters of the background activity log writer"""
+    try:
+        username, error = verify_admin_access()
+        if error:
+            return error
+
+        return jsonify({
+            "success": True,
+            "data": user_logging.get_activity_writer_stats()
+        })
+    except Exception as e:
+        logger.error(f"Error getting activity writer stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @activity_routes.route('/export/user-analytics', methods=['GET'])
 def export_user_analytics():
     """API endpoint to export user analytics data for admin dashboard"""
@@ -236,16 +347,22 @@ def export_user_analytics():
         # Get all usernames from user_profiles
         all_users = []
         user_keys = redis_api.redis_client.hkeys(f"user_profiles{redis_version}")
+        usernames = [user_key.decode('utf-8') if isinstance(user_key, bytes) else user_key for user_key in user_keys]
+        
+        logger.info(f"Found {len(usernames)} user profiles")
         
-        logger.info(f"Found {len(user_keys)} user profiles")
+        # Load profiles and coin balances in bulk instead of a few round trips per user
+        profiles = dict(zip(usernames, redis_api.redis_client.hmget(f"user_profiles{redis_version}", usernames))) if usernames else {}
+        try:
+            all_coins = get_user_coins_bulk(usernames)
+        except Exception as e:
+            logger.error(f"Error getting coin balances: {str(e)}")
+            all_coins = {}
         
-        for user_key in user_keys:
+        for username_str in usernames:
             try:
-                username_str = user_key.decode('utf-8') if isinstance(user_key, bytes) else user_key
-                logger.info(f"Processing user: {username_str}")
-                
                 # Get user profile data
-                profile_json = redis_api.get_hash(f"user_profiles{redis_version}", username_str)
+                profile_json = profiles.get(username_str)
                 if not profile_json:
                     logger.warning(f"No profile found for user {username_str}")
                     continue
@@ -256,7 +373,6 @@ def export_user_analytics():
                         profile_json = profile_json.decode('utf-8')
                     
                     profile = json.loads(profile_json)
-                    logger.info(f"Successfully parsed profile for {username_str}")
                 except json.JSONDecodeError as e:
                     logger.error(f"Error parsing profile JSON for {username_str}: {str(e)}")
                     continue
@@ -269,12 +385,7 @@ def export_user_analytics():
                     avatar_url = f"/api/avatar/{username_str}"
                 
                 # Get user coin balance
-                try:
-                    coins = get_user_coins(username_str)
-                    logger.info(f"User {username_str} has {coins} coins")
-                except Exception as e:
-                    logger.error(f"Error getting coins for user {username_str}: {str(e)}")
-                    coins = 0
+                coins = all_coins.get(username_str, 0)
                 
                 # Get user stats
                 created_rooms = profile.get('created_rooms', [])
@@ -301,8 +412,6 @@ def export_user_analytics():
                             play_count += 1
                         elif log.get('action') == 'favorite_song':
                             favorite_count += 1
-                    
-                    logger.info(f"User {username_str} has {play_count} plays and {favorite_count} favorites")
                 except Exception as e:
                     logger.error(f"Error getting logs for {username_str}: {str(e)}")
                 
@@ -324,9 +433,8 @@ def export_user_analytics():
                 }
                 
                 all_users.append(user_data)
-                logger.info(f"Successfully added user {username_str} to analytics")
             except Exception as e:
-                logger.error(f"Error processing user {user_key}: {str(e)}")
+                logger.error(f"Error processing user {username_str}: {str(e)}")
                 continue
         
         # Sort users by join date (newest first)
@@ -343,42 +451,6 @@ def export_user_analytics():
         logger.error(f"Error exporting user analytics: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-def get_user_coins(username):
-    """
-    Get a user's current coin balance.
-    
-    Args:
-        username (str): Username to get coins for
-        
-    Returns:
-        int: Current coin balance
-    """
-    try:
-        # Get user data (primary storage)
-        user_data = redis_api.get_user_data(username)
-        
-        # If coins exists in user_data, return that value
-        if 'coins' in user_data:
-            return int(user_data.get('coins', 0))
-        
-        # Fallback to user_profiles if not in user_data
-        profile_json = redis_api.get_hash(f"user_profiles{redis_version}", username)
-        if profile_json:
-            profile = json.loads(profile_json) if isinstance(profile_json, str) else json.loads(profile_json.decode('utf-8'))
-            coins = profile.get('coins', 0)
-            
-            # Sync to user_data for future requests
-            user_data['coins'] = coins
-            redis_api.set_user_data(username, user_data)
-            
-            return int(coins)
-        
-        # Default to 0 if no coins found
-        return 0
-    except Exception as e:
-        logger.error(f"Error getting coins for user {username}: {str(e)}")
-        return 0
-
 @activity_routes.route('/auth/user', methods=['GET'])
 def get_current_user():
     """Get current user data"""
@@ -396,8 +468,6 @@ def get_current_user():
         
         # Get user data
         user_data = redis_api.get_user_data(username)
-
-        logger.info(f"User data: {user_data}")
         
         return jsonify({
             "success": True,
@@ -2,7 +2,7 @@ import logging
 import json
 from datetime import datetime
 from flask import Blueprint, request, jsonify
-from util.redis_api import get_hash, write_hash, redis_version
+from util.redis_api import get_hash, write_hash, redis_version, room_playlist_exists, update_room_summary
 from util.coin_manager import get_user_coins, add_user_coins, use_user_coins
 
 # Set up logging
@@ -112,8 +112,7 @@ def set_pin_price():
             return jsonify({"error": "Price must be a valid number"}), 400
         
         # Check if room exists in playlist
-        playlist_data = get_hash(f"room_playlists{redis_version}", room_name)
-        if not playlist_data:
+        if not room_playlist_exists(room_name):
             return jsonify({"error": "Room not found"}), 404
         
         # Check if user is the host of the room
@@ -152,6 +151,7 @@ def set_pin_price():
                 "created_at": datetime.now().isoformat()
             }
             write_hash(f"room_hosts{redis_version}", room_name, json.dumps(host_data))
+            update_room_summary(room_name, host=host_data)
             
             # Add host info to room metadata
             room_metadata_key = f"room_metadata{redis_version}"
@@ -5,7 +5,7 @@ import json
 from flask import Blueprint, request, jsonify, redirect
 from util.redis_api import get_hash, write_hash
 from util import user_logging
-import redis
+from util.redis_pool import get_redis_client
 from util.coin_manager import get_user_coins, add_user_coins, use_user_coins, check_coin_balance
 from keys import STRIPE_SECRET_KEY
 
@@ -13,7 +13,7 @@ from keys import STRIPE_SECRET_KEY
 logger = logging.getLogger(__name__)
 
 # Initialize Redis client
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+redis_client = get_redis_client()
 redis_version = '_v1'
 
 # Initialize Stripe with your secret key
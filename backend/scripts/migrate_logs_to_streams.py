@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+import sys
+import json
+import logging
+from pathlib import Path
+
+# Add the parent directory to Python path to import util modules
+sys.path.append(str(Path(__file__).parent.parent))
+from util.redis_pool import get_redis_client
+from util.user_logging import (GLOBAL_ACTIVITY_STREAM, GLOBAL_STREAM_MAXLEN, USER_STREAM_MAXLEN,
+                               ROOM_STREAM_MAXLEN, _user_stream_key, _room_stream_key)
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Redis configuration
+redis_client = get_redis_client()
+redis_version = '_v1'  # Make sure this matches your app's redis_version
+
+# Number of legacy log entries read and written per round trip
+BATCH_SIZE = 1000
+
+# Streams whose legacy history has been merged in; they are skipped when the script is re-run
+MIGRATED_STREAMS_KEY = f"activity_streams_migrated{redis_version}"
+
+# Copies the entries the app wrote to the live stream since the last batch onto the rebuilt
+# stream, then swaps the rebuilt stream in, keeping consumer groups at their last delivered id.
+# KEYS: live stream, rebuilt stream, migrated set
+# ARGV: last live id copied ('' if none), last id of the rebuilt stream, MAXLEN
+_SWAP_STREAM_LUA = """
+local live, rebuilt = KEYS[1], KEYS[2]
+local last_ms, last_seq = string.match(ARGV[2], '(%d+)-(%d+)')
+last_ms, last_seq = tonumber(last_ms), tonumber(last_seq)
+
+local entries
+if ARGV[1] == '' then
+    entries = redis.call('XRANGE', live, '-', '+')
+else
+    entries = redis.call('XRANGE', live, ARGV[1], '+')
+    if entries[1] and entries[1][1] == ARGV[1] then
+        table.remove(entries, 1)
+    end
+end
+
+for _, entry in ipairs(entries) do
+    local ms, seq = string.match(entry[1], '(%d+)-(%d+)')
+    ms, seq = tonumber(ms), tonumber(seq)
+    if ms < last_ms or (ms == last_ms and seq <= last_seq) then
+        ms, seq = last_ms, last_seq + 1
+    end
+    redis.call('XADD', rebuilt, string.format('%d-%d', ms, seq), unpack(entry[2]))
+    last_ms, last_seq = ms, seq
+end
+
+if redis.call('EXISTS', live) == 1 then
+    for _, group in ipairs(redis.call('XINFO', 'GROUPS', live)) do
+        local info = {}
+        for i = 1, #group, 2 do
+            info[group[i]] = group[i + 1]
+        end
+        redis.call('XGROUP', 'CREATE', rebuilt, info['name'], info['last-delivered-id'])
+    end
+end
+redis.call('RENAME', rebuilt, live)
+redis.call('XTRIM', live, 'MAXLEN', '~', ARGV[3])
+redis.call('SADD', KEYS[3], live)
+return #entries
+"""
+
+_swap_stream_script = redis_client.register_script(_SWAP_STREAM_LUA)
+
+def _rebuilt_stream_key(key):
+    return f"migrating_stream{redis_version}:{key}"
+
+def _next_stream_id(last_id, millis):
+    """Smallest stream id after last_id, at millis if that is later."""
+    last_millis, last_seq = last_id
+    if millis > last_millis:
+        return millis, 0
+    return last_millis, last_seq + 1
+
+def _parse_stream_id(entry_id):
+    millis, seq = entry_id.decode('utf-8').split('-')
+    return int(millis), int(seq)
+
+def copy_legacy_entries(migrated):
+    """
+    Write the legacy global_logs history into rebuilt copies of the streams, oldest first.
+
+    Args:
+        migrated (set): Stream keys already migrated by an earlier run; they are skipped
+
+    Returns:
+        dict: Stream key -> (last id written, MAXLEN) for every rebuilt stream
+    """
+    global_log_key = f"global_logs{redis_version}"
+    total = redis_client.zcard(global_log_key)
+    logger.info(f"Migrating {total} legacy log entries...")
+
+    rebuilt = {}
+    copied = 0
+    for start in range(0, total, BATCH_SIZE):
+        entries = redis_client.zrange(global_log_key, start, start + BATCH_SIZE - 1, withscores=True)
+        pipe = redis_client.pipeline(transaction=False)
+        for entry, score in entries:
+            try:
+                log_data = json.loads(entry.decode('utf-8'))
+            except json.JSONDecodeError:
+                logger.error(f"Invalid JSON log entry: {entry[:100]}")
+                continue
+
+            targets = [(GLOBAL_ACTIVITY_STREAM, GLOBAL_STREAM_MAXLEN)]
+            if log_data.get('username'):
+                targets.append((_user_stream_key(log_data['username']), USER_STREAM_MAXLEN))
+            if log_data.get('room_name'):
+                targets.append((_room_stream_key(log_data['room_name']), ROOM_STREAM_MAXLEN))
+
+            millis = int(score * 1000)
+            for key, maxlen in targets:
+                if key in migrated:
+                    continue
+                if key not in rebuilt:
+                    # Drop what an interrupted run left behind
+                    pipe.delete(_rebuilt_stream_key(key))
+                    last_id = (-1, -1)
+                else:
+                    last_id = rebuilt[key][0]
+                # Entries logged in the same millisecond get increasing sequence numbers
+                millis_for_key, seq = _next_stream_id(last_id, millis)
+                rebuilt[key] = ((millis_for_key, seq), maxlen)
+                pipe.xadd(_rebuilt_stream_key(key), {"entry": entry}, id=f"{millis_for_key}-{seq}",
+                          maxlen=maxlen, approximate=True)
+                copied += 1
+        pipe.execute()
+        logger.info(f"Processed {min(start + BATCH_SIZE, total)}/{total} entries")
+
+    logger.info(f"Copied {copied} legacy entries into {len(rebuilt)} streams")
+    return rebuilt
+
+def merge_live_stream(key, last_id, maxlen):
+    """
+    Merge the entries the app already wrote to a stream after its legacy history and swap
+    the rebuilt stream in. Live entries are copied in batches; the ones written meanwhile
+    are copied atomically with the swap, so no activity is lost.
+
+    Args:
+        key (str): Live stream key
+        last_id (tuple): (millis, seq) of the last entry in the rebuilt stream
+        maxlen (int): MAXLEN the stream is trimmed to
+
+    Returns:
+        int: Number of live entries merged
+    """
+    rebuilt_key = _rebuilt_stream_key(key)
+    merged = 0
+    last_live_id = None
+    while True:
+        entries = redis_client.xrange(key, min=last_live_id or '-', count=BATCH_SIZE + 1)
+        if last_live_id is not None:
+            entries = entries[1:]  # the range includes the last entry already copied
+        if not entries:
+            break
+        pipe = redis_client.pipeline(transaction=False)
+        for entry_id, fields in entries:
+            # Live entries normally follow the legacy history; any that overlap it are
+            # appended after it in their original order
+            millis, seq = _parse_stream_id(entry_id)
+            if (millis, seq) <= last_id:
+                millis, seq = _next_stream_id(last_id, millis)
+            last_id = (millis, seq)
+            pipe.xadd(rebuilt_key, fields, id=f"{millis}-{seq}", maxlen=maxlen, approximate=True)
+        pipe.execute()
+        merged += len(entries)
+        last_live_id = entries[-1][0].decode('utf-8')
+
+    merged += _swap_stream_script(keys=[key, rebuilt_key, MIGRATED_STREAMS_KEY],
+                                  args=[last_live_id or '', f"{last_id[0]}-{last_id[1]}", maxlen])
+    return merged
+
+def migrate_global_logs():
+    """
+    Merge the legacy global_logs sorted set into the activity streams.
+
+    The legacy global log holds every activity, so user and room streams are built from it.
+    Entries keep their original time as the stream id and are merged in front of what the
+    app has written since, so the script can run while the app is serving. Streams already
+    merged are recorded in MIGRATED_STREAMS_KEY, so re-running it does not copy them twice.
+    """
+    migrated = {member.decode('utf-8') for member in redis_client.smembers(MIGRATED_STREAMS_KEY)}
+    if migrated:
+        logger.info(f"Skipping {len(migrated)} streams migrated by an earlier run")
+
+    rebuilt = copy_legacy_entries(migrated)
+    merged = 0
+    for i, (key, (last_id, maxlen)) in enumerate(rebuilt.items(), 1):
+        merged += merge_live_stream(key, last_id, maxlen)
+        if i % BATCH_SIZE == 0:
+            logger.info(f"Swapped {i}/{len(rebuilt)} streams")
+
+    logger.info(f"Migration completed! Merged {len(rebuilt)} streams, keeping {merged} entries written by the app.")
+    return True
+
+def drop_legacy_logs():
+    """
+    Delete the legacy global_logs and user_logs sorted sets. Only run this once their history
+    has been merged into the streams: global_logs is the source of the migration.
+
+    Returns:
+        int: Number of keys deleted
+    """
+    legacy_keys = [f"global_logs{redis_version}"]
+    legacy_keys.extend(redis_client.scan_iter(match=f"user_logs{redis_version}:*", count=BATCH_SIZE))
+    deleted = 0
+    for start in range(0, len(legacy_keys), BATCH_SIZE):
+        # UNLINK frees the large sets in the background instead of blocking Redis
+        deleted += redis_client.unlink(*legacy_keys[start:start + BATCH_SIZE])
+    logger.info(f"Deleted {deleted} legacy log keys")
+    return deleted
+
+def main():
+    """Main function to run the migration."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Migrate legacy activity logs to streams')
+    parser.add_argument('--keep-legacy', action='store_true',
+                        help='Keep the legacy global_logs and user_logs sorted sets after migrating')
+    args = parser.parse_args()
+
+    logger.info("Starting migration of activity logs to streams...")
+    migrate_global_logs()
+    if not args.keep_legacy:
+        drop_legacy_logs()
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,12 @@
 import sys
 import os
 import json
-import redis
 import logging
 from pathlib import Path
 
 # Add the parent directory to Python path to import redis_api
 sys.path.append(str(Path(__file__).parent.parent))
+from util.redis_pool import get_redis_client
 from util.redis_api import get_hash, write_hash, get_all_hash, delete_hash
 
 # Setup logging
@@ -18,7 +18,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Redis configuration
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+redis_client = get_redis_client()
 redis_version = '_v1'  # Make sure this matches your app's redis_version
 
 def backup_redis_data(key_pattern):
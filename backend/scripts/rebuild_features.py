@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import sys
+import json
+import logging
+from pathlib import Path
+
+# Add the parent directory to Python path to import util modules
+sys.path.append(str(Path(__file__).parent.parent))
+from util.redis_pool import get_redis_client
+from util.user_logging import (GLOBAL_ACTIVITY_STREAM, SONG_FEATURES_INDEX_KEY, ROOM_FEATURES_INDEX_KEY,
+                               SONG_COUNTER_FIELDS, _record_features, _song_features_key, _song_rooms_key,
+                               _song_users_key, _room_features_key, _room_users_key)
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Redis configuration
+redis_client = get_redis_client()
+
+# Number of stream entries read and replayed per round trip
+BATCH_SIZE = 1000
+
+def reset_features():
+    """Clear the counters derived from activity logs (song titles and play counts are kept)."""
+    song_ids = [member.decode('utf-8') for member in redis_client.smembers(SONG_FEATURES_INDEX_KEY)]
+    room_ids = [member.decode('utf-8') for member in redis_client.smembers(ROOM_FEATURES_INDEX_KEY)]
+
+    pipe = redis_client.pipeline(transaction=False)
+    for song_id in song_ids:
+        pipe.hdel(_song_features_key(song_id), *SONG_COUNTER_FIELDS.values())
+        pipe.delete(_song_rooms_key(song_id), _song_users_key(song_id))
+    for room_id in room_ids:
+        pipe.delete(_room_features_key(room_id), _room_users_key(room_id))
+    pipe.delete(ROOM_FEATURES_INDEX_KEY)
+    pipe.execute()
+    logger.info(f"Reset features for {len(song_ids)} songs and {len(room_ids)} rooms")
+
+def replay_activity_stream():
+    """Recount features from every activity still in the global stream."""
+    replayed = 0
+    last_id = '-'
+    while True:
+        entries = redis_client.xrange(GLOBAL_ACTIVITY_STREAM, min=last_id, count=BATCH_SIZE)
+        if last_id != '-':
+            entries = entries[1:]  # the range is inclusive of the last id already replayed
+        if not entries:
+            break
+
+        pipe = redis_client.pipeline(transaction=False)
+        for entry_id, fields in entries:
+            try:
+                _record_features(pipe, json.loads(fields[b'entry'].decode('utf-8')))
+            except json.JSONDecodeError:
+                logger.error(f"Invalid JSON in stream entry {entry_id}")
+        pipe.execute()
+
+        replayed += len(entries)
+        last_id = entries[-1][0]
+        logger.info(f"Replayed {replayed} activities")
+
+    logger.info(f"Rebuild completed! Replayed {replayed} activities.")
+
+def main():
+    """Main function to rebuild feature counters. Activities logged while this runs may be counted twice."""
+    logger.info("Rebuilding song and room features from the activity stream...")
+    reset_features()
+    replay_activity_stream()
+
+if __name__ == "__main__":
+    main()
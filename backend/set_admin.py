@@ -4,10 +4,11 @@ Script to set a user as an admin in Redis.
 Default admin users are defined in the ADMIN_USERS list in app.py.
 """
 
-import redis
 import sys
 import logging
 
+from util.redis_pool import get_redis_client
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -23,7 +24,7 @@ def set_admin_user(username=None):
     """
     try:
         # Connect to Redis
-        redis_client = redis.Redis(host='localhost', port=6379, db=0)
+        redis_client = get_redis_client()
         
         # Get username from command line if not provided
         if username is None:
@@ -0,0 +1,32 @@
+"""
+Tests run against an in-process fakeredis server. Modules get their client from
+util.redis_pool when they are imported, so the pool is replaced here before any test
+module imports them.
+"""
+
+import os
+import sys
+
+import fakeredis
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util import redis_pool
+
+_server = fakeredis.FakeServer()
+
+
+def _fake_redis_client(decode_responses=False):
+    return fakeredis.FakeRedis(server=_server, decode_responses=decode_responses)
+
+
+redis_pool.get_redis_client = _fake_redis_client
+
+
+@pytest.fixture(autouse=True)
+def redis_client():
+    """Empty fake Redis for every test."""
+    client = _fake_redis_client()
+    client.flushall()
+    return client
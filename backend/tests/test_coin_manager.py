@@ -0,0 +1,74 @@
+import json
+
+from util import coin_manager
+from util.redis_api import redis_version
+
+
+def ledger(redis_client):
+    return [{field.decode('utf-8'): value.decode('utf-8') for field, value in fields.items()}
+            for _, fields in redis_client.xrange(coin_manager.COIN_LEDGER_KEY)]
+
+
+def test_set_and_add_coins_are_recorded_in_ledger(redis_client):
+    assert coin_manager.set_user_coins('alice', 100, reason='signup')
+    assert coin_manager.add_user_coins('alice', 25, reason='bonus') == 125
+    assert coin_manager.get_user_coins('alice') == 125
+    assert [(entry['delta'], entry['balance'], entry['reason']) for entry in ledger(redis_client)] == [
+        ('100', '100', 'signup'), ('25', '125', 'bonus')]
+
+
+def test_use_coins_rejects_overdraft(redis_client):
+    coin_manager.set_user_coins('alice', 10)
+    result = coin_manager.use_user_coins('alice', 15, feature='express')
+    assert result == {'success': False, 'error': 'Insufficient coins', 'coins': 10, 'required': 15}
+    assert coin_manager.use_user_coins('alice', 10, feature='express') == {'success': True, 'coins': 0, 'used': 10}
+    assert coin_manager.get_user_coins('alice') == 0
+    assert len(ledger(redis_client)) == 2
+
+
+def test_legacy_profile_balance_is_seeded_on_first_change(redis_client):
+    redis_client.hset(f"user_profiles{redis_version}", 'alice', json.dumps({'coins': 40}))
+    assert coin_manager.use_user_coins('alice', 15)['coins'] == 25
+    assert redis_client.hget('user:alice', 'coins') == b'25'
+
+
+def test_transfer_pays_recipient(redis_client):
+    coin_manager.set_user_coins('alice', 50)
+    coin_manager.set_user_coins('host', 5)
+    result = coin_manager.transfer_coins('alice', 'host', 20, reward=8, feature='express')
+    assert result == {'success': True, 'coins': 30, 'used': 20, 'reward': 8}
+    assert coin_manager.get_user_coins('host') == 13
+    transfers = ledger(redis_client)[2:]
+    assert [(entry['user'], entry['delta'], entry['counterparty']) for entry in transfers] == [
+        ('alice', '-20', 'host'), ('host', '8', 'alice')]
+
+
+def test_transfer_with_insufficient_coins_changes_nothing(redis_client):
+    coin_manager.set_user_coins('alice', 10)
+    coin_manager.set_user_coins('host', 5)
+    result = coin_manager.transfer_coins('alice', 'host', 20)
+    assert result['success'] is False
+    assert coin_manager.get_user_coins('alice') == 10
+    assert coin_manager.get_user_coins('host') == 5
+    assert len(ledger(redis_client)) == 2
+
+
+def test_transfer_to_self_or_nobody_only_charges_payer():
+    coin_manager.set_user_coins('alice', 50)
+    assert coin_manager.transfer_coins('alice', 'alice', 10)['reward'] == 0
+    assert coin_manager.transfer_coins('alice', None, 10)['reward'] == 0
+    assert coin_manager.get_user_coins('alice') == 30
+
+
+def test_transfer_seeds_legacy_recipient_balance(redis_client):
+    coin_manager.set_user_coins('alice', 50)
+    redis_client.hset(f"user_profiles{redis_version}", 'host', json.dumps({'coins': 7}))
+    assert coin_manager.transfer_coins('alice', 'host', 10)['success']
+    assert coin_manager.get_user_coins('host') == 17
+
+
+def test_get_user_coins_bulk_falls_back_to_legacy_profiles(redis_client):
+    coin_manager.set_user_coins('alice', 3)
+    redis_client.hset(f"user_profiles{redis_version}", 'bob', json.dumps({'coins': 9}))
+    assert coin_manager.get_user_coins_bulk(['alice', 'bob', 'carol'], chunk_size=2) == {
+        'alice': 3, 'bob': 9, 'carol': 0}
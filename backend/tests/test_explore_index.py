@@ -0,0 +1,41 @@
+from util import redis_api
+
+
+def index_rooms(redis_client, scores):
+    redis_client.zadd(redis_api.ROOMS_BY_CREATED_AT_KEY, scores)
+
+
+def page_names(page):
+    return [room['name'] for room in page['rooms']]
+
+
+def test_pages_do_not_read_room_data_or_rebuild(redis_client, monkeypatch):
+    index_rooms(redis_client, {'a': 1.0})
+    monkeypatch.setattr(redis_api, 'rebuild_explore_index', lambda: 1 / 0)
+    page = redis_api.get_explore_page(10)
+    assert page['total'] == 1
+    assert page['next_cursor'] is None
+
+
+def test_rebuild_is_claimed_once_per_ttl(redis_client):
+    assert redis_api.claim_explore_index_rebuild()
+    assert not redis_api.claim_explore_index_rebuild()
+    redis_api.release_explore_index_rebuild()
+    assert redis_api.claim_explore_index_rebuild()
+
+
+def test_cursor_from_offset_page_counts_ties_on_earlier_pages(redis_client, monkeypatch):
+    # Summaries are stubbed to the names, so only the index order is paged
+    monkeypatch.setattr(redis_api, 'get_room_summaries', lambda names: [{'name': name} for name in names])
+    index_rooms(redis_client, {'new': 5.0, **{f"r{i}": 0 for i in range(7)}})
+    expected = [name.decode('utf-8') for name in redis_client.zrevrange(redis_api.ROOMS_BY_CREATED_AT_KEY, 0, -1)]
+
+    second = redis_api.get_explore_page(3, offset=3)
+    seen = page_names(second)
+    cursor = second['next_cursor']
+    while cursor:
+        page = redis_api.get_explore_page(3, cursor=cursor)
+        seen.extend(page_names(page))
+        cursor = page['next_cursor']
+
+    assert seen == expected[3:]
@@ -0,0 +1,47 @@
+import json
+
+from scripts import migrate_logs_to_streams as migration
+from util.user_logging import GLOBAL_ACTIVITY_STREAM, _room_stream_key, _user_stream_key
+
+
+def add_legacy_log(redis_client, timestamp, action, username='alice', room_name='room'):
+    entry = json.dumps({'username': username, 'room_name': room_name, 'action': action})
+    redis_client.zadd(f"global_logs{migration.redis_version}", {entry: timestamp})
+
+
+def stream_actions(redis_client, key):
+    return [json.loads(fields[b'entry'])['action'] for _, fields in redis_client.xrange(key)]
+
+
+def test_legacy_history_is_merged_before_live_entries(redis_client):
+    add_legacy_log(redis_client, 1000.0, 'old1')
+    add_legacy_log(redis_client, 1000.0, 'old2')
+    add_legacy_log(redis_client, 2000.0, 'old3', room_name='other')
+    redis_client.xadd(GLOBAL_ACTIVITY_STREAM, {'entry': json.dumps({'action': 'live'})}, id='500-0')
+    redis_client.xgroup_create(GLOBAL_ACTIVITY_STREAM, 'features', id='500-0')
+
+    migration.migrate_global_logs()
+
+    assert stream_actions(redis_client, GLOBAL_ACTIVITY_STREAM) == ['old1', 'old2', 'old3', 'live']
+    assert stream_actions(redis_client, _user_stream_key('alice')) == ['old1', 'old2', 'old3']
+    assert stream_actions(redis_client, _room_stream_key('room')) == ['old1', 'old2']
+    assert [group['name'] for group in redis_client.xinfo_groups(GLOBAL_ACTIVITY_STREAM)] == [b'features']
+
+
+def test_rerun_does_not_copy_history_twice(redis_client):
+    add_legacy_log(redis_client, 1000.0, 'old')
+    migration.migrate_global_logs()
+    migration.migrate_global_logs()
+    assert stream_actions(redis_client, GLOBAL_ACTIVITY_STREAM) == ['old']
+    assert stream_actions(redis_client, _user_stream_key('alice')) == ['old']
+
+
+def test_drop_legacy_logs_deletes_the_legacy_sorted_sets(redis_client):
+    add_legacy_log(redis_client, 1000.0, 'old')
+    redis_client.zadd(f"user_logs{migration.redis_version}:alice", {'entry': 1000.0})
+    redis_client.zadd(f"user_logs{migration.redis_version}:bob", {'entry': 1000.0})
+    migration.migrate_global_logs()
+
+    assert migration.drop_legacy_logs() == 3
+    assert redis_client.keys('*_logs*') == []
+    assert stream_actions(redis_client, GLOBAL_ACTIVITY_STREAM) == ['old']
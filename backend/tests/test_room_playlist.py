@@ -0,0 +1,152 @@
+import json
+
+import pytest
+
+from util import redis_api
+
+
+ROOM = 'test_room'
+
+
+def track(i, title=None):
+    return {'song_id': f"s{i}", 'title': title or f"t{i}", 'artist': 'artist', 'cover_img_url': f"cover{i}"}
+
+
+def titles(room_name=ROOM):
+    return [t['title'] for t in redis_api.get_room_playlist(room_name)]
+
+
+@pytest.fixture
+def deltas():
+    received = []
+    callback = lambda room_name, delta: received.append(delta)
+    redis_api.add_playlist_listener(callback)
+    yield received
+    redis_api._playlist_listeners.remove(callback)
+
+
+@pytest.fixture
+def playlist():
+    redis_api.set_room_playlist(ROOM, [track(i) for i in range(6)])
+
+
+def test_set_room_playlist_drops_duplicate_keys_and_titles():
+    stored = redis_api.set_room_playlist(ROOM, [track(0), track(0), track(1, 'T0 '), track(2)])
+    assert [t['song_id'] for t in stored] == ['s0', 's2']
+    assert titles() == ['t0', 't2']
+    assert redis_api.get_room_playlist_version(ROOM) == 1
+
+
+def test_append_skips_tracks_already_in_playlist(playlist, deltas):
+    appended = redis_api.append_tracks_to_playlist(ROOM, [track(1), track(9, 'T2'), track(7), track(7)])
+    assert appended == [track(7)]
+    assert titles() == ['t0', 't1', 't2', 't3', 't4', 't5', 't7']
+    assert deltas[-1] == {'op': 'append', 'tracks': [track(7)], 'version': 2}
+
+
+def test_append_of_duplicates_only_does_not_bump_version(playlist, deltas):
+    assert redis_api.append_tracks_to_playlist(ROOM, [track(3)]) == []
+    assert redis_api.get_room_playlist_version(ROOM) == 1
+    assert deltas == []
+
+
+def test_insert_after_current(playlist, deltas):
+    assert redis_api.insert_track_after_current(ROOM, 2, track(9)) == 3
+    assert titles() == ['t0', 't1', 't2', 't9', 't3', 't4', 't5']
+    assert deltas[-1] == {'op': 'insert', 'track': track(9), 'track_key': 's9', 'index': 3, 'version': 2}
+
+
+@pytest.mark.parametrize('current_index', [None, -1, 99])
+def test_insert_after_unknown_current_goes_to_second_position(playlist, current_index):
+    assert redis_api.insert_track_after_current(ROOM, current_index, track(9)) == 1
+    assert titles()[1] == 't9'
+
+
+def test_insert_duplicate_title_before_current_is_left_alone(playlist, deltas):
+    assert redis_api.insert_track_after_current(ROOM, 4, track(9, 't1')) == 1
+    assert titles() == ['t0', 't1', 't2', 't3', 't4', 't5']
+    assert redis_api.get_room_playlist_version(ROOM) == 1
+    assert deltas == []
+
+
+def test_insert_duplicate_of_playing_track_is_left_alone(playlist):
+    assert redis_api.insert_track_after_current(ROOM, 3, track(3)) == 3
+    assert titles() == ['t0', 't1', 't2', 't3', 't4', 't5']
+
+
+def test_insert_duplicate_title_after_current_moves_existing_entry(playlist, deltas):
+    assert redis_api.insert_track_after_current(ROOM, 1, track(9, 'T4')) == 2
+    assert [t['song_id'] for t in redis_api.get_room_playlist(ROOM)] == ['s0', 's1', 's4', 's2', 's3', 's5']
+    assert deltas[-1] == {'op': 'move', 'track_key': 's4', 'index': 2, 'version': 2}
+
+
+def test_insert_at_moves_existing_track(playlist):
+    assert redis_api.insert_track_at(ROOM, 0, track(5)) == 0
+    assert redis_api.insert_track_at(ROOM, 99, track(0)) == 5
+    assert titles() == ['t5', 't1', 't2', 't3', 't4', 't0']
+
+
+def test_move_track(playlist, deltas):
+    assert redis_api.move_track(ROOM, 's0', 3) == 3
+    assert titles() == ['t1', 't2', 't3', 't0', 't4', 't5']
+    assert deltas[-1] == {'op': 'move', 'track_key': 's0', 'index': 3, 'version': 2}
+    assert redis_api.move_track(ROOM, 'missing', 0) is None
+
+
+def test_remove_track_frees_its_title(playlist, deltas):
+    assert redis_api.remove_track_from_playlist(ROOM, 's2') == track(2)
+    assert deltas[-1] == {'op': 'remove', 'track_key': 's2', 'version': 2}
+    assert redis_api.remove_track_from_playlist(ROOM, 's2') is None
+    assert redis_api.append_tracks_to_playlist(ROOM, [track(9, 't2')]) == [track(9, 't2')]
+    assert titles() == ['t0', 't1', 't3', 't4', 't5', 't2']
+
+
+def test_repeated_inserts_renumber_positions(playlist):
+    for i in range(100, 160):
+        redis_api.insert_track_at(ROOM, 1, track(i))
+    assert titles()[:3] == ['t0', 't159', 't158']
+    assert titles()[-5:] == ['t1', 't2', 't3', 't4', 't5']
+
+
+def test_track_lookups(playlist):
+    assert redis_api.get_playlist_length(ROOM) == 6
+    assert redis_api.get_playlist_track_at(ROOM, 4) == track(4)
+    assert redis_api.get_playlist_track_at(ROOM, 6) is None
+    assert redis_api.get_playlist_index(ROOM, 's5') == 5
+
+
+def test_mutations_keep_room_summary_in_step(playlist, redis_client):
+    host = {'username': 'host', 'avatar': 'avatar.png', 'created_at': '2026-01-02T03:04:05'}
+    redis_client.hset(f"room_hosts{redis_api.redis_version}", ROOM, json.dumps(host))
+    redis_api.update_room_summary(ROOM, host=host)
+    summary = redis_api.get_room_summaries([ROOM])[0]
+    assert (summary['song_count'], summary['cover_image'], summary['host']) == (6, 'cover0', host)
+
+    redis_api.insert_track_at(ROOM, 0, track(9))
+    redis_api.remove_track_from_playlist(ROOM, 's3')
+    summary = redis_api.get_room_summaries([ROOM])[0]
+    assert (summary['song_count'], summary['cover_image']) == (6, 'cover9')
+
+    new_host = dict(host, created_at='2026-02-01T00:00:00')
+    redis_api.update_room_summary(ROOM, host=new_host)
+    summary = redis_api.get_room_summaries([ROOM])[0]
+    assert (summary['host'], summary['created_at']) == (new_host, '2026-02-01T00:00:00')
+    assert redis_client.zscore(redis_api.ROOMS_BY_CREATED_AT_KEY, ROOM) == \
+        redis_api._created_at_score('2026-02-01T00:00:00')
+
+
+def test_legacy_playlist_is_migrated_on_first_access(redis_client):
+    redis_client.hset(redis_api.LEGACY_PLAYLISTS_KEY, ROOM, json.dumps([track(0), track(1), track(0)]))
+    assert redis_api.append_tracks_to_playlist(ROOM, [track(2)]) == [track(2)]
+    assert titles() == ['t0', 't1', 't2']
+    assert not redis_client.hexists(redis_api.LEGACY_PLAYLISTS_KEY, ROOM)
+
+
+def test_title_index_is_built_for_playlists_stored_without_it(redis_client, deltas):
+    for i, title in enumerate(['a', 'b', 'A ', 'c']):
+        redis_client.zadd(redis_api._playlist_order_key(ROOM), {f"k{i}": i})
+        redis_client.hset(redis_api._playlist_tracks_key(ROOM), f"k{i}", json.dumps({'song_id': f"k{i}", 'title': title}))
+
+    assert redis_api.insert_track_after_current(ROOM, 0, {'song_id': 'x', 'title': 'C'}) == 1
+    assert titles() == ['a', 'c', 'b']
+    assert [delta['op'] for delta in deltas] == ['reset', 'move']
@@ -6,12 +6,125 @@ This module handles all coin-related operations, ensuring consistency across the
 
 import json
 import logging
-from util.redis_api import get_hash, write_hash, get_user_data, set_user_data, redis_version, redis_client
+from datetime import datetime
+from util.redis_api import get_hash, write_hash, redis_version, redis_client
 from util import user_logging
+from util.log_policy import log_event
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# The "coins" field of the user:{name} hash is the authoritative balance. Every change goes
+# through a Lua script that checks the balance, applies it and appends to the ledger stream
+# in one atomic round trip. The coins value in user_profiles is a legacy copy that is only
+# read once, to seed balances that predate the hash field.
+COIN_LEDGER_KEY = f"coin_ledger{redis_version}"
+
+# Status codes returned by the coin scripts
+_OK = 1
+_INSUFFICIENT = 0
+_MISSING_BALANCE = -1
+_MISSING_RECIPIENT_BALANCE = -2
+
+# Users per pipeline in bulk balance reads
+COIN_READ_CHUNK_SIZE = 500
+
+def _user_key(username):
+    return f"user:{username}"
+
+# KEYS: user hash, ledger. ARGV: username, delta, allow_overdraft, reason, timestamp
+_ADJUST_COINS_LUA = """
+local balance = redis.call('HGET', KEYS[1], 'coins')
+if not balance then
+    return {-1, 0}
+end
+balance = tonumber(balance)
+local delta = tonumber(ARGV[2])
+if delta < 0 and ARGV[3] ~= '1' and balance + delta < 0 then
+    return {0, balance}
+end
+local new_balance = redis.call('HINCRBY', KEYS[1], 'coins', delta)
+redis.call('XADD', KEYS[2], '*', 'user', ARGV[1], 'delta', ARGV[2], 'balance', new_balance,
+           'reason', ARGV[4], 'timestamp', ARGV[5])
+return {1, new_balance}
+"""
+
+# KEYS: user hash, ledger. ARGV: username, coins, reason, timestamp
+_SET_COINS_LUA = """
+local previous = tonumber(redis.call('HGET', KEYS[1], 'coins') or '0')
+local coins = tonumber(ARGV[2])
+redis.call('HSET', KEYS[1], 'coins', ARGV[2])
+redis.call('XADD', KEYS[2], '*', 'user', ARGV[1], 'delta', string.format('%d', coins - previous),
+           'balance', ARGV[2], 'reason', ARGV[3], 'timestamp', ARGV[4])
+return previous
+"""
+
+# KEYS: payer hash, recipient hash, ledger.
+# ARGV: payer, recipient ('' for none), amount, reward, reason, timestamp
+_TRANSFER_COINS_LUA = """
+local balance = redis.call('HGET', KEYS[1], 'coins')
+if not balance then
+    return {-1, 0, 0}
+end
+local amount = tonumber(ARGV[3])
+local reward = tonumber(ARGV[4])
+local pays_recipient = ARGV[2] ~= '' and ARGV[2] ~= ARGV[1] and reward > 0
+if pays_recipient and redis.call('HEXISTS', KEYS[2], 'coins') == 0 then
+    return {-2, 0, 0}
+end
+if tonumber(balance) < amount then
+    return {0, tonumber(balance), 0}
+end
+local payer_balance = redis.call('HINCRBY', KEYS[1], 'coins', -amount)
+redis.call('XADD', KEYS[3], '*', 'user', ARGV[1], 'delta', -amount, 'balance', payer_balance,
+           'reason', ARGV[5], 'counterparty', ARGV[2], 'timestamp', ARGV[6])
+local recipient_balance = 0
+if pays_recipient then
+    recipient_balance = redis.call('HINCRBY', KEYS[2], 'coins', reward)
+    redis.call('XADD', KEYS[3], '*', 'user', ARGV[2], 'delta', reward, 'balance', recipient_balance,
+               'reason', ARGV[5], 'counterparty', ARGV[1], 'timestamp', ARGV[6])
+end
+return {1, payer_balance, recipient_balance}
+"""
+
+_adjust_coins_script = redis_client.register_script(_ADJUST_COINS_LUA)
+_set_coins_script = redis_client.register_script(_SET_COINS_LUA)
+_transfer_coins_script = redis_client.register_script(_TRANSFER_COINS_LUA)
+
+def _legacy_profile_coins(username):
+    profile_json = get_hash(f"user_profiles{redis_version}", username)
+    if not profile_json:
+        return None
+    profile = json.loads(profile_json) if isinstance(profile_json, str) else json.loads(profile_json.decode('utf-8'))
+    return profile.get('coins')
+
+def _seed_balance(username):
+    """Copy a balance that only exists in user_profiles into the user hash (no-op if already set)."""
+    coins = _legacy_profile_coins(username)
+    redis_client.hsetnx(_user_key(username), 'coins', int(coins or 0))
+
+def _log_balance_change(username, previous_coins, new_coins, reason):
+    if reason:
+        user_logging.log_user_activity(
+            username=username,
+            action="coin_balance_update",
+            details={
+                "previous_coins": previous_coins,
+                "new_coins": new_coins,
+                "reason": reason
+            }
+        )
+
+def _adjust_coins(username, delta, reason, allow_overdraft=False):
+    """Run the adjust script, seeding a legacy balance first if needed. Returns (status, balance)."""
+    args = [username, int(delta), '1' if allow_overdraft else '0', reason or '', datetime.now().isoformat()]
+    keys = [_user_key(username), COIN_LEDGER_KEY]
+    status, balance = _adjust_coins_script(keys=keys, args=args)
+    if status == _MISSING_BALANCE:
+        _seed_balance(username)
+        status, balance = _adjust_coins_script(keys=keys, args=args)
+    return status, int(balance)
+
 def get_user_coins(username):
     """
     Get a user's current coin balance.
@@ -23,25 +136,16 @@ def get_user_coins(username):
         int: Current coin balance
     """
     try:
-        # Get user data (primary storage)
-        user_data = get_user_data(username)
-        
-        # If coins exists in user_data, return that value
-        if 'coins' in user_data:
-            return int(user_data.get('coins', 0))
-        
-        # Fallback to user_profiles if not in user_data
-        profile_json = get_hash(f"user_profiles{redis_version}", username)
-        if profile_json:
-            profile = json.loads(profile_json) if isinstance(profile_json, str) else json.loads(profile_json.decode('utf-8'))
-            coins = profile.get('coins', 0)
-            
-            # Sync to user_data for future requests
-            user_data['coins'] = coins
-            set_user_data(username, user_data)
-            
+        coins = redis_client.hget(_user_key(username), 'coins')
+        if coins is not None:
             return int(coins)
         
+        # Fallback to user_profiles for balances that predate the hash field
+        legacy_coins = _legacy_profile_coins(username)
+        if legacy_coins is not None:
+            _seed_balance(username)
+            return int(legacy_coins)
+        
         # Default to 0 if no coins found
         return 0
     except Exception as e:
@@ -62,33 +166,14 @@ def set_user_coins(username, coins, reason=None):
     """
     try:
         coins = int(coins)
-        previous_coins = get_user_coins(username)
-        
-        # Update user_data (primary storage)
-        user_data = get_user_data(username)
-        user_data['coins'] = coins
-        set_user_data(username, user_data)
+        previous_coins = int(_set_coins_script(
+            keys=[_user_key(username), COIN_LEDGER_KEY],
+            args=[username, coins, reason or 'set_balance', datetime.now().isoformat()]
+        ))
         
-        # Update user_profiles for backward compatibility
-        profile_json = get_hash(f"user_profiles{redis_version}", username)
-        if profile_json:
-            profile = json.loads(profile_json) if isinstance(profile_json, str) else json.loads(profile_json.decode('utf-8'))
-            profile['coins'] = coins
-            write_hash(f"user_profiles{redis_version}", username, json.dumps(profile))
+        _log_balance_change(username, previous_coins, coins, reason)
         
-        # Log the activity
-        if reason:
-            user_logging.log_user_activity(
-                username=username,
-                action="coin_balance_update",
-                details={
-                    "previous_coins": previous_coins,
-                    "new_coins": coins,
-                    "reason": reason
-                }
-            )
-        
-        logger.info(f"Set coins for user {username} to {coins} (was {previous_coins})")
+        log_event(logger, 'coins_set', username=username, coins=coins, previous_coins=previous_coins)
         return True
     except Exception as e:
         logger.error(f"Error setting coins for user {username}: {str(e)}")
@@ -108,12 +193,9 @@ def add_user_coins(username, amount, reason=None):
     """
     try:
         amount = int(amount)
-        current_coins = get_user_coins(username)
-        new_coins = current_coins + amount
-        
-        if set_user_coins(username, new_coins, reason):
-            return new_coins
-        return current_coins
+        _, new_coins = _adjust_coins(username, amount, reason, allow_overdraft=True)
+        _log_balance_change(username, new_coins - amount, new_coins, reason)
+        return new_coins
     except Exception as e:
         logger.error(f"Error adding coins for user {username}: {str(e)}")
         return get_user_coins(username)
@@ -122,6 +204,9 @@ def use_user_coins(username, amount, feature=None):
     """
     Use (deduct) coins from a user's balance.
     
+    The balance check and the deduction happen in one script, so concurrent
+    requests cannot spend the same coins twice.
+    
     Args:
         username (str): Username to deduct coins from
         amount (int): Amount of coins to use
@@ -132,33 +217,82 @@ def use_user_coins(username, amount, feature=None):
     """
     try:
         amount = int(amount)
-        current_coins = get_user_coins(username)
+        reason = f"Used for {feature}" if feature else "Used coins"
+        status, coins = _adjust_coins(username, -amount, reason)
         
-        if current_coins < amount:
+        if status != _OK:
             return {
                 "success": False,
                 "error": "Insufficient coins",
-                "coins": current_coins,
+                "coins": coins,
                 "required": amount
             }
         
-        new_coins = current_coins - amount
+        _log_balance_change(username, coins + amount, coins, reason)
+        return {
+            "success": True,
+            "coins": coins,
+            "used": amount
+        }
+    except Exception as e:
+        logger.error(f"Error using coins for user {username}: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "coins": get_user_coins(username)
+        }
+
+def transfer_coins(username, recipient, amount, reward=None, feature=None):
+    """
+    Charge a user and credit another user (e.g. the room host) in one atomic call.
+    
+    Args:
+        username (str): Username to deduct coins from
+        recipient (str): Username to credit, or None. Nothing is credited when the
+            recipient is the payer.
+        amount (int): Amount of coins to deduct
+        reward (int, optional): Amount credited to the recipient (defaults to amount)
+        feature (str, optional): Feature the coins were used for
+        
+    Returns:
+        dict: Result with success status, the payer's new balance and the reward paid
+    """
+    try:
+        amount = int(amount)
+        reward = amount if reward is None else int(reward)
         reason = f"Used for {feature}" if feature else "Used coins"
+        keys = [_user_key(username), _user_key(recipient or username), COIN_LEDGER_KEY]
+        args = [username, recipient or '', amount, reward, reason, datetime.now().isoformat()]
+        
+        status, coins, recipient_coins = _transfer_coins_script(keys=keys, args=args)
+        if status in (_MISSING_BALANCE, _MISSING_RECIPIENT_BALANCE):
+            _seed_balance(username)
+            if recipient:
+                _seed_balance(recipient)
+            status, coins, recipient_coins = _transfer_coins_script(keys=keys, args=args)
+        coins = int(coins)
         
-        if set_user_coins(username, new_coins, reason):
+        if status != _OK:
             return {
-                "success": True,
-                "coins": new_coins,
-                "used": amount
+                "success": False,
+                "error": "Insufficient coins",
+                "coins": coins,
+                "required": amount
             }
         
+        _log_balance_change(username, coins + amount, coins, reason)
+        paid_reward = reward if recipient and recipient != username and reward > 0 else 0
+        if paid_reward:
+            _log_balance_change(recipient, int(recipient_coins) - paid_reward, int(recipient_coins),
+                                f"Reward from {username} ({reason})")
         return {
-            "success": False,
-            "error": "Failed to update coins",
-            "coins": current_coins
+            "success": True,
+            "coins": coins,
+            "used": amount,
+            "reward": paid_reward
         }
     except Exception as e:
-        logger.error(f"Error using coins for user {username}: {str(e)}")
+        logger.error(f"Error transferring coins from {username} to {recipient}: {str(e)}")
         return {
             "success": False,
             "error": str(e),
@@ -167,7 +301,7 @@ def use_user_coins(username, amount, feature=None):
 
 def check_coin_balance(username):
     """
-    Check if there's a mismatch between storage methods and fix if needed.
+    Check if the legacy user_profiles copy disagrees with the authoritative balance and fix it.
     
     Args:
         username (str): Username to check
@@ -186,24 +320,23 @@ def check_coin_balance(username):
     try:
         # Check in user_profiles
         profile_json = get_hash(f"user_profiles{redis_version}", username)
+        profile = None
         if profile_json:
             profile = json.loads(profile_json) if isinstance(profile_json, str) else json.loads(profile_json.decode('utf-8'))
             result["user_profiles_coins"] = profile.get('coins', 0)
         
-        # Check in user data
-        user_data = get_user_data(username)
-        result["user_data_coins"] = user_data.get('coins', 0)
+        # Check the authoritative balance
+        result["user_data_coins"] = get_user_coins(username)
         
         # Check if there's a mismatch
-        if result["user_profiles_coins"] is not None and result["user_data_coins"] is not None:
-            if str(result["user_profiles_coins"]) != str(result["user_data_coins"]):
-                result["mismatch"] = True
-                
-                # Fix the mismatch by using the higher value
-                coins = max(int(result["user_profiles_coins"]), int(result["user_data_coins"]))
-                if set_user_coins(username, coins, "Fixed coin mismatch"):
-                    result["fixed"] = True
-                    result["new_coins"] = coins
+        if profile is not None and str(result["user_profiles_coins"]) != str(result["user_data_coins"]):
+            result["mismatch"] = True
+            
+            # The user hash is authoritative, so bring the legacy copy in line with it
+            profile['coins'] = result["user_data_coins"]
+            write_hash(f"user_profiles{redis_version}", username, json.dumps(profile))
+            result["fixed"] = True
+            result["new_coins"] = result["user_data_coins"]
         
         return result
     except Exception as e:
@@ -211,6 +344,48 @@ def check_coin_balance(username):
         result["error"] = str(e)
         return result
 
+def get_user_coins_bulk(usernames, chunk_size=COIN_READ_CHUNK_SIZE):
+    """
+    Get the coin balances of many users with pipelined HGETs, chunk_size users per round trip.
+    
+    Users without a balance in their hash fall back to the legacy user_profiles copy
+    (read in one HMGET per chunk, without seeding).
+    
+    Args:
+        usernames (list): Usernames to get coins for
+        chunk_size (int): Users per pipeline
+        
+    Returns:
+        dict: Dictionary mapping usernames to their coin balances
+    """
+    result = {}
+    usernames = list(usernames)
+    for start in range(0, len(usernames), chunk_size):
+        chunk = usernames[start:start + chunk_size]
+        pipe = redis_client.pipeline(transaction=False)
+        for username in chunk:
+            pipe.hget(_user_key(username), 'coins')
+        balances = pipe.execute()
+        
+        missing = []
+        for username, coins in zip(chunk, balances):
+            if coins is None:
+                missing.append(username)
+            else:
+                result[username] = int(coins)
+        
+        if missing:
+            profiles = redis_client.hmget(f"user_profiles{redis_version}", missing)
+            for username, profile_json in zip(missing, profiles):
+                coins = 0
+                if profile_json:
+                    try:
+                        coins = int(json.loads(profile_json).get('coins', 0) or 0)
+                    except (ValueError, TypeError) as e:
+                        logger.warning(f"Invalid legacy coins for user {username}: {str(e)}")
+                result[username] = coins
+    return result
+
 def get_all_user_coins():
     """
     Get the coin balance for all existing users in the system.
@@ -219,24 +394,10 @@ def get_all_user_coins():
         dict: Dictionary mapping usernames to their coin balances
     """
     try:
-        # Get all user keys from Redis
-        user_keys = []
-        cursor = 0
-        pattern = "user:*"
-        
-        # Use scan_iter to get all user keys
-        while True:
-            cursor, keys = redis_client.scan(cursor, match=pattern, count=100)
-            user_keys.extend(keys)
-            if cursor == 0:
-                break
-        
-        # Extract usernames from keys and get their coin balances
-        result = {}
-        for key in user_keys:
-            username = key.decode('utf-8').split(':')[1]
-            coins = get_user_coins(username)
-            result[username] = coins
+        # Usernames come from the user:* hashes; balances are then read in pipelined chunks
+        usernames = [key.decode('utf-8').split(':', 1)[1]
+                     for key in redis_client.scan_iter(match="user:*", count=COIN_READ_CHUNK_SIZE)]
+        result = get_user_coins_bulk(usernames)
             
         logger.info(f"Retrieved coin balances for {len(result)} users")
         return result
@@ -1,11 +1,20 @@
 import qrcode
 from PIL import Image
 from pathlib import Path
+from functools import lru_cache
 
-def generate_qr_code_with_logo(url, filename='qr_code_with_logo.png'):
+LOGO_PATH = Path(__file__).parent / "logo.png"
 
-    current_dir = Path(__file__).parent
-    logo_path = current_dir / "logo.png"  # Replace with your logo's relative path
+@lru_cache(maxsize=8)
+def _load_logo(logo_size):
+    """Load the logo resized for a QR code, once per size."""
+    logo = Image.open(LOGO_PATH)
+    # Resize the logo using LANCZOS for high-quality resampling
+    logo = logo.resize((2*logo_size, logo_size), Image.Resampling.LANCZOS)
+    logo.load()
+    return logo
+
+def generate_qr_code_with_logo(url, filename='qr_code_with_logo.png'):
 
     # Create a QR Code instance
     qr = qrcode.QRCode(
@@ -22,14 +31,9 @@ def generate_qr_code_with_logo(url, filename='qr_code_with_logo.png'):
     # Create an image from the QR Code instance
     img = qr.make_image(fill='black', back_color='white').convert('RGB')
 
-    # Load the logo
-    logo = Image.open(logo_path)
-
     # Calculate the size of the logo
     logo_size = int(min(img.size) * 0.2)  # Logo will be 20% of the QR code size
-    # logo = logo.resize((logo_size, logo_size), Image.ANTIALIAS)
-    # Resize the logo using LANCZOS for high-quality resampling
-    logo = logo.resize((2*logo_size, logo_size), Image.Resampling.LANCZOS)
+    logo = _load_logo(logo_size)
 
 
     # Calculate position to place the logo at the center
@@ -0,0 +1,94 @@
+"""
+Logging policy for hot paths.
+
+Code that runs on every request or socket event should not write a free-form INFO line
+(or several) per call. Call sites log through this module instead:
+
+- log_event(logger, 'event_name', **fields) writes one structured line
+  ("event_name {json fields}") and is sampled per event name
+- log_payload(logger, 'event_name', payload) dumps a full payload at DEBUG, and only when
+  LOG_PAYLOADS is enabled
+
+Settings come from the environment:
+
+- LOG_SAMPLE_RATE: default fraction of events written (0.0 - 1.0, default 1.0)
+- LOG_SAMPLE_RATES: per-event overrides, e.g. "player_state_change=0.01,user_data_loaded=0"
+- LOG_PAYLOADS: set to 1 to allow payload dumps
+- LOG_PAYLOAD_MAX_CHARS: truncate payload dumps to this many characters
+"""
+
+import os
+import json
+import random
+import logging
+
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+LOG_PAYLOADS = os.environ.get('LOG_PAYLOADS', '0') == '1'
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get('LOG_PAYLOAD_MAX_CHARS', 2000))
+
+
+def _parse_sample_rates(value):
+    rates = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        event, rate = item.split('=', 1)
+        try:
+            rates[event.strip()] = float(rate)
+        except ValueError:
+            logging.getLogger(__name__).warning(f"Ignoring invalid log sample rate: {item}")
+    return rates
+
+
+LOG_SAMPLE_RATES = _parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', ''))
+
+
+def should_log(event, sample_rate=None):
+    """
+    Decide whether this occurrence of an event is written.
+
+    Args:
+        event (str): Event name
+        sample_rate (float, optional): Rate used when LOG_SAMPLE_RATES has no override
+            (defaults to LOG_SAMPLE_RATE)
+
+    Returns:
+        bool: True if the event should be logged
+    """
+    rate = LOG_SAMPLE_RATES.get(event, LOG_SAMPLE_RATE if sample_rate is None else sample_rate)
+    if rate >= 1:
+        return True
+    return rate > 0 and random.random() < rate
+
+
+def log_event(logger, event, level=logging.INFO, sample_rate=None, **fields):
+    """
+    Write one structured, sampled log line for an event.
+
+    Args:
+        logger (logging.Logger): Logger of the calling module
+        event (str): Event name, also the key for per-event sample rates
+        level (int): Log level
+        sample_rate (float, optional): Default sample rate of this call site
+        **fields: Values written as a JSON object
+    """
+    if not logger.isEnabledFor(level) or not should_log(event, sample_rate):
+        return
+    logger.log(level, f"{event} {json.dumps(fields, default=str)}")
+
+
+def log_payload(logger, event, payload):
+    """
+    Dump a full payload at DEBUG level when LOG_PAYLOADS is enabled.
+
+    Args:
+        logger (logging.Logger): Logger of the calling module
+        event (str): Event name
+        payload: Payload to dump (JSON-serialised, truncated to LOG_PAYLOAD_MAX_CHARS)
+    """
+    if not LOG_PAYLOADS or not logger.isEnabledFor(logging.DEBUG):
+        return
+    text = json.dumps(payload, default=str)
+    if len(text) > LOG_PAYLOAD_MAX_CHARS:
+        text = text[:LOG_PAYLOAD_MAX_CHARS] + '...'
+    logger.debug(f"{event} payload {text}")
@@ -7,12 +7,13 @@ import logging
 import urllib.parse
 import json
 import time
-import redis
 import hashlib
 import random
 from urllib3.exceptions import InsecureRequestWarning
 import urllib3
 
+from util.redis_pool import get_redis_client
+
 # Suppress only the single InsecureRequestWarning
 urllib3.disable_warnings(InsecureRequestWarning)
 
@@ -20,7 +21,7 @@ urllib3.disable_warnings(InsecureRequestWarning)
 logger = logging.getLogger(__name__)
 
 # Connect to Redis for caching
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+redis_client = get_redis_client()
 # Set cache expiration time (12 weeks)
 CACHE_EXPIRATION = 60 * 60 * 24 * 7 * 12
 
@@ -1,4 +1,3 @@
-import redis
 import json
 import pandas as pd
 import logging
@@ -8,11 +7,16 @@ import sys
 from datetime import datetime
 from pathlib import Path
 
+from redis.exceptions import WatchError
+
+from util.redis_pool import get_redis_client
+from util.log_policy import log_event, log_payload
+
 logger = logging.getLogger(__name__)
 
 redis_version = '_v1'
 
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+redis_client = get_redis_client()
 
 # Import the admin users list from app.py
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -166,6 +170,941 @@ def df_to_redis(df, name='', date='', overwrite=True, key=['']):
 
 def remove_room(room_name):
     delete_hash(f"playlist{redis_version}", room_name)
+    delete_room_playlist(room_name)
+
+# ======= room playlist storage
+# Each room playlist is stored as:
+#   room_playlist_order{version}:{room}  -> sorted set of track keys, scored by position
+#   room_playlist_tracks{version}:{room} -> hash of track key -> track JSON
+#   playlist_rooms{version}              -> set of rooms stored in this format
+#   room_playlist_version{version}:{room} -> counter bumped by every change, so clients
+#                                            applying playlist deltas can detect gaps
+#   room_playlist_titles{version}:{room}  -> hash of "t:<title key>" -> track key and
+#                                            "k:<track key>" -> title key, plus an "indexed"
+#                                            field once the index covers the whole playlist
+# Playlists are deduplicated when written: a track key appears once, and so does a title
+# (compared case-insensitively), so reads return the stored order as is. Playlists stored
+# before titles were indexed get their index, dropping later duplicates, on first access.
+# Rooms written before this layout keep a JSON blob in room_playlists{version} and
+# are migrated on first access.
+
+LEGACY_PLAYLISTS_KEY = f"room_playlists{redis_version}"
+PLAYLIST_ROOMS_KEY = f"playlist_rooms{redis_version}"
+
+# Smallest gap allowed between neighbouring positions before they are renumbered
+MIN_POSITION_GAP = 1e-6
+
+# Field of the titles hash marking that the title index covers the whole playlist
+TITLE_INDEX_READY_FIELD = 'indexed'
+
+def _playlist_order_key(room_name):
+    return f"room_playlist_order{redis_version}:{room_name}"
+
+def _playlist_tracks_key(room_name):
+    return f"room_playlist_tracks{redis_version}:{room_name}"
+
+def _playlist_version_key(room_name):
+    return f"room_playlist_version{redis_version}:{room_name}"
+
+def _playlist_titles_key(room_name):
+    return f"room_playlist_titles{redis_version}:{room_name}"
+
+def playlist_title_key(track):
+    """Return the key used to deduplicate tracks by title ('' for tracks without a title)."""
+    return (track.get('title') or '').strip().lower()
+
+# Callbacks run with (room_name, delta) after every playlist change. A delta is a dict with
+# the room's new "version" and an "op": insert (track, track_key, index), append (tracks),
+# move (track_key, index), remove (track_key) or reset (the playlist was replaced or deleted).
+_playlist_listeners = []
+
+def add_playlist_listener(callback):
+    """Register callback(room_name, delta) to be called after every playlist change."""
+    _playlist_listeners.append(callback)
+
+def _publish_playlist_delta(room_name, version, op, **fields):
+    delta = dict(fields, op=op, version=int(version))
+    for callback in _playlist_listeners:
+        try:
+            callback(room_name, delta)
+        except Exception as e:
+            logger.error(f"Error in playlist listener for room {room_name}: {str(e)}")
+
+def get_room_playlist_version(room_name):
+    """Get the version of a room playlist (0 if it has never changed)."""
+    version = redis_client.get(_playlist_version_key(room_name))
+    return int(version) if version else 0
+
+def playlist_track_key(track):
+    """Return the key identifying a track inside a room playlist (its song_id when available)."""
+    if track.get('song_id'):
+        return track['song_id']
+    return f"{track.get('title', '')}:{track.get('artist', '')}"
+
+def _decode_tracks(raw_tracks):
+    return [json.loads(raw.decode('utf-8')) for raw in raw_tracks if raw]
+
+def _write_playlist(pipe, room_name, playlist):
+    """Queue commands on pipe that replace a room playlist; returns the tracks actually stored."""
+    order = {}
+    tracks = {}
+    titles = {}
+    stored = []
+    for track in playlist:
+        track_key = playlist_track_key(track)
+        title_key = playlist_title_key(track)
+        if track_key in tracks or (title_key and f"t:{title_key}" in titles):
+            continue  # a track key and a title can only appear once in a playlist
+        order[track_key] = len(order) + 1
+        tracks[track_key] = json.dumps(track)
+        if title_key:
+            titles[f"t:{title_key}"] = track_key
+            titles[f"k:{track_key}"] = title_key
+        stored.append(track)
+
+    pipe.delete(_playlist_order_key(room_name), _playlist_tracks_key(room_name), _playlist_titles_key(room_name))
+    if order:
+        pipe.zadd(_playlist_order_key(room_name), order)
+        pipe.hset(_playlist_tracks_key(room_name), mapping=tracks)
+    titles[TITLE_INDEX_READY_FIELD] = 1
+    pipe.hset(_playlist_titles_key(room_name), mapping=titles)
+    pipe.sadd(PLAYLIST_ROOMS_KEY, room_name)
+    pipe.hdel(LEGACY_PLAYLISTS_KEY, room_name)
+    pipe.incr(_playlist_version_key(room_name))
+    return stored
+
+def _migrate_legacy_playlist(room_name):
+    """
+    Move a room's legacy JSON playlist into the sorted set layout.
+
+    Returns:
+        list or None: The migrated playlist, or None if the room has no legacy playlist
+    """
+    playlist_json = get_hash(LEGACY_PLAYLISTS_KEY, room_name)
+    if not playlist_json:
+        return None
+    try:
+        playlist = json.loads(playlist_json)
+    except json.JSONDecodeError:
+        logger.error(f"Invalid JSON in legacy playlist for room {room_name}")
+        return None
+
+    pipe = redis_client.pipeline()
+    stored = _write_playlist(pipe, room_name, playlist)
+    pipe.execute()
+    logger.info(f"Migrated legacy playlist for room {room_name} ({len(stored)} tracks)")
+    return stored
+
+def _ensure_playlist_migrated(room_name):
+    if not redis_client.exists(_playlist_order_key(room_name)):
+        _migrate_legacy_playlist(room_name)
+
+def _build_title_index(room_name):
+    """
+    Index the titles of a playlist stored before titles were indexed. Later tracks with a
+    title already in the playlist are dropped, as reads used to hide them.
+
+    Returns:
+        list: The tracks left in the playlist, in order
+    """
+    order_key = _playlist_order_key(room_name)
+    tracks_key = _playlist_tracks_key(room_name)
+    titles_key = _playlist_titles_key(room_name)
+    with redis_client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(order_key, tracks_key, titles_key)
+                if pipe.hexists(titles_key, TITLE_INDEX_READY_FIELD):
+                    members = pipe.zrange(order_key, 0, -1)
+                    return _decode_tracks(pipe.hmget(tracks_key, members)) if members else []
+                members = pipe.zrange(order_key, 0, -1)
+                raw_tracks = pipe.hmget(tracks_key, members) if members else []
+                playlist = []
+                titles = {}
+                duplicates = []
+                for member, raw in zip(members, raw_tracks):
+                    if not raw:
+                        continue
+                    track = json.loads(raw.decode('utf-8'))
+                    track_key = member.decode('utf-8')
+                    title_key = playlist_title_key(track)
+                    if title_key and f"t:{title_key}" in titles:
+                        duplicates.append(track_key)
+                        continue
+                    if title_key:
+                        titles[f"t:{title_key}"] = track_key
+                        titles[f"k:{track_key}"] = title_key
+                    playlist.append(track)
+                titles[TITLE_INDEX_READY_FIELD] = 1
+
+                pipe.multi()
+                pipe.delete(titles_key)
+                pipe.hset(titles_key, mapping=titles)
+                if duplicates:
+                    pipe.zrem(order_key, *duplicates)
+                    pipe.hdel(tracks_key, *duplicates)
+                    pipe.incr(_playlist_version_key(room_name))
+                results = pipe.execute()
+                break
+            except WatchError:
+                continue  # the playlist changed while it was read, index it again
+
+    if duplicates:
+        logger.info(f"Dropped {len(duplicates)} duplicate titles from the playlist of room {room_name}")
+        refresh_room_summary(room_name)
+        _publish_playlist_delta(room_name, results[-1], 'reset')
+    return playlist
+
+# Playlist mutations run as Lua scripts so concurrent requests in a room cannot lose
+# each other's updates. Every script takes KEYS = [order, tracks, playlist rooms, summary,
+# version, titles] and bumps the version in the same call when it changes the playlist.
+_PLAYLIST_LUA_HELPERS = ("local MIN_POSITION_GAP = " + repr(MIN_POSITION_GAP) + "\n"
+                         + "local TITLE_INDEX_READY_FIELD = " + repr(TITLE_INDEX_READY_FIELD) + """
+local function format_score(score)
+    return string.format('%.17g', score)
+end
+
+-- Score that places a new member at the given index of the current order
+local function position_for_index(order_key, index)
+    local length = redis.call('ZCARD', order_key)
+    if length == 0 then
+        return 1
+    end
+    if index <= 0 then
+        local first = redis.call('ZRANGE', order_key, 0, 0, 'WITHSCORES')
+        return tonumber(first[2]) - 1
+    end
+    if index >= length then
+        local last = redis.call('ZRANGE', order_key, -1, -1, 'WITHSCORES')
+        return tonumber(last[2]) + 1
+    end
+    local neighbours = redis.call('ZRANGE', order_key, index - 1, index, 'WITHSCORES')
+    local previous_score, next_score = tonumber(neighbours[2]), tonumber(neighbours[4])
+    if next_score - previous_score < MIN_POSITION_GAP then
+        -- Repeated inserts have made the gap too small, renumber to 1..n
+        local members = redis.call('ZRANGE', order_key, 0, -1)
+        for i, member in ipairs(members) do
+            redis.call('ZADD', order_key, i, member)
+        end
+        return index + 0.5
+    end
+    return (previous_score + next_score) / 2
+end
+
+-- Drop the title entries of a track key
+local function forget_title(track_key)
+    local title = redis.call('HGET', KEYS[6], 'k:' .. track_key)
+    if title then
+        redis.call('HDEL', KEYS[6], 'k:' .. track_key)
+        if redis.call('HGET', KEYS[6], 't:' .. title) == track_key then
+            redis.call('HDEL', KEYS[6], 't:' .. title)
+        end
+    end
+end
+
+-- False when the playlist was stored before titles were indexed; the caller indexes it and retries
+local function title_index_ready()
+    if redis.call('HEXISTS', KEYS[6], TITLE_INDEX_READY_FIELD) == 1 then
+        return true
+    end
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return false
+    end
+    redis.call('HSET', KEYS[6], TITLE_INDEX_READY_FIELD, 1)
+    return true
+end
+
+local function remember_title(track_key, title)
+    if title ~= '' then
+        redis.call('HSET', KEYS[6], 't:' .. title, track_key, 'k:' .. track_key, title)
+    end
+end
+
+-- Keep the room summary's song count and cover in step with the playlist
+local function refresh_summary()
+    if redis.call('EXISTS', KEYS[4]) == 0 then
+        return
+    end
+    local cover = ''
+    local first = redis.call('ZRANGE', KEYS[1], 0, 0)
+    if #first > 0 then
+        local track = redis.call('HGET', KEYS[2], first[1])
+        if track then
+            local ok, decoded = pcall(cjson.decode, track)
+            if ok and type(decoded) == 'table' and type(decoded['cover_img_url']) == 'string' then
+                cover = decoded['cover_img_url']
+            end
+        end
+    end
+    redis.call('HSET', KEYS[4], 'song_count', redis.call('ZCARD', KEYS[1]), 'cover_image', cover)
+end
+""")
+
+# ARGV = [room, key1, track1, title1, key2, track2, title2, ...]; tracks whose key or title
+# is already in the playlist are skipped. Returns {version (0 if nothing was appended), appended keys},
+# or false if the title index has to be built first
+_APPEND_TRACKS_LUA = _PLAYLIST_LUA_HELPERS + """
+if not title_index_ready() then
+    return false
+end
+local last = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+local next_score = 1
+if #last > 0 then
+    next_score = tonumber(last[2]) + 1
+end
+local appended = {}
+for i = 2, #ARGV, 3 do
+    local track_key, title = ARGV[i], ARGV[i + 2]
+    if not redis.call('ZSCORE', KEYS[1], track_key)
+            and (title == '' or redis.call('HEXISTS', KEYS[6], 't:' .. title) == 0) then
+        redis.call('ZADD', KEYS[1], format_score(next_score), track_key)
+        redis.call('HSET', KEYS[2], track_key, ARGV[i + 1])
+        remember_title(track_key, title)
+        next_score = next_score + 1
+        table.insert(appended, track_key)
+    end
+end
+redis.call('SADD', KEYS[3], ARGV[1])
+refresh_summary()
+local version = 0
+if #appended > 0 then
+    version = redis.call('INCR', KEYS[5])
+end
+return {version, appended}
+"""
+
+# ARGV = [room, track key, track, index, mode, title]; mode 'after' treats index as the
+# currently playing index. When the track key or title is already in the playlist that entry
+# is kept: it is moved to the index, unless in 'after' mode it sits at or before the playing
+# track, where it is left alone. Returns {index of the track, version (0 if nothing changed),
+# key of the entry already in the playlist or ''}, or false if the title index has to be built first.
+_INSERT_TRACK_LUA = _PLAYLIST_LUA_HELPERS + """
+if not title_index_ready() then
+    return false
+end
+local length = redis.call('ZCARD', KEYS[1])
+local index = tonumber(ARGV[4])
+if ARGV[5] == 'after' then
+    if index >= 0 and index < length then
+        index = index + 1
+    elseif length >= 1 then
+        index = 1
+    else
+        index = 0
+    end
+end
+index = math.max(0, math.min(index, length))
+
+local existing = nil
+if redis.call('ZSCORE', KEYS[1], ARGV[2]) then
+    existing = ARGV[2]
+elseif ARGV[6] ~= '' then
+    existing = redis.call('HGET', KEYS[6], 't:' .. ARGV[6])
+end
+local rank = existing and redis.call('ZRANK', KEYS[1], existing)
+if rank then
+    if ARGV[5] == 'after' and rank < index then
+        return {rank, 0, existing}
+    end
+    -- The entry is taken out before it is placed, so the index counts the playlist without it
+    index = math.min(index, length - 1)
+    if rank == index then
+        return {rank, 0, existing}
+    end
+    redis.call('ZREM', KEYS[1], existing)
+    redis.call('ZADD', KEYS[1], format_score(position_for_index(KEYS[1], index)), existing)
+    refresh_summary()
+    return {index, redis.call('INCR', KEYS[5]), existing}
+end
+
+redis.call('ZADD', KEYS[1], format_score(position_for_index(KEYS[1], index)), ARGV[2])
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3])
+remember_title(ARGV[2], ARGV[6])
+redis.call('SADD', KEYS[3], ARGV[1])
+refresh_summary()
+return {index, redis.call('INCR', KEYS[5]), ''}
+"""
+
+# ARGV = [track key, index]; returns {new index, version}, or nil if the track is missing
+_MOVE_TRACK_LUA = _PLAYLIST_LUA_HELPERS + """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return nil
+end
+local index = math.max(0, math.min(tonumber(ARGV[2]), redis.call('ZCARD', KEYS[1])))
+redis.call('ZADD', KEYS[1], format_score(position_for_index(KEYS[1], index)), ARGV[1])
+refresh_summary()
+return {index, redis.call('INCR', KEYS[5])}
+"""
+
+# ARGV = [track key]; returns {removed track JSON, version}, or nil if it was not there
+_REMOVE_TRACK_LUA = _PLAYLIST_LUA_HELPERS + """
+local track = redis.call('HGET', KEYS[2], ARGV[1])
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 and not track then
+    return nil
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+forget_title(ARGV[1])
+refresh_summary()
+return {track or '', redis.call('INCR', KEYS[5])}
+"""
+
+_append_tracks_script = redis_client.register_script(_APPEND_TRACKS_LUA)
+_insert_track_script = redis_client.register_script(_INSERT_TRACK_LUA)
+_move_track_script = redis_client.register_script(_MOVE_TRACK_LUA)
+_remove_track_script = redis_client.register_script(_REMOVE_TRACK_LUA)
+
+# Read-only lookup of the track at an index in one round trip (ZRANGE by rank is O(log n)).
+# Returns false when the order key does not exist yet, so the caller can migrate and retry.
+_TRACK_AT_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local members = redis.call('ZRANGE', KEYS[1], ARGV[1], ARGV[1])
+if #members == 0 then
+    return ''
+end
+return redis.call('HGET', KEYS[2], members[1]) or ''
+"""
+_track_at_script = redis_client.register_script(_TRACK_AT_LUA)
+
+def _playlist_script_keys(room_name):
+    return [_playlist_order_key(room_name), _playlist_tracks_key(room_name), PLAYLIST_ROOMS_KEY,
+            _room_summary_key(room_name), _playlist_version_key(room_name), _playlist_titles_key(room_name)]
+
+def get_room_playlist(room_name):
+    """
+    Get a room playlist in order, reading legacy JSON playlists if the room has not been migrated.
+
+    Args:
+        room_name (str): Name of the room
+
+    Returns:
+        list: Track dicts in playlist order (empty if the room has no playlist)
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrange(_playlist_order_key(room_name), 0, -1)
+    pipe.hexists(_playlist_titles_key(room_name), TITLE_INDEX_READY_FIELD)
+    members, indexed = pipe.execute()
+    if not members:
+        return _migrate_legacy_playlist(room_name) or []
+    if not indexed:
+        return _build_title_index(room_name)
+    return _decode_tracks(redis_client.hmget(_playlist_tracks_key(room_name), members))
+
+def set_room_playlist(room_name, playlist):
+    """
+    Replace a room playlist.
+
+    Args:
+        room_name (str): Name of the room
+        playlist (list): Track dicts in playlist order
+
+    Returns:
+        list: The tracks stored (later duplicates of a track key or title are dropped)
+    """
+    pipe = redis_client.pipeline()
+    stored = _write_playlist(pipe, room_name, playlist)
+    version = pipe.execute()[-1]
+    refresh_room_summary(room_name)
+    _publish_playlist_delta(room_name, version, 'reset')
+    return stored
+
+def room_playlist_exists(room_name):
+    """Check whether a room has a playlist in either storage format."""
+    return bool(redis_client.sismember(PLAYLIST_ROOMS_KEY, room_name)
+                or redis_client.hexists(LEGACY_PLAYLISTS_KEY, room_name))
+
+def get_all_room_names():
+    """Get the names of all rooms that have a playlist."""
+    rooms = {member.decode('utf-8') for member in redis_client.smembers(PLAYLIST_ROOMS_KEY)}
+    rooms.update(key.decode('utf-8') for key in redis_client.hkeys(LEGACY_PLAYLISTS_KEY))
+    return list(rooms)
+
+def get_playlist_length(room_name):
+    """Get the number of tracks in a room playlist."""
+    _ensure_playlist_migrated(room_name)
+    return redis_client.zcard(_playlist_order_key(room_name))
+
+def get_playlist_track_at(room_name, index):
+    """
+    Get the track at a position of a room playlist without loading the whole playlist.
+
+    Returns:
+        dict or None: The track, or None if the index is out of range
+    """
+    if index is None or index < 0:
+        return None
+    keys = [_playlist_order_key(room_name), _playlist_tracks_key(room_name)]
+    raw = _track_at_script(keys=keys, args=[index])
+    if raw is None:
+        _migrate_legacy_playlist(room_name)
+        raw = _track_at_script(keys=keys, args=[index])
+    return json.loads(raw.decode('utf-8')) if raw else None
+
+def get_playlist_index(room_name, track_key):
+    """Get the position of a track in a room playlist, or None if it is not there."""
+    _ensure_playlist_migrated(room_name)
+    return redis_client.zrank(_playlist_order_key(room_name), track_key)
+
+def append_tracks_to_playlist(room_name, tracks):
+    """
+    Append tracks to the end of a room playlist. Tracks whose key or title is already in
+    the playlist are skipped.
+
+    Returns:
+        list: The tracks that were appended
+    """
+    _ensure_playlist_migrated(room_name)
+    args = [room_name]
+    tracks_by_key = {}
+    for track in tracks:
+        track_key = playlist_track_key(track)
+        tracks_by_key.setdefault(track_key, track)
+        args.extend([track_key, json.dumps(track), playlist_title_key(track)])
+    result = _append_tracks_script(keys=_playlist_script_keys(room_name), args=args)
+    if result is None:
+        _build_title_index(room_name)
+        result = _append_tracks_script(keys=_playlist_script_keys(room_name), args=args)
+    version, appended_keys = result
+    appended = [tracks_by_key[key.decode('utf-8')] for key in appended_keys]
+    if appended:
+        _publish_playlist_delta(room_name, version, 'append', tracks=appended)
+    return appended
+
+def insert_track_at(room_name, index, track):
+    """
+    Insert a track so that it ends up at the given index. If the track, or a track with
+    the same title, is already in the playlist, that entry is moved there instead.
+
+    Returns:
+        int: The index the track was placed at
+    """
+    return _insert_track(room_name, track, index, 'at')
+
+def insert_track_after_current(room_name, current_index, track):
+    """
+    Insert a track right after the currently playing track. If the current index is
+    unknown or out of range the track goes to position 1 (or 0 in an empty playlist).
+    If the track, or a track with the same title, is already in the playlist, that entry
+    is moved up to play next, or left where it is when it is at or before the current index.
+
+    Returns:
+        int: The index of the track in the playlist
+    """
+    if current_index is None or not isinstance(current_index, int):
+        current_index = -1
+    return _insert_track(room_name, track, current_index, 'after')
+
+def _insert_track(room_name, track, index, mode):
+    _ensure_playlist_migrated(room_name)
+    track_key = playlist_track_key(track)
+    args = [room_name, track_key, json.dumps(track), index, mode, playlist_title_key(track)]
+    result = _insert_track_script(keys=_playlist_script_keys(room_name), args=args)
+    if result is None:
+        _build_title_index(room_name)
+        result = _insert_track_script(keys=_playlist_script_keys(room_name), args=args)
+    index, version, existing_key = result
+    if not version:
+        return index
+    if existing_key:
+        _publish_playlist_delta(room_name, version, 'move', track_key=existing_key.decode('utf-8'), index=index)
+    else:
+        _publish_playlist_delta(room_name, version, 'insert', track=track, track_key=track_key, index=index)
+    return index
+
+def move_track(room_name, track_key, index):
+    """
+    Move a track to a new index. The index refers to the playlist after the track has
+    been taken out, matching list.pop() followed by list.insert().
+
+    Returns:
+        int or None: The index the track was moved to, or None if the track is not in the playlist
+    """
+    _ensure_playlist_migrated(room_name)
+    result = _move_track_script(keys=_playlist_script_keys(room_name), args=[track_key, index])
+    if result is None:
+        return None
+    index, version = result
+    _publish_playlist_delta(room_name, version, 'move', track_key=track_key, index=index)
+    return index
+
+def remove_track_from_playlist(room_name, track_key):
+    """
+    Remove a track from a room playlist.
+
+    Returns:
+        dict or None: The removed track, or None if it was not in the playlist
+    """
+    _ensure_playlist_migrated(room_name)
+    result = _remove_track_script(keys=_playlist_script_keys(room_name), args=[track_key])
+    if result is None:
+        return None
+    raw, version = result
+    _publish_playlist_delta(room_name, version, 'remove', track_key=track_key)
+    return json.loads(raw.decode('utf-8')) if raw else None
+
+def delete_room_playlist(room_name):
+    """Delete a room playlist in both storage formats."""
+    pipe = redis_client.pipeline()
+    pipe.delete(_playlist_order_key(room_name), _playlist_tracks_key(room_name), _playlist_titles_key(room_name))
+    pipe.srem(PLAYLIST_ROOMS_KEY, room_name)
+    pipe.hdel(LEGACY_PLAYLISTS_KEY, room_name)
+    pipe.incr(_playlist_version_key(room_name))
+    version = pipe.execute()[-1]
+    remove_room_summary(room_name)
+    _publish_playlist_delta(room_name, version, 'reset')
+
+# ======= room summaries
+# A room summary is the small record shown in room listings (explore, profiles). It lives
+# in room_summary{version}:{room} and is updated by every playlist, settings, intro and
+# host write, so listings never read the full playlist.
+
+INTRO_PREVIEW_LENGTH = 100
+
+def _room_summary_key(room_name):
+    return f"room_summary{redis_version}:{room_name}"
+
+def _decode_json(raw, default):
+    if not raw:
+        return default
+    try:
+        return json.loads(raw.decode('utf-8') if isinstance(raw, bytes) else raw)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return default
+
+def _intro_preview(intro):
+    if intro and len(intro) > INTRO_PREVIEW_LENGTH:
+        return intro[:INTRO_PREVIEW_LENGTH] + '...'
+    return intro or ''
+
+def get_room_cards(room_names):
+    """
+    Build room summaries from the source room data in a fixed number of Redis round trips.
+
+    Settings, intro and host data come from pipelined HMGETs; the cover and song count
+    come from each playlist's first member and ZCARD, so no full playlist is decoded.
+
+    Args:
+        room_names (list): Names of the rooms
+
+    Returns:
+        list: Dicts with name, cover_image, introduction, song_count, genre, occasion,
+              host and created_at, in the order of room_names
+    """
+    if not room_names:
+        return []
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hmget(f"settings{redis_version}", room_names)
+    pipe.hmget(f"intro{redis_version}", room_names)
+    pipe.hmget(f"room_hosts{redis_version}", room_names)
+    pipe.hmget(LEGACY_PLAYLISTS_KEY, room_names)
+    for room_name in room_names:
+        pipe.zrange(_playlist_order_key(room_name), 0, 0)
+        pipe.zcard(_playlist_order_key(room_name))
+    results = pipe.execute()
+    settings_list, intros, hosts, legacy_playlists = results[:4]
+    first_keys = results[4::2]
+    song_counts = results[5::2]
+
+    pipe = redis_client.pipeline(transaction=False)
+    for room_name, first_key in zip(room_names, first_keys):
+        pipe.hget(_playlist_tracks_key(room_name), first_key[0] if first_key else '')
+    first_tracks = pipe.execute()
+
+    cards = []
+    for i, room_name in enumerate(room_names):
+        first_track = _decode_json(first_tracks[i], None)
+        song_count = song_counts[i]
+        if not song_count and legacy_playlists[i]:
+            # Rooms still in the legacy format are migrated once and read directly
+            playlist = _migrate_legacy_playlist(room_name) or []
+            first_track = playlist[0] if playlist else None
+            song_count = len(playlist)
+
+        settings = _decode_json(settings_list[i], {})
+        host = _decode_json(hosts[i], None)
+        cards.append({
+            "name": room_name,
+            "cover_image": first_track.get('cover_img_url', '') if first_track else '',
+            "introduction": _intro_preview(intros[i].decode('utf-8') if intros[i] else ''),
+            "song_count": song_count,
+            "genre": settings.get('genre', ''),
+            "occasion": settings.get('occasion', ''),
+            "host": host,
+            "created_at": host.get('created_at', '') if isinstance(host, dict) else '',
+        })
+    return cards
+
+def _summary_mapping(summary):
+    mapping = dict(summary)
+    mapping['host'] = json.dumps(summary.get('host'))
+    return mapping
+
+def _decode_summary(raw):
+    summary = {key.decode('utf-8'): value.decode('utf-8') for key, value in raw.items()}
+    summary['song_count'] = int(summary.get('song_count') or 0)
+    summary['host'] = _decode_json(summary.get('host'), None)
+    return summary
+
+# Explore index: room names ordered by creation time, so a page of rooms costs O(limit)
+ROOMS_BY_CREATED_AT_KEY = f"rooms_by_created_at{redis_version}"
+# Set when summaries and the index have been rebuilt from the room data. It expires after
+# EXPLORE_INDEX_TTL seconds so rooms written outside the summary hooks are picked up again
+EXPLORE_INDEX_READY_KEY = f"explore_index_ready{redis_version}"
+EXPLORE_INDEX_TTL = int(os.environ.get('EXPLORE_INDEX_TTL', 3600))
+
+def _created_at_score(created_at):
+    try:
+        return datetime.fromisoformat(created_at).timestamp()
+    except (TypeError, ValueError):
+        return 0
+
+def _write_room_summaries(summaries):
+    pipe = redis_client.pipeline(transaction=False)
+    for summary in summaries:
+        pipe.delete(_room_summary_key(summary['name']))
+        pipe.hset(_room_summary_key(summary['name']), mapping=_summary_mapping(summary))
+        pipe.zadd(ROOMS_BY_CREATED_AT_KEY, {summary['name']: _created_at_score(summary['created_at'])})
+    pipe.execute()
+
+def refresh_room_summary(room_name):
+    """Rebuild a room's summary and its position in the explore index from the room data."""
+    try:
+        if not room_playlist_exists(room_name):
+            remove_room_summary(room_name)
+            return
+        _write_room_summaries(get_room_cards([room_name]))
+    except Exception as e:
+        logger.error(f"Error refreshing room summary for {room_name}: {str(e)}")
+
+def update_room_summary(room_name, settings=None, introduction=None, host=None):
+    """
+    Update the summary fields that depend on room settings, intro or host data.
+
+    Args:
+        room_name (str): Name of the room
+        settings (dict, optional): New room settings
+        introduction (str, optional): New room introduction
+        host (dict, optional): New host data (username, avatar, created_at)
+    """
+    try:
+        if not redis_client.exists(_room_summary_key(room_name)):
+            refresh_room_summary(room_name)
+            return
+
+        fields = {}
+        if settings is not None:
+            fields['genre'] = settings.get('genre', '')
+            fields['occasion'] = settings.get('occasion', '')
+        if introduction is not None:
+            fields['introduction'] = _intro_preview(introduction)
+        if host is not None:
+            fields['host'] = json.dumps(host)
+            fields['created_at'] = host.get('created_at', '')
+
+        pipe = redis_client.pipeline()
+        if fields:
+            pipe.hset(_room_summary_key(room_name), mapping=fields)
+        if host is not None:
+            pipe.zadd(ROOMS_BY_CREATED_AT_KEY, {room_name: _created_at_score(fields['created_at'])})
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Error updating room summary for {room_name}: {str(e)}")
+
+def remove_room_summary(room_name):
+    """Drop a room's summary and remove it from the explore index."""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.delete(_room_summary_key(room_name))
+    pipe.zrem(ROOMS_BY_CREATED_AT_KEY, room_name)
+    pipe.execute()
+
+def get_room_summaries(room_names):
+    """
+    Get room summaries for listings, building any that do not exist yet.
+
+    Args:
+        room_names (list): Names of the rooms
+
+    Returns:
+        list: Summaries in the order of room_names; rooms without a playlist are skipped
+    """
+    if not room_names:
+        return []
+
+    pipe = redis_client.pipeline(transaction=False)
+    for room_name in room_names:
+        pipe.hgetall(_room_summary_key(room_name))
+    raw_summaries = pipe.execute()
+
+    missing = [name for name, raw in zip(room_names, raw_summaries)
+               if not raw and room_playlist_exists(name)]
+    built = {summary['name']: summary for summary in get_room_cards(missing)}
+    if built:
+        _write_room_summaries(built.values())
+
+    summaries = []
+    for room_name, raw in zip(room_names, raw_summaries):
+        if raw:
+            summaries.append(_decode_summary(raw))
+        elif room_name in built:
+            summaries.append(built[room_name])
+    return summaries
+
+def rebuild_explore_index():
+    """
+    Rebuild every room summary and the creation-time index from the room data.
+
+    Returns:
+        int: Number of rooms indexed
+    """
+    summaries = get_room_cards(get_all_room_names())
+    _write_room_summaries(summaries)
+    # Drop rooms that no longer exist without emptying the index readers are paging through
+    indexed = {name.decode('utf-8') for name in redis_client.zrange(ROOMS_BY_CREATED_AT_KEY, 0, -1)}
+    stale = indexed - {summary['name'] for summary in summaries}
+    if stale:
+        redis_client.zrem(ROOMS_BY_CREATED_AT_KEY, *stale)
+    redis_client.set(EXPLORE_INDEX_READY_KEY, datetime.now().isoformat(), ex=EXPLORE_INDEX_TTL)
+    logger.info(f"Rebuilt explore index with {len(summaries)} rooms")
+    return len(summaries)
+
+def claim_explore_index_rebuild():
+    """
+    Claim the periodic explore index rebuild. Only one caller per EXPLORE_INDEX_TTL gets True
+    and should run rebuild_explore_index() outside the request; the others keep serving the
+    current index.
+    """
+    return bool(redis_client.set(EXPLORE_INDEX_READY_KEY, 'rebuilding', nx=True, ex=EXPLORE_INDEX_TTL))
+
+def release_explore_index_rebuild():
+    """Let the next caller claim the rebuild again, e.g. after a failed rebuild."""
+    redis_client.delete(EXPLORE_INDEX_READY_KEY)
+
+def _encode_explore_cursor(score, skip):
+    return f"{score!r}:{skip}"
+
+def _decode_explore_cursor(cursor):
+    score, skip = cursor.rsplit(':', 1)
+    return float(score), int(skip)
+
+def get_explore_page(limit, cursor=None, offset=None):
+    """
+    Get a page of room summaries, newest first.
+
+    Pages are addressed by an opaque cursor: the score of the last room returned plus
+    how many rooms with that score were already returned, so ties are never skipped
+    or repeated. An offset is still accepted for page-number clients.
+
+    Args:
+        limit (int): Maximum number of rooms to return
+        cursor (str, optional): next_cursor from the previous page
+        offset (int, optional): Number of rooms to skip when no cursor is given
+
+    Returns:
+        dict: rooms (list of summaries), total (int), next_cursor (str or None)
+    """
+    if cursor:
+        max_score, skip = _decode_explore_cursor(cursor)
+        entries = redis_client.zrevrangebyscore(
+            ROOMS_BY_CREATED_AT_KEY, max_score, '-inf', start=skip, num=limit + 1, withscores=True)
+    else:
+        max_score, skip = None, 0
+        start = offset or 0
+        entries = redis_client.zrevrange(ROOMS_BY_CREATED_AT_KEY, start, start + limit, withscores=True)
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    next_cursor = None
+    if has_more and entries:
+        last_score = entries[-1][1]
+        if cursor:
+            same_score = sum(1 for _, score in entries if score == last_score)
+            if last_score == max_score and same_score == len(entries):
+                same_score += skip
+        else:
+            # Rooms with the last score on earlier pages count too: everything up to the
+            # last entry minus the rooms with a higher score
+            higher = redis_client.zcount(ROOMS_BY_CREATED_AT_KEY, f"({last_score!r}", '+inf')
+            same_score = start + len(entries) - higher
+        next_cursor = _encode_explore_cursor(last_score, same_score)
+
+    rooms = get_room_summaries([name.decode('utf-8') for name, _ in entries])
+    return {"rooms": rooms, "total": redis_client.zcard(ROOMS_BY_CREATED_AT_KEY), "next_cursor": next_cursor}
+
+# ======= user profiles
+
+# Seconds an assembled profile response is cached; 0 disables the cache
+PROFILE_CACHE_TTL = int(os.environ.get('PROFILE_CACHE_TTL', 30))
+
+def _profile_cache_key(username):
+    return f"profile_cache{redis_version}:{username}"
+
+def get_cached_profile(username):
+    """Get a cached profile response, or None if it is not cached or caching is disabled."""
+    if PROFILE_CACHE_TTL <= 0:
+        return None
+    return _decode_json(redis_client.get(_profile_cache_key(username)), None)
+
+def cache_profile(username, profile):
+    """Cache an assembled profile response for PROFILE_CACHE_TTL seconds."""
+    if PROFILE_CACHE_TTL > 0:
+        redis_client.setex(_profile_cache_key(username), PROFILE_CACHE_TTL, json.dumps(profile))
+
+def invalidate_profile_cache(*usernames):
+    """Drop cached profiles after follow, favorite, room or profile changes."""
+    keys = [_profile_cache_key(username) for username in usernames if username]
+    if keys:
+        redis_client.delete(*keys)
+
+def get_profile_bundle(username):
+    """
+    Gather the data behind a profile page in a few pipelined round trips.
+
+    Args:
+        username (str): Username of the profile
+
+    Returns:
+        dict or None: None if the user has no profile, otherwise a dict with
+              profile (dict), tags (list or None), rooms and favorites (room summaries),
+              following and followers (lists of (username, profile dict) pairs; users
+              without a profile are left out)
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hget(f"user_profiles{redis_version}", username)
+    pipe.hget(f"user_favorites{redis_version}", username)
+    pipe.hget(f"user_following{redis_version}", username)
+    pipe.hget(f"user_followers{redis_version}", username)
+    pipe.hget(f"user_tags{redis_version}", username)
+    profile_raw, favorites_raw, following_raw, followers_raw, tags_raw = pipe.execute()
+
+    profile = _decode_json(profile_raw, None)
+    if profile is None:
+        return None
+
+    created_rooms = profile.get('created_rooms', [])
+    favorites = _decode_json(favorites_raw, [])
+    following = _decode_json(following_raw, [])
+    followers = _decode_json(followers_raw, [])
+
+    follow_names = list(dict.fromkeys(following + followers))
+    follow_profiles = {}
+    if follow_names:
+        raw_profiles = redis_client.hmget(f"user_profiles{redis_version}", follow_names)
+        follow_profiles = {name: _decode_json(raw, None) for name, raw in zip(follow_names, raw_profiles)}
+
+    summaries = {summary['name']: summary
+                 for summary in get_room_summaries(list(dict.fromkeys(created_rooms + favorites)))}
+
+    return {
+        "profile": profile,
+        "tags": _decode_json(tags_raw, None),
+        "rooms": [summaries[name] for name in created_rooms if name in summaries],
+        "favorites": [summaries[name] for name in favorites if name in summaries],
+        "following": [(name, follow_profiles[name]) for name in following if follow_profiles.get(name)],
+        "followers": [(name, follow_profiles[name]) for name in followers if follow_profiles.get(name)],
+    }
 
 def get_user_data(username):
     """
@@ -179,37 +1118,28 @@ def get_user_data(username):
     """
     try:
         user_key = f"user:{username}"
-        logger.info(f"Getting user data for {username} with key {user_key}")
-        
         user_data = redis_client.hgetall(user_key)
-        logger.info(f"Raw user data from Redis: {user_data}")
         
         # Convert bytes to strings
         result = {}
         for key, value in user_data.items():
             key_str = key.decode('utf-8')
             value_str = value.decode('utf-8')
-            logger.info(f"Processing field {key_str} with value {value_str}")
             
             # Handle special fields
             if key_str == 'is_admin':
                 # Ensure admin users are always admin
-                if username in ADMIN_USERS:
-                    result[key_str] = True
-                    logger.info(f"Setting {username} as admin (admin list override)")
-                else:
-                    admin_status = value_str.lower() == 'true'
-                    result[key_str] = admin_status
-                    logger.info(f"Setting admin status for {username} to {admin_status} based on value '{value_str}'")
+                result[key_str] = username in ADMIN_USERS or value_str.lower() == 'true'
             else:
                 result[key_str] = value_str
         
         # Ensure admin users are always admin even if not in Redis
         if username in ADMIN_USERS and 'is_admin' not in result:
             result['is_admin'] = True
-            logger.info(f"Setting {username} as admin (not in Redis)")
         
-        logger.info(f"Final user data for {username}: {result}")
+        log_event(logger, 'user_data_loaded', level=logging.DEBUG, username=username,
+                  fields=len(result), is_admin=result.get('is_admin', False))
+        log_payload(logger, 'user_data_loaded', result)
         return result
     except Exception as e:
         logger.error(f"Error getting user data: {str(e)}")
@@ -255,8 +1185,7 @@ def get_room_data(room_name):
     """
     try:
         # Get playlist data
-        playlist_json = get_hash(f"room_playlists{redis_version}", room_name)
-        playlist = json.loads(playlist_json) if playlist_json else []
+        playlist = get_room_playlist(room_name)
         
         # Get player state data
         player_state_json = get_hash(f"room_player_states{redis_version}", room_name)
@@ -280,7 +1209,7 @@ def get_room_data(room_name):
         logger.error(f"Error getting room data for {room_name}: {str(e)}")
         return {"playlist": [], "current_index": 0, "player_state": "paused", "position": 0, "settings": {}}
 
-def update_room_player_state(room_name, state, position):
+def update_room_player_state(room_name, state, position, index=None, player_state=None):
     """
     Update the player state for a room.
     
@@ -288,25 +1217,45 @@ def update_room_player_state(room_name, state, position):
         room_name (str): Name of the room
         state (str): Player state (playing, paused, etc.)
         position (float): Current playback position in seconds
+        index (int, optional): Index of the current track in the playlist
+        player_state (dict, optional): Full client player state to store alongside,
+            so any worker can send it to clients joining the room
         
     Returns:
         bool: True if successful, False otherwise
     """
     try:
-        player_state = {
+        stored_state = dict(player_state or {})
+        stored_state.update({
             "state": state,
             "position": position,
             "updated_at": int(time.time())
-        }
+        })
+        if index is not None:
+            stored_state["index"] = index
         
         # Store player state in Redis
-        write_hash(f"room_player_states{redis_version}", room_name, json.dumps(player_state))
+        write_hash(f"room_player_states{redis_version}", room_name, json.dumps(stored_state))
         
         return True
     except Exception as e:
         logger.error(f"Error updating player state for room {room_name}: {str(e)}")
         return False
 
+def get_room_player_state(room_name):
+    """
+    Get the stored player state for a room.
+    
+    Returns:
+        dict or None: Player state, or None if the room has none
+    """
+    try:
+        player_state_json = get_hash(f"room_player_states{redis_version}", room_name)
+        return json.loads(player_state_json) if player_state_json else None
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid JSON in stored player state for room {room_name}: {str(e)}")
+        return None
+
 def increment_song_play_count(song_id, title=None, artist=None):
     """
     Increment the play count for a song in Redis.
@@ -332,6 +1281,8 @@ def increment_song_play_count(song_id, title=None, artist=None):
         
         # Also store in a sorted set for easy retrieval of top played songs
         redis_client.zadd("song:play_counts", {song_id: new_count})
+        # and list the song in the song features index used by feature exports
+        redis_client.sadd(f"song_features_index{redis_version}", song_id)
         
         # Update the song features data in Redis if title and artist are provided
         if title or artist:
@@ -365,7 +1316,7 @@ def increment_song_play_count(song_id, title=None, artist=None):
                 if artist:
                     redis_client.hset(song_features_key, "artist", artist)
         
-        logger.info(f"Incremented play count for song {song_id} to {new_count}")
+        log_event(logger, 'song_play_count_incremented', sample_rate=0.1, song_id=song_id, play_count=new_count)
         return new_count
     except Exception as e:
         logger.error(f"Error incrementing play count for song {song_id}: {str(e)}")
@@ -0,0 +1,76 @@
+"""
+Shared Redis connection pool.
+
+Every module gets its client from get_redis_client() so the whole process shares one
+bounded pool instead of each module (and each greenlet) opening its own connections.
+Connection settings come from the environment:
+
+- REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD: where Redis lives
+- REDIS_MAX_CONNECTIONS: pool size
+- REDIS_POOL_TIMEOUT: seconds to wait for a free connection when the pool is exhausted
+- REDIS_SOCKET_TIMEOUT, REDIS_SOCKET_CONNECT_TIMEOUT: socket timeouts in seconds
+- REDIS_HEALTH_CHECK_INTERVAL: seconds a connection may sit idle before it is pinged
+
+The pool blocks (up to REDIS_POOL_TIMEOUT) when all connections are in use, so a burst of
+eventlet greenlets queues for a connection instead of opening unbounded sockets. With
+eventlet monkey patching the pool's lock and sockets are green and waiting yields to the hub.
+"""
+
+import os
+import logging
+import threading
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+REDIS_DB = int(os.environ.get('REDIS_DB', 0))
+REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD') or None
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 50))
+REDIS_POOL_TIMEOUT = float(os.environ.get('REDIS_POOL_TIMEOUT', 5))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 5))
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.environ.get('REDIS_SOCKET_CONNECT_TIMEOUT', 2))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(decode_responses):
+    pool = _pools.get(decode_responses)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(decode_responses)
+            if pool is None:
+                pool = redis.BlockingConnectionPool(
+                    host=REDIS_HOST,
+                    port=REDIS_PORT,
+                    db=REDIS_DB,
+                    password=REDIS_PASSWORD,
+                    max_connections=REDIS_MAX_CONNECTIONS,
+                    timeout=REDIS_POOL_TIMEOUT,
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+                    health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                    decode_responses=decode_responses,
+                )
+                _pools[decode_responses] = pool
+                logger.info(f"Created Redis pool for {REDIS_HOST}:{REDIS_PORT}/{REDIS_DB} "
+                            f"(max_connections={REDIS_MAX_CONNECTIONS}, decode_responses={decode_responses})")
+    return pool
+
+
+def get_redis_client(decode_responses=False):
+    """
+    Get a Redis client backed by the shared connection pool.
+
+    Args:
+        decode_responses (bool): Return str instead of bytes. Clients with and without
+            decoding use separate pools because the setting is per connection.
+
+    Returns:
+        redis.Redis: Client sharing the process-wide pool
+    """
+    return redis.Redis(connection_pool=_get_pool(decode_responses))
@@ -0,0 +1,87 @@
+"""
+Per-room coalescing of high-frequency events.
+
+A RoomThrottle keeps only the latest value submitted for each room and hands it to its
+callback at most once per interval. The first value after a quiet period goes out
+immediately; values arriving during the interval replace each other and the last one is
+delivered when the interval ends (leading + trailing throttle), so no final state is lost.
+Delayed deliveries run in a Socket.IO background task, so handlers never sleep.
+Call forget() when a room goes idle so its bookkeeping does not outlive it.
+"""
+
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RoomThrottle:
+    def __init__(self, socketio, interval, callback, name='room_throttle'):
+        """
+        Args:
+            socketio (SocketIO): Used to start background tasks and sleep cooperatively
+            interval (float): Minimum seconds between two callbacks for the same room
+            callback (callable): callback(room_name, value) run with the latest value
+            name (str): Name used in error logs
+        """
+        self.socketio = socketio
+        self.interval = interval
+        self.callback = callback
+        self.name = name
+        self._latest = {}
+        self._last_run = {}
+        self._scheduled = set()
+        self._forgotten = set()
+        self._lock = threading.Lock()
+
+    def submit(self, room_name, value):
+        """Record the latest value for a room and deliver it now or at the end of the interval."""
+        with self._lock:
+            self._latest[room_name] = value
+            self._forgotten.discard(room_name)
+            if room_name in self._scheduled:
+                return
+            delay = self._last_run.get(room_name, 0) + self.interval - time.monotonic()
+            if delay > 0:
+                self._scheduled.add(room_name)
+        if delay > 0:
+            self.socketio.start_background_task(self._deliver_later, room_name, delay)
+        else:
+            self._deliver(room_name)
+
+    def flush(self, room_name, value):
+        """Deliver a value now, replacing any value waiting for the end of the interval."""
+        with self._lock:
+            self._latest[room_name] = value
+            self._forgotten.discard(room_name)
+        self._deliver(room_name)
+
+    def forget(self, room_name):
+        """Drop the bookkeeping of an idle room; a value still waiting is delivered first."""
+        with self._lock:
+            if room_name in self._scheduled:
+                self._forgotten.add(room_name)
+            else:
+                self._last_run.pop(room_name, None)
+
+    def _deliver_later(self, room_name, delay):
+        self.socketio.sleep(delay)
+        with self._lock:
+            self._scheduled.discard(room_name)
+        self._deliver(room_name)
+        with self._lock:
+            if room_name in self._forgotten:
+                self._forgotten.discard(room_name)
+                self._last_run.pop(room_name, None)
+
+    def _deliver(self, room_name):
+        with self._lock:
+            if room_name not in self._latest:
+                return
+            value = self._latest.pop(room_name)
+            self._last_run[room_name] = time.monotonic()
+        try:
+            self.callback(room_name, value)
+        except Exception as e:
+            logger.error(f"Error in {self.name} for room {room_name}: {str(e)}")
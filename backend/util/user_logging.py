@@ -34,25 +34,288 @@ All logs are stored in Redis with timestamps and relevant details to enable:
 - Debugging user issues
 """
 
-import redis
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import os
+import atexit
+import queue
+import threading
+import time
+
+from redis.exceptions import ResponseError
+
+from util.redis_pool import get_redis_client
+from util.log_policy import log_event
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 # Connect to Redis
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+redis_client = get_redis_client()
 redis_version = '_v1'
 
-# User activity log key format: user_logs:{version}:{username}
-# Each user's log is a sorted set with timestamp as score and activity JSON as value
+# Activity logs are Redis Streams:
+#   activity_stream{version}                  -> every activity
+#   user_activity_stream{version}:{username}  -> one user's activities
+#   room_activity_stream{version}:{room_name} -> activities tied to a room
+# Each stream entry holds the activity JSON in its "entry" field. Streams are trimmed
+# on write (approximate MAXLEN, plus MINID for the retention window) so memory stays
+# bounded, and every activity gets its own entry id so identical payloads are kept.
+GLOBAL_ACTIVITY_STREAM = f"activity_stream{redis_version}"
+GLOBAL_STREAM_MAXLEN = int(os.environ.get('ACTIVITY_GLOBAL_MAXLEN', 1000000))
+USER_STREAM_MAXLEN = int(os.environ.get('ACTIVITY_USER_MAXLEN', 5000))
+ROOM_STREAM_MAXLEN = int(os.environ.get('ACTIVITY_ROOM_MAXLEN', 10000))
+ACTIVITY_RETENTION_DAYS = int(os.environ.get('ACTIVITY_RETENTION_DAYS', 180))
+
+def _user_stream_key(username):
+    return f"user_activity_stream{redis_version}:{username}"
+
+def _room_stream_key(room_name):
+    return f"room_activity_stream{redis_version}:{room_name}"
+
+def _retention_min_id():
+    cutoff = datetime.now() - timedelta(days=ACTIVITY_RETENTION_DAYS)
+    return f"{int(cutoff.timestamp() * 1000)}-0"
+
+def _parse_stream_entries(entries):
+    """Decode stream entries into activity dicts with display timestamps and their log_id."""
+    logs = []
+    for entry_id, fields in entries:
+        log_data = json.loads(fields[b'entry'].decode('utf-8'))
+        log_data['log_id'] = entry_id.decode('utf-8')
+        
+        # Format timestamp for frontend display
+        if 'timestamp' in log_data:
+            try:
+                # Parse ISO format timestamp and convert to a more readable format
+                dt = datetime.fromisoformat(log_data['timestamp'])
+                log_data['timestamp'] = dt.strftime('%Y-%m-%d %H:%M:%S')
+            except Exception as e:
+                logger.error(f"Error formatting timestamp: {str(e)}")
+                # Keep original timestamp if parsing fails
+        
+        logs.append(log_data)
+    return logs
+
+def _read_stream_page(key, limit, start=0, before=None):
+    # Streams are read newest first. A before cursor (the log_id of the last entry of the
+    # previous page) reads one page from that id; offsets read start + limit entries
+    if before:
+        entries = redis_client.xrevrange(key, max=before, count=limit + 1)
+        if entries and entries[0][0].decode('utf-8') == before:
+            entries = entries[1:]  # the range includes the cursor entry itself
+        return _parse_stream_entries(entries[:limit])
+    entries = redis_client.xrevrange(key, count=start + limit)
+    return _parse_stream_entries(entries[start:start + limit])
+
+# Activities are queued in-process and written by a background thread in pipelined
+# batches, so logging adds no Redis round trips to request handling.
+ACTIVITY_LOG_ASYNC = os.environ.get('ACTIVITY_LOG_ASYNC', '1') != '0'
+ACTIVITY_QUEUE_SIZE = int(os.environ.get('ACTIVITY_QUEUE_SIZE', 10000))
+ACTIVITY_BATCH_SIZE = int(os.environ.get('ACTIVITY_BATCH_SIZE', 200))
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 0.5))  # seconds
+# How long a request waits for queue space before the activity is dropped
+ACTIVITY_ENQUEUE_TIMEOUT = float(os.environ.get('ACTIVITY_ENQUEUE_TIMEOUT', 0.05))
+
+# ======= feature counters
+# Song and room features are counted as activities are written, so exports only read
+# the current counters:
+#   song_features:{song_id}                   -> hash with favorite/add/remove counts, title, artist
+#   song_feature_rooms{version}:{song_id}     -> set of rooms the song was used in
+#   song_feature_users{version}:{song_id}     -> HyperLogLog of users who interacted with it
+#   room_features{version}:{room_name}        -> hash with join/favorite/create counts
+#   room_feature_users{version}:{room_name}   -> set of users who interacted with the room
+# song_features_index / room_features_index list the songs and rooms with features.
+SONG_FEATURES_INDEX_KEY = f"song_features_index{redis_version}"
+ROOM_FEATURES_INDEX_KEY = f"room_features_index{redis_version}"
+
+SONG_FEATURE_ACTIONS = {"play_song", "pause_song", "favorite_song", "add_song", "remove_song"}
+SONG_COUNTER_FIELDS = {"favorite_song": "favorite_count", "add_song": "add_count", "remove_song": "remove_count"}
+ROOM_FEATURE_ACTIONS = {"create_room", "join_room", "leave_room", "favorite_room", "unfavorite_room"}
+ROOM_COUNTER_FIELDS = {"join_room": "join_count", "favorite_room": "favorite_count", "create_room": "create_count"}
+
+def _song_features_key(song_id):
+    return f"song_features:{song_id}"
+
+def _song_rooms_key(song_id):
+    return f"song_feature_rooms{redis_version}:{song_id}"
+
+def _song_users_key(song_id):
+    return f"song_feature_users{redis_version}:{song_id}"
+
+def _room_features_key(room_name):
+    return f"room_features{redis_version}:{room_name}"
+
+def _room_users_key(room_name):
+    return f"room_feature_users{redis_version}:{room_name}"
+
+def _record_features(pipe, log_entry):
+    """Queue the feature counter updates for one activity on pipe."""
+    action = log_entry.get("action")
+    username = log_entry.get("username")
+    room_name = log_entry.get("room_name")
+    song_id = log_entry.get("song_id")
+
+    if action in SONG_FEATURE_ACTIONS and song_id:
+        pipe.sadd(SONG_FEATURES_INDEX_KEY, song_id)
+        if action in SONG_COUNTER_FIELDS:
+            pipe.hincrby(_song_features_key(song_id), SONG_COUNTER_FIELDS[action], 1)
+        details = log_entry.get("details")
+        if isinstance(details, dict):
+            if details.get("title"):
+                pipe.hsetnx(_song_features_key(song_id), "title", details["title"])
+            if details.get("artist"):
+                pipe.hsetnx(_song_features_key(song_id), "artist", details["artist"])
+        if room_name:
+            pipe.sadd(_song_rooms_key(song_id), room_name)
+        if username:
+            pipe.pfadd(_song_users_key(song_id), username)
+
+    if action in ROOM_FEATURE_ACTIONS and room_name:
+        pipe.sadd(ROOM_FEATURES_INDEX_KEY, room_name)
+        if action in ROOM_COUNTER_FIELDS:
+            pipe.hincrby(_room_features_key(room_name), ROOM_COUNTER_FIELDS[action], 1)
+        if username:
+            pipe.sadd(_room_users_key(room_name), username)
+
+def _write_activities(activities):
+    """Write (log_entry, log_json) pairs to the streams and feature counters in one pipeline."""
+    pipe = redis_client.pipeline(transaction=False)
+    trimmed_keys = set()
+    for log_entry, log_json in activities:
+        username = log_entry["username"]
+        room_name = log_entry.get("room_name")
+        _record_features(pipe, log_entry)
+        targets = [(GLOBAL_ACTIVITY_STREAM, GLOBAL_STREAM_MAXLEN),
+                   (_user_stream_key(username), USER_STREAM_MAXLEN)]
+        if room_name:
+            targets.append((_room_stream_key(room_name), ROOM_STREAM_MAXLEN))
+        for key, maxlen in targets:
+            pipe.xadd(key, {"entry": log_json}, maxlen=maxlen, approximate=True)
+            trimmed_keys.add(key)
+
+    # Retention trimming only needs to happen once per stream per batch
+    min_id = _retention_min_id()
+    for key in trimmed_keys:
+        pipe.xtrim(key, minid=min_id, approximate=True)
+    pipe.execute()
+
+class ActivityLogWriter:
+    """Background writer that flushes queued activities by batch size or time."""
+
+    def __init__(self, queue_size, batch_size, flush_interval, enqueue_timeout):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"queued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, activity):
+        """
+        Queue an activity for writing.
+
+        Returns:
+            bool: False if the queue stayed full for enqueue_timeout and the activity was dropped
+        """
+        self._ensure_started()
+        try:
+            self._queue.put(activity, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._count("dropped")
+            logger.warning("Activity log queue is full, dropping activity")
+            return False
+        self._count("queued")
+        return True
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            _write_activities(batch)
+            self._count("written", len(batch))
+            self._count("batches")
+        except Exception as e:
+            self._count("failed", len(batch))
+            logger.error(f"Error writing {len(batch)} activity logs: {str(e)}")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """Write everything still queued from the calling thread."""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def stop(self):
+        """Stop the background thread and flush what is left in the queue."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2)
+        self.flush()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize()
+        return stats
+
+_activity_writer = ActivityLogWriter(ACTIVITY_QUEUE_SIZE, ACTIVITY_BATCH_SIZE,
+                                     ACTIVITY_FLUSH_INTERVAL, ACTIVITY_ENQUEUE_TIMEOUT)
+atexit.register(_activity_writer.stop)
+
+def get_activity_writer_stats():
+    """Get counters for the background activity log writer (queued, written, dropped, failed, batches, pending)."""
+    return _activity_writer.stats()
+
+def flush_activity_logs():
+    """Write all queued activities now (used on shutdown and by scripts)."""
+    _activity_writer.flush()
 
 def log_user_activity(username, action, details=None, room_name=None, song_id=None):
     """
-    Log user activity to Redis.
+    Log user activity to Redis. The activity is queued and written in the background
+    unless ACTIVITY_LOG_ASYNC is set to 0.
     
     Args:
         username: The username of the user
@@ -62,7 +325,7 @@ def log_user_activity(username, action, details=None, room_name=None, song_id=No
         song_id: Related song ID (optional)
     
     Returns:
-        bool: True if logging was successful, False otherwise
+        bool: True if the activity was logged (or queued), False otherwise
     """
     try:
         # Create activity log entry
@@ -82,26 +345,21 @@ def log_user_activity(username, action, details=None, room_name=None, song_id=No
             log_entry["song_id"] = song_id
             
         # Convert to JSON string
-        log_json = json.dumps(log_entry)
-        
-        # Get current timestamp as score for sorted set
-        score = datetime.now().timestamp()
-        
-        # Add to user's activity log (sorted set)
-        user_log_key = f"user_logs{redis_version}:{username}"
-        redis_client.zadd(user_log_key, {log_json: score})
+        activity = (log_entry, json.dumps(log_entry))
         
-        # Also add to global activity log
-        global_log_key = f"global_logs{redis_version}"
-        redis_client.zadd(global_log_key, {log_json: score})
+        if ACTIVITY_LOG_ASYNC:
+            if not _activity_writer.submit(activity):
+                return False
+        else:
+            _write_activities([activity])
         
-        logger.info(f"Logged activity for user {username}: {action}")
+        log_event(logger, 'activity_logged', sample_rate=0.01, username=username, action=action, room=room_name)
         return True
     except Exception as e:
         logger.error(f"Error logging user activity: {str(e)}")
         return False
 
-def get_user_logs(username, limit=50, start=0):
+def get_user_logs(username, limit=50, start=0, before=None):
     """
     Get user activity logs from Redis.
     
@@ -109,78 +367,38 @@ def get_user_logs(username, limit=50, start=0):
         username: The username to get logs for
         limit: Maximum number of logs to return
         start: Starting index for pagination
+        before: log_id of the last entry of the previous page; reads the next page by
+            stream id instead of by offset (start is ignored)
     
     Returns:
         list: List of activity log entries as dictionaries
     """
     try:
-        user_log_key = f"user_logs{redis_version}:{username}"
-        
-        # Get logs from sorted set (newest first)
-        log_entries = redis_client.zrevrange(user_log_key, start, start + limit - 1)
-        
-        # Parse JSON entries
-        logs = []
-        for entry in log_entries:
-            log_data = json.loads(entry.decode('utf-8'))
-            
-            # Format timestamp for frontend display
-            if 'timestamp' in log_data:
-                try:
-                    # Parse ISO format timestamp and convert to a more readable format
-                    dt = datetime.fromisoformat(log_data['timestamp'])
-                    log_data['timestamp'] = dt.strftime('%Y-%m-%d %H:%M:%S')
-                except Exception as e:
-                    logger.error(f"Error formatting timestamp: {str(e)}")
-                    # Keep original timestamp if parsing fails
-            
-            logs.append(log_data)
-            
-        return logs
+        return _read_stream_page(_user_stream_key(username), limit, start, before)
     except Exception as e:
         logger.error(f"Error getting user activity logs: {str(e)}")
         return []
 
-def get_global_logs(limit=50, start=0):
+def get_global_logs(limit=50, start=0, before=None):
     """
     Get global activity logs from Redis.
     
     Args:
         limit: Maximum number of logs to return
         start: Starting index for pagination
+        before: log_id of the last entry of the previous page; reads the next page by
+            stream id instead of by offset (start is ignored)
     
     Returns:
         list: List of activity log entries as dictionaries
     """
     try:
-        global_log_key = f"global_logs{redis_version}"
-        
-        # Get logs from sorted set (newest first)
-        log_entries = redis_client.zrevrange(global_log_key, start, start + limit - 1)
-        
-        # Parse JSON entries
-        logs = []
-        for entry in log_entries:
-            log_data = json.loads(entry.decode('utf-8'))
-            
-            # Format timestamp for frontend display
-            if 'timestamp' in log_data:
-                try:
-                    # Parse ISO format timestamp and convert to a more readable format
-                    dt = datetime.fromisoformat(log_data['timestamp'])
-                    log_data['timestamp'] = dt.strftime('%Y-%m-%d %H:%M:%S')
-                except Exception as e:
-                    logger.error(f"Error formatting timestamp: {str(e)}")
-                    # Keep original timestamp if parsing fails
-            
-            logs.append(log_data)
-            
-        return logs
+        return _read_stream_page(GLOBAL_ACTIVITY_STREAM, limit, start, before)
     except Exception as e:
         logger.error(f"Error getting global activity logs: {str(e)}")
         return []
 
-def get_room_logs(room_name, limit=50, start=0):
+def get_room_logs(room_name, limit=50, start=0, before=None):
     """
     Get activity logs for a specific room from Redis.
     
@@ -188,39 +406,14 @@ def get_room_logs(room_name, limit=50, start=0):
         room_name: The room to get logs for
         limit: Maximum number of logs to return
         start: Starting index for pagination
+        before: log_id of the last entry of the previous page; reads the next page by
+            stream id instead of by offset (start is ignored)
     
     Returns:
         list: List of activity log entries as dictionaries
     """
     try:
-        global_log_key = f"global_logs{redis_version}"
-        
-        # Get all logs from sorted set (newest first)
-        all_log_entries = redis_client.zrevrange(global_log_key, 0, -1)
-        
-        # Filter logs for the specific room
-        room_logs = []
-        for entry in all_log_entries:
-            log_data = json.loads(entry.decode('utf-8'))
-            if log_data.get('room_name') == room_name:
-                # Format timestamp for frontend display
-                if 'timestamp' in log_data:
-                    try:
-                        # Parse ISO format timestamp and convert to a more readable format
-                        dt = datetime.fromisoformat(log_data['timestamp'])
-                        log_data['timestamp'] = dt.strftime('%Y-%m-%d %H:%M:%S')
-                    except Exception as e:
-                        logger.error(f"Error formatting timestamp: {str(e)}")
-                        # Keep original timestamp if parsing fails
-                
-                room_logs.append(log_data)
-                
-                # Break if we've reached the limit
-                if len(room_logs) >= start + limit:
-                    break
-                    
-        # Apply pagination
-        return room_logs[start:start+limit]
+        return _read_stream_page(_room_stream_key(room_name), limit, start, before)
     except Exception as e:
         logger.error(f"Error getting room activity logs: {str(e)}")
         return []
@@ -238,18 +431,17 @@ def clear_user_logs(username=None):
     try:
         if username:
             # Clear logs for a specific user
-            user_log_key = f"user_logs{redis_version}:{username}"
-            redis_client.delete(user_log_key)
+            redis_client.delete(_user_stream_key(username))
             logger.info(f"Cleared logs for user {username}")
         else:
-            # Clear all user logs
-            user_log_keys = redis_client.keys(f"user_logs{redis_version}:*")
-            if user_log_keys:
-                redis_client.delete(*user_log_keys)
+            # Clear all user and room streams
+            for pattern in (f"user_activity_stream{redis_version}:*", f"room_activity_stream{redis_version}:*"):
+                stream_keys = list(redis_client.scan_iter(match=pattern, count=500))
+                if stream_keys:
+                    redis_client.delete(*stream_keys)
             
-            # Clear global logs
-            global_log_key = f"global_logs{redis_version}"
-            redis_client.delete(global_log_key)
+            # Clear the global stream
+            redis_client.delete(GLOBAL_ACTIVITY_STREAM)
             
             logger.info("Cleared all user logs")
         
@@ -258,9 +450,147 @@ def clear_user_logs(username=None):
         logger.error(f"Error clearing user logs: {str(e)}")
         return False
 
+# ======= consumer groups
+# Downstream aggregation jobs read the global stream through a consumer group, so each
+# activity is processed once per group even with several workers.
+
+def ensure_activity_consumer_group(group_name, start_id='0'):
+    """
+    Create a consumer group on the global activity stream if it does not exist.
+    
+    Args:
+        group_name: Name of the consumer group
+        start_id: Stream id the group starts reading after ('0' for all history, '$' for new entries only)
+    """
+    try:
+        redis_client.xgroup_create(GLOBAL_ACTIVITY_STREAM, group_name, id=start_id, mkstream=True)
+        logger.info(f"Created activity consumer group {group_name}")
+    except ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+def read_activity_batch(group_name, consumer_name, count=100, block_ms=None):
+    """
+    Read new activities for a consumer in a group.
+    
+    Args:
+        group_name: Name of the consumer group
+        consumer_name: Name of this consumer within the group
+        count: Maximum number of activities to read
+        block_ms: Milliseconds to wait for new activities (None returns immediately)
+    
+    Returns:
+        list: (entry_id, activity dict) pairs; acknowledge them with ack_activities
+    """
+    response = redis_client.xreadgroup(group_name, consumer_name, {GLOBAL_ACTIVITY_STREAM: '>'},
+                                       count=count, block=block_ms)
+    batch = []
+    for _, entries in response or []:
+        for entry_id, fields in entries:
+            batch.append((entry_id, json.loads(fields[b'entry'].decode('utf-8'))))
+    return batch
+
+def ack_activities(group_name, entry_ids):
+    """Acknowledge processed activities so they leave the group's pending list."""
+    if entry_ids:
+        redis_client.xack(GLOBAL_ACTIVITY_STREAM, group_name, *entry_ids)
+
 # Note: The update_song_play_count function has been removed as its functionality
 # has been integrated into the increment_song_play_count function in redis_api.py
 
+# ======= exports
+# Exports walk the global stream and the feature indexes in fixed-size chunks through
+# generators, so callers can stream rows without holding the whole history in memory.
+
+EXPORT_BATCH_SIZE = 1000
+
+SONG_INTERACTION_FIELDS = ['user_id', 'song_id', 'action', 'timestamp', 'song_title', 'artist', 'room_id']
+ROOM_INTERACTION_FIELDS = ['user_id', 'room_id', 'action', 'timestamp']
+SONG_FEATURE_FIELDS = ['song_id', 'title', 'artist', 'play_count', 'favorite_count', 'add_count',
+                       'remove_count', 'unique_users', 'rooms', 'room_count']
+ROOM_FEATURE_FIELDS = ['room_id', 'join_count', 'favorite_count', 'create_count', 'users', 'user_count']
+
+def _display_timestamp(timestamp):
+    try:
+        # Parse ISO format timestamp and convert to a more readable format
+        return datetime.fromisoformat(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+    except Exception as e:
+        logger.error(f"Error formatting timestamp: {str(e)}")
+        # Keep original timestamp if parsing fails
+        return timestamp
+
+def iter_activity_logs(batch_size=EXPORT_BATCH_SIZE, max_logs=None):
+    """
+    Yield activities from the global stream, newest first, reading batch_size entries per round trip.
+    
+    Args:
+        batch_size: Number of stream entries read per round trip (at least 2)
+        max_logs: Stop after this many activities (None reads the whole stream)
+    """
+    max_id = '+'
+    yielded = 0
+    while max_logs is None or yielded < max_logs:
+        entries = redis_client.xrevrange(GLOBAL_ACTIVITY_STREAM, max=max_id, count=batch_size)
+        if max_id != '+':
+            entries = entries[1:]  # the range includes the last entry of the previous batch
+        if not entries:
+            return
+        for _, fields in entries:
+            try:
+                yield json.loads(fields[b'entry'].decode('utf-8'))
+            except Exception as e:
+                logger.warning(f"Error processing log entry: {str(e)}")
+                continue
+            yielded += 1
+            if max_logs is not None and yielded >= max_logs:
+                return
+        max_id = entries[-1][0]
+
+def _song_interaction(log_data, display_timestamps=True):
+    # Only include song-related actions with song_id
+    if log_data.get('action') not in SONG_FEATURE_ACTIONS or 'song_id' not in log_data:
+        return None
+    interaction = {
+        'user_id': log_data.get('username'),
+        'song_id': log_data.get('song_id'),
+        'action': log_data.get('action'),
+        'timestamp': _display_timestamp(log_data.get('timestamp')) if display_timestamps else log_data.get('timestamp')
+    }
+    # Add additional fields if available
+    if 'details' in log_data and isinstance(log_data['details'], dict):
+        if 'title' in log_data['details']:
+            interaction['song_title'] = log_data['details']['title']
+        if 'artist' in log_data['details']:
+            interaction['artist'] = log_data['details']['artist']
+    if 'room_name' in log_data:
+        interaction['room_id'] = log_data['room_name']
+    return interaction
+
+def _room_interaction(log_data, display_timestamps=True):
+    # Only include room-related actions with room_name
+    if log_data.get('action') not in ROOM_FEATURE_ACTIONS or 'room_name' not in log_data:
+        return None
+    return {
+        'user_id': log_data.get('username'),
+        'room_id': log_data.get('room_name'),
+        'action': log_data.get('action'),
+        'timestamp': _display_timestamp(log_data.get('timestamp')) if display_timestamps else log_data.get('timestamp')
+    }
+
+def iter_song_interactions(batch_size=EXPORT_BATCH_SIZE, max_logs=None, display_timestamps=True):
+    """Yield user-song interactions from the activity stream, newest first (raw ISO timestamps when display_timestamps is False)."""
+    for log_data in iter_activity_logs(batch_size, max_logs):
+        interaction = _song_interaction(log_data, display_timestamps)
+        if interaction:
+            yield interaction
+
+def iter_room_interactions(batch_size=EXPORT_BATCH_SIZE, max_logs=None, display_timestamps=True):
+    """Yield user-room interactions from the activity stream, newest first (raw ISO timestamps when display_timestamps is False)."""
+    for log_data in iter_activity_logs(batch_size, max_logs):
+        interaction = _room_interaction(log_data, display_timestamps)
+        if interaction:
+            yield interaction
+
 def export_user_song_interactions(limit=10000):
     """
     Export user-song interactions in a format suitable for recommendation systems.
@@ -269,61 +599,7 @@ def export_user_song_interactions(limit=10000):
         list: List of dictionaries with user-song interaction data
     """
     try:
-        global_log_key = f"global_logs{redis_version}"
-        
-        # Get all logs from sorted set (newest first)
-        all_log_entries = redis_client.zrevrange(global_log_key, 0, limit)
-        
-        # Parse JSON entries and filter for song-related actions
-        song_interactions = []
-        song_related_actions = [
-            "play_song", "pause_song", "favorite_song", 
-            "add_song", "remove_song"
-        ]
-        
-        for entry in all_log_entries:
-            try:
-                log_data = json.loads(entry.decode('utf-8'))
-                
-                # Only include song-related actions with song_id
-                if log_data.get('action') in song_related_actions:
-                    # Skip if no song_id
-                    if 'song_id' not in log_data:
-                        continue
-                        
-                    # Create interaction entry
-                    interaction = {
-                        'user_id': log_data.get('username'),
-                        'song_id': log_data.get('song_id'),
-                        'action': log_data.get('action'),
-                        'timestamp': log_data.get('timestamp')
-                    }
-                    
-                    # Format timestamp for frontend display
-                    if 'timestamp' in interaction:
-                        try:
-                            # Parse ISO format timestamp and convert to a more readable format
-                            dt = datetime.fromisoformat(interaction['timestamp'])
-                            interaction['timestamp'] = dt.strftime('%Y-%m-%d %H:%M:%S')
-                        except Exception as e:
-                            logger.error(f"Error formatting timestamp: {str(e)}")
-                            # Keep original timestamp if parsing fails
-                    
-                    # Add additional fields if available
-                    if 'details' in log_data and isinstance(log_data['details'], dict):
-                        if 'title' in log_data['details']:
-                            interaction['song_title'] = log_data['details']['title']
-                        if 'artist' in log_data['details']:
-                            interaction['artist'] = log_data['details']['artist']
-                    
-                    if 'room_name' in log_data:
-                        interaction['room_id'] = log_data['room_name']
-                        
-                    song_interactions.append(interaction)
-            except Exception as e:
-                logger.warning(f"Error processing log entry: {str(e)}")
-                continue
-        
+        song_interactions = list(iter_song_interactions(max_logs=limit))
         logger.info(f"Exported {len(song_interactions)} song interactions")
         return song_interactions
     except Exception as e:
@@ -338,181 +614,83 @@ def export_user_room_interactions(limit=10000):
         list: List of dictionaries with user-room interaction data
     """
     try:
-        global_log_key = f"global_logs{redis_version}"
-        
-        # Get all logs from sorted set (newest first)
-        all_log_entries = redis_client.zrevrange(global_log_key, 0, limit)
-        
-        # Parse JSON entries and filter for room-related actions
-        room_interactions = []
-        room_related_actions = [
-            "create_room", "join_room", "leave_room", 
-            "favorite_room", "unfavorite_room"
-        ]
-        
-        for entry in all_log_entries:
-            try:
-                log_data = json.loads(entry.decode('utf-8'))
-                
-                # Only include room-related actions with room_name
-                if log_data.get('action') in room_related_actions:
-                    # Skip if no room_name
-                    if 'room_name' not in log_data:
-                        continue
-                        
-                    # Create interaction entry
-                    interaction = {
-                        'user_id': log_data.get('username'),
-                        'room_id': log_data.get('room_name'),
-                        'action': log_data.get('action'),
-                        'timestamp': log_data.get('timestamp')
-                    }
-                    
-                    # Format timestamp for frontend display
-                    if 'timestamp' in interaction:
-                        try:
-                            # Parse ISO format timestamp and convert to a more readable format
-                            dt = datetime.fromisoformat(interaction['timestamp'])
-                            interaction['timestamp'] = dt.strftime('%Y-%m-%d %H:%M:%S')
-                        except Exception as e:
-                            logger.error(f"Error formatting timestamp: {str(e)}")
-                            # Keep original timestamp if parsing fails
-                    
-                    room_interactions.append(interaction)
-            except Exception as e:
-                logger.warning(f"Error processing log entry: {str(e)}")
-                continue
-        
+        room_interactions = list(iter_room_interactions(max_logs=limit))
         logger.info(f"Exported {len(room_interactions)} room interactions")
         return room_interactions
     except Exception as e:
         logger.error(f"Error exporting room interactions: {str(e)}")
         return []
 
+def _iter_index_chunks(index_key, batch_size):
+    chunk = []
+    for member in redis_client.sscan_iter(index_key, count=batch_size):
+        chunk.append(member.decode('utf-8'))
+        if len(chunk) >= batch_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_song_features(batch_size=EXPORT_BATCH_SIZE):
+    """Yield song feature rows, reading the counters of batch_size songs per pipeline."""
+    for song_ids in _iter_index_chunks(SONG_FEATURES_INDEX_KEY, batch_size):
+        pipe = redis_client.pipeline(transaction=False)
+        for song_id in song_ids:
+            pipe.hgetall(_song_features_key(song_id))
+            pipe.smembers(_song_rooms_key(song_id))
+            pipe.pfcount(_song_users_key(song_id))
+            pipe.zscore("song:play_counts", song_id)
+        results = pipe.execute()
+        
+        for i, song_id in enumerate(song_ids):
+            song_data, rooms, unique_users, play_count = results[i * 4:i * 4 + 4]
+            song_data = {key.decode('utf-8'): value.decode('utf-8') for key, value in song_data.items()}
+            rooms = sorted(room.decode('utf-8') for room in rooms)
+            yield {
+                'song_id': song_id,
+                'title': song_data.get('title', ''),
+                'artist': song_data.get('artist', ''),
+                'play_count': int(play_count or 0),
+                'favorite_count': int(song_data.get('favorite_count', 0)),
+                'add_count': int(song_data.get('add_count', 0)),
+                'remove_count': int(song_data.get('remove_count', 0)),
+                'unique_users': unique_users,
+                'rooms': rooms,
+                'room_count': len(rooms)
+            }
+
+def iter_room_features(batch_size=EXPORT_BATCH_SIZE):
+    """Yield room feature rows, reading the counters of batch_size rooms per pipeline."""
+    for room_ids in _iter_index_chunks(ROOM_FEATURES_INDEX_KEY, batch_size):
+        pipe = redis_client.pipeline(transaction=False)
+        for room_id in room_ids:
+            pipe.hgetall(_room_features_key(room_id))
+            pipe.smembers(_room_users_key(room_id))
+        results = pipe.execute()
+        
+        for i, room_id in enumerate(room_ids):
+            counters, users = results[i * 2:i * 2 + 2]
+            counters = {key.decode('utf-8'): int(value) for key, value in counters.items()}
+            users = sorted(user.decode('utf-8') for user in users)
+            yield {
+                'room_id': room_id,
+                'join_count': counters.get('join_count', 0),
+                'favorite_count': counters.get('favorite_count', 0),
+                'create_count': counters.get('create_count', 0),
+                'users': users,
+                'user_count': len(users)
+            }
+
 def export_song_features():
     """
-    Export song features by aggregating data from user logs.
+    Export song features from the counters kept up to date at log time.
     
     Returns:
         list: List of dictionaries with song features
     """
     try:
-        # Get all song interactions
-        song_interactions = export_user_song_interactions()
-        
-        # Extract unique songs and their features
-        song_features = {}
-        
-        for interaction in song_interactions:
-            song_id = interaction.get('song_id')
-            if not song_id:
-                continue
-                
-            # Initialize song features if not already present
-            if song_id not in song_features:
-                song_features[song_id] = {
-                    'song_id': song_id,
-                    'title': interaction.get('song_title', ''),
-                    'artist': interaction.get('artist', ''),
-                    'play_count': 0,
-                    'favorite_count': 0,
-                    'add_count': 0,
-                    'remove_count': 0,
-                    'rooms': set()
-                }
-            
-            # Update feature counts based on action
-            action = interaction.get('action')
-            if action == 'play_song':
-                song_features[song_id]['play_count'] += 1
-            elif action == 'favorite_song':
-                song_features[song_id]['favorite_count'] += 1
-            elif action == 'add_song':
-                song_features[song_id]['add_count'] += 1
-            elif action == 'remove_song':
-                song_features[song_id]['remove_count'] += 1
-                
-            # Add room to the set of rooms this song appears in
-            if interaction.get('room_id'):
-                song_features[song_id]['rooms'].add(interaction.get('room_id'))
-        
-        # Check for songs in Redis that might not be in the user logs
-        # Get the top played songs from Redis
-        try:
-            # First, get all song_features keys from Redis
-            song_feature_keys = redis_client.keys("song_features:*")
-            for key in song_feature_keys:
-                song_id = key.decode('utf-8').split(':')[1]
-                song_data = redis_client.hgetall(key)
-                
-                # If we have song data, use it
-                if song_data:
-                    title = song_data.get(b'title', b'Unknown').decode('utf-8') if b'title' in song_data else 'Unknown'
-                    artist = song_data.get(b'artist', b'Unknown').decode('utf-8') if b'artist' in song_data else 'Unknown'
-                    play_count = int(song_data.get(b'play_count', b'0').decode('utf-8')) if b'play_count' in song_data else 0
-                    
-                    # If the song is not in our features yet, add it
-                    if song_id not in song_features:
-                        song_features[song_id] = {
-                            'song_id': song_id,
-                            'title': title,
-                            'artist': artist,
-                            'play_count': play_count,
-                            'favorite_count': 0,
-                            'add_count': 0,
-                            'remove_count': 0,
-                            'rooms': set()
-                        }
-                    else:
-                        # Update the play count with the Redis value (which is more accurate)
-                        song_features[song_id]['play_count'] = play_count
-                        
-                        # Update title and artist if they're empty in our features
-                        if not song_features[song_id]['title'] and title != 'Unknown':
-                            song_features[song_id]['title'] = title
-                        if not song_features[song_id]['artist'] and artist != 'Unknown':
-                            song_features[song_id]['artist'] = artist
-            
-            # Also check the play counts sorted set
-            top_songs = redis_client.zrevrange("song:play_counts", 0, -1, withscores=True)
-            for song_data in top_songs:
-                song_id = song_data[0].decode('utf-8')
-                play_count = int(song_data[1])
-                
-                # If the song is in our features, update the play count
-                if song_id in song_features:
-                    song_features[song_id]['play_count'] = play_count
-                # If not, try to find it in Redis
-                else:
-                    # Try to get song details from Redis song features
-                    song_features_key = f"song_features:{song_id}"
-                    if redis_client.exists(song_features_key):
-                        song_data = redis_client.hgetall(song_features_key)
-                        title = song_data.get(b'title', b'Unknown').decode('utf-8') if b'title' in song_data else 'Unknown'
-                        artist = song_data.get(b'artist', b'Unknown').decode('utf-8') if b'artist' in song_data else 'Unknown'
-                    else:
-                        title = "Unknown"
-                        artist = "Unknown"
-                    
-                    song_features[song_id] = {
-                        'song_id': song_id,
-                        'title': title,
-                        'artist': artist,
-                        'play_count': play_count,
-                        'favorite_count': 0,
-                        'add_count': 0,
-                        'remove_count': 0,
-                        'rooms': set()
-                    }
-        except Exception as e:
-            logger.error(f"Error getting song data from Redis: {str(e)}")
-        
-        # Convert sets to lists for JSON serialization
-        result = []
-        for song_id, features in song_features.items():
-            features['rooms'] = list(features['rooms'])
-            features['room_count'] = len(features['rooms'])
-            result.append(features)
+        # Read the current counters of every song
+        result = sorted(iter_song_features(), key=lambda features: features['song_id'])
             
         # If no data, return sample data
         if not result:
@@ -582,52 +760,14 @@ def export_song_features():
 
 def export_room_features():
     """
-    Export room features by aggregating data from user logs.
+    Export room features from the counters kept up to date at log time.
     
     Returns:
         list: List of dictionaries with room features
     """
     try:
-        # Get all room interactions
-        room_interactions = export_user_room_interactions()
-        
-        # Extract unique rooms and their features
-        room_features = {}
-        
-        for interaction in room_interactions:
-            room_id = interaction.get('room_id')
-            if not room_id:
-                continue
-                
-            # Initialize room features if not already present
-            if room_id not in room_features:
-                room_features[room_id] = {
-                    'room_id': room_id,
-                    'join_count': 0,
-                    'favorite_count': 0,
-                    'create_count': 0,
-                    'users': set()
-                }
-            
-            # Update feature counts based on action
-            action = interaction.get('action')
-            if action == 'join_room':
-                room_features[room_id]['join_count'] += 1
-            elif action == 'favorite_room':
-                room_features[room_id]['favorite_count'] += 1
-            elif action == 'create_room':
-                room_features[room_id]['create_count'] += 1
-                
-            # Add user to the set of users who interacted with this room
-            if interaction.get('user_id'):
-                room_features[room_id]['users'].add(interaction.get('user_id'))
-        
-        # Convert sets to lists for JSON serialization
-        result = []
-        for room_id, features in room_features.items():
-            features['users'] = list(features['users'])
-            features['user_count'] = len(features['users'])
-            result.append(features)
+        # Read the current counters of every room
+        result = sorted(iter_room_features(), key=lambda features: features['room_id'])
             
         # If no data, return an empty list
         if not result:
@@ -648,18 +788,130 @@ def export_room_features():
         logger.error(f"Error exporting room features: {str(e)}")
         return []
 
+# Rows per Arrow record batch when writing columnar exports
+PARQUET_BATCH_ROWS = int(os.environ.get('PARQUET_BATCH_ROWS', 50000))
+
+def _epoch_millis(timestamp):
+    try:
+        return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+    except Exception:
+        return None
+
+def _iter_interaction_columns(interactions, fields, batch_rows):
+    """Group interaction rows into column dicts of batch_rows rows with epoch timestamps and a date column."""
+    columns = {field: [] for field in fields + ['timestamp', 'date']}
+    for interaction in interactions:
+        timestamp = _epoch_millis(interaction.get('timestamp'))
+        if timestamp is None:
+            continue
+        for field in fields:
+            columns[field].append(interaction.get(field))
+        columns['timestamp'].append(timestamp)
+        columns['date'].append(datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d'))
+        if len(columns['timestamp']) >= batch_rows:
+            yield columns
+            columns = {field: [] for field in columns}
+    if columns['timestamp']:
+        yield columns
+
+def write_parquet_interactions(interactions, fields, path, partition_by_date=True, batch_rows=PARQUET_BATCH_ROWS):
+    """
+    Write interactions as a Parquet dataset with dictionary-encoded string columns.
+    
+    Rows are converted to Arrow record batches of batch_rows rows, so the full interaction
+    list is never materialised. With partition_by_date the dataset is hive partitioned as
+    path/date=YYYY-MM-DD/, and training jobs can read only recent days with e.g.
+    pyarrow.dataset.dataset(path, partitioning='hive').to_table(filter=ds.field('date') >= '2025-03-01').
+    
+    Args:
+        interactions: Iterable of interaction dicts with raw ISO timestamps
+            (see iter_song_interactions with display_timestamps=False)
+        fields: String columns to keep, e.g. ['user_id', 'song_id', 'action', 'room_id']
+        path: Output directory of the dataset
+        partition_by_date: Partition files by the day of the interaction
+        batch_rows: Rows per record batch
+    
+    Returns:
+        int: Number of rows written
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    
+    string_type = pa.dictionary(pa.int32(), pa.string())
+    schema = pa.schema([(field, string_type) for field in fields] +
+                       [('timestamp', pa.int64()), ('date', pa.string())])
+    rows_written = 0
+    
+    def batches():
+        nonlocal rows_written
+        for columns in _iter_interaction_columns(interactions, fields, batch_rows):
+            arrays = [pa.array(columns[field], type=pa.string()).dictionary_encode() for field in fields]
+            arrays.append(pa.array(columns['timestamp'], type=pa.int64()))
+            arrays.append(pa.array(columns['date'], type=pa.string()))
+            rows_written += len(columns['timestamp'])
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+    
+    ds.write_dataset(
+        batches(),
+        path,
+        schema=schema,
+        format='parquet',
+        partitioning=['date'] if partition_by_date else None,
+        partitioning_flavor='hive' if partition_by_date else None,
+        existing_data_behavior='delete_matching'
+    )
+    return rows_written
+
+def export_parquet_dataset(output_dir, partition_by_date=True):
+    """
+    Export the recommendation dataset in Parquet for the training pipeline.
+    
+    Interactions are read straight from the activity stream and written as partitioned
+    datasets; song and room features are written as one file each.
+    
+    Args:
+        output_dir: Directory to write song_interactions/, room_interactions/ and the feature files
+        partition_by_date: Partition the interaction datasets by date
+    
+    Returns:
+        dict: Number of rows written per dataset
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {
+        'song_interactions': write_parquet_interactions(
+            iter_song_interactions(display_timestamps=False), ['user_id', 'song_id', 'action', 'room_id'],
+            os.path.join(output_dir, 'song_interactions'), partition_by_date),
+        'room_interactions': write_parquet_interactions(
+            iter_room_interactions(display_timestamps=False), ['user_id', 'room_id', 'action'],
+            os.path.join(output_dir, 'room_interactions'), partition_by_date),
+    }
+    for name, features in (('song_features', iter_song_features()), ('room_features', iter_room_features())):
+        table = pa.Table.from_pylist(list(features))
+        pq.write_table(table, os.path.join(output_dir, f"{name}.parquet"))
+        counts[name] = table.num_rows
+    logger.info(f"Exported Parquet dataset to {output_dir}: {counts}")
+    return counts
+
 def export_recommendation_dataset(format='csv', output_dir=None):
     """
     Export a complete dataset for training recommendation systems.
     
     Args:
-        format: Output format ('csv' or 'json')
+        format: Output format ('csv', 'json' or 'parquet'; parquet requires output_dir)
         output_dir: Directory to save files (if None, returns data without saving)
     
     Returns:
-        dict: Dictionary containing all datasets
+        dict: Dictionary containing all datasets (row counts per dataset for parquet)
     """
     try:
+        if format == 'parquet':
+            if not output_dir:
+                raise ValueError("Parquet export requires output_dir")
+            return export_parquet_dataset(output_dir)
+        
         # Get all interaction data
         song_interactions = export_user_song_interactions()
         room_interactions = export_user_room_interactions()
@@ -1,12 +1,203 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
 from ytmusicapi import YTMusic
 
-# Initialize YTMusic API
-ytmusic = YTMusic()
+from util.redis_pool import get_redis_client
 
-def get_song_info(song_name, artist_name=None):
+logger = logging.getLogger(__name__)
+
+# Client-side limits for outgoing YouTube Music traffic, shared by every room
+YTMUSIC_RATE_LIMIT = float(os.environ.get('YTMUSIC_RATE_LIMIT', 10))  # requests per second
+YTMUSIC_BURST = int(os.environ.get('YTMUSIC_BURST', 20))
+YTMUSIC_MAX_RETRIES = int(os.environ.get('YTMUSIC_MAX_RETRIES', 3))
+YTMUSIC_BACKOFF_SECONDS = float(os.environ.get('YTMUSIC_BACKOFF_SECONDS', 0.5))
+YTMUSIC_POOL_SIZE = int(os.environ.get('YTMUSIC_POOL_SIZE', 32))
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class YTMusicClient:
+    """
+    Process-wide YTMusic wrapper. All calls share one keep-alive HTTP session,
+    pass through a token-bucket rate limiter and are retried with exponential backoff.
+    """
+
+    def __init__(self, rate=YTMUSIC_RATE_LIMIT, burst=YTMUSIC_BURST, max_retries=YTMUSIC_MAX_RETRIES,
+                 backoff=YTMUSIC_BACKOFF_SECONDS, pool_size=YTMUSIC_POOL_SIZE):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._bucket = TokenBucket(rate, burst)
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        self._ytmusic = YTMusic(requests_session=session)
+
+    def _call(self, method, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self._bucket.acquire()
+            try:
+                return getattr(self._ytmusic, method)(*args, **kwargs)
+            except (KeyError, TypeError, ValueError):
+                # Parsing errors will not go away on retry
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                logger.warning(f"YTMusic {method} failed ({str(e)}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    def search(self, *args, **kwargs):
+        return self._call('search', *args, **kwargs)
+
+    def get_song(self, *args, **kwargs):
+        return self._call('get_song', *args, **kwargs)
+
+    def get_artist(self, *args, **kwargs):
+        return self._call('get_artist', *args, **kwargs)
+
+    def get_playlist(self, *args, **kwargs):
+        return self._call('get_playlist', *args, **kwargs)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_ytmusic_client():
+    """Return the shared YTMusicClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = YTMusicClient()
+    return _client
+
+# Connect to Redis for caching song resolutions
+redis_client = get_redis_client()
+redis_version = '_v1'
+
+# Resolved songs rarely change, so keep them for 30 days
+SONG_CACHE_EXPIRATION = 60 * 60 * 24 * 30
+# "Not found" results are cached for a shorter time in case the catalog catches up
+SONG_NEGATIVE_CACHE_EXPIRATION = 60 * 60 * 24
+# Hash holding hit/miss counters for the resolution cache
+SONG_CACHE_STATS_KEY = f"song_resolution_stats{redis_version}"
+
+# Upper bound on concurrent YouTube Music lookups when resolving a batch of songs
+RESOLVE_MAX_WORKERS = 8
+
+# High-resolution artwork and duration fetched via get_song, cached per song_id
+SONG_DETAILS_CACHE_EXPIRATION = 60 * 60 * 24 * 30
+# Background pool that fills the song details cache after a search has returned
+SONG_DETAILS_MAX_WORKERS = 4
+_details_pool = ThreadPoolExecutor(max_workers=SONG_DETAILS_MAX_WORKERS)
+
+def _normalize_query_part(text):
+    """Lowercase, trim and collapse whitespace so equivalent queries share a cache entry."""
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def create_song_cache_key(song_name, artist_name=None):
+    """Create a standardized cache key for a title/artist resolution"""
+    return f"song_resolution{redis_version}:{_normalize_query_part(song_name)}:{_normalize_query_part(artist_name)}"
+
+
+def _record_cache_stat(field):
+    try:
+        redis_client.hincrby(SONG_CACHE_STATS_KEY, field, 1)
+    except Exception as e:
+        logger.warning(f"Failed to update song cache stats: {str(e)}")
+
+
+def get_song_cache_stats():
+    """
+    Return hit/miss counters for the song resolution cache.
+
+    :return: dict with 'hits', 'negative_hits', 'misses' and 'hit_rate'
+    """
+    try:
+        raw = redis_client.hgetall(SONG_CACHE_STATS_KEY)
+    except Exception as e:
+        logger.error(f"Failed to read song cache stats: {str(e)}")
+        raw = {}
+    stats = {field: int(raw.get(field.encode(), 0)) for field in ("hits", "negative_hits", "misses")}
+    lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["hits"] + stats["negative_hits"]) / lookups if lookups else 0.0
+    return stats
+
+
+def get_song_info(song_name, artist_name=None, use_cache=True):
     """
     Search for a song on YouTube Music and return its playable URL and cover image URL.
     Optionally, input an artist name to improve search accuracy.
+    Results, including "not found" results, are cached in Redis keyed by the normalized title/artist.
+
+    :param song_name: str, name of the song to search
+    :param artist_name: str, (optional) name of the artist to refine search
+    :param use_cache: bool, whether to read and populate the Redis resolution cache
+    :return: dict with 'song_url', 'cover_img_url', 'song_id', or an error message if no song is found
+    """
+    if not use_cache:
+        return search_song_info(song_name, artist_name)
+
+    cache_key = create_song_cache_key(song_name, artist_name)
+    try:
+        cached = redis_client.get(cache_key)
+    except Exception as e:
+        logger.warning(f"Song cache unavailable for '{song_name}': {str(e)}")
+        return search_song_info(song_name, artist_name)
+
+    if cached:
+        song_info = json.loads(cached.decode('utf-8'))
+        _record_cache_stat("negative_hits" if "error" in song_info else "hits")
+        return song_info
+
+    _record_cache_stat("misses")
+    song_info = search_song_info(song_name, artist_name)
+    expiration = SONG_NEGATIVE_CACHE_EXPIRATION if "error" in song_info else SONG_CACHE_EXPIRATION
+    try:
+        redis_client.setex(cache_key, expiration, json.dumps(song_info))
+    except Exception as e:
+        logger.warning(f"Failed to cache song resolution for '{song_name}': {str(e)}")
+    return song_info
+
+
+def search_song_info(song_name, artist_name=None):
+    """
+    Search YouTube Music for a song without consulting the resolution cache.
 
     :param song_name: str, name of the song to search
     :param artist_name: str, (optional) name of the artist to refine search
@@ -17,7 +208,7 @@ def get_song_info(song_name, artist_name=None):
     query = f"{song_name} {artist_name}" if artist_name else song_name
 
     # Search for the song
-    results = ytmusic.search(query, filter="songs")
+    results = get_ytmusic_client().search(query, filter="songs")
     if not results:
         return {"error": "No songs found."}
 
@@ -58,7 +249,39 @@ def get_song_info(song_name, artist_name=None):
     }
 
 
-from ytmusicapi import YTMusic
+def resolve_songs(titles, artists=None, max_workers=RESOLVE_MAX_WORKERS):
+    """
+    Resolve a batch of song titles to YouTube Music song info concurrently.
+    Lookups run on a bounded worker pool, so the batch takes roughly as long
+    as the slowest single lookup instead of the sum of all of them.
+
+    :param titles: list of str, song names to resolve
+    :param artists: list of str, (optional) artist names aligned with titles
+    :param max_workers: int, maximum number of lookups in flight at once
+    :return: list of dicts in the same order as titles; each entry is the result of
+             get_song_info, or a dict with 'error', 'title' and 'artist' if the lookup failed
+    """
+    titles = list(titles)
+    artists = list(artists) if artists is not None else [None] * len(titles)
+    if not titles:
+        return []
+
+    def resolve_one(pair):
+        title, artist = pair
+        try:
+            song_info = get_song_info(song_name=title, artist_name=artist)
+        except Exception as e:
+            logger.warning(f"Failed to resolve '{title}' by '{artist}': {str(e)}")
+            return {"error": str(e), "title": title, "artist": artist}
+        if "error" in song_info:
+            logger.info(f"No match for '{title}' by '{artist}': {song_info['error']}")
+            return {"error": song_info["error"], "title": title, "artist": artist}
+        return song_info
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(titles)))) as pool:
+        # map() yields results in submission order, preserving the input ordering
+        return list(pool.map(resolve_one, zip(titles, artists)))
+
 
 def search_artist_tracks(artist_name, max_results=10):
     """
@@ -68,7 +291,7 @@ def search_artist_tracks(artist_name, max_results=10):
     :param max_results: int, number of songs to return (default: 10)
     :return: list of dicts containing song info (song_id, song_url, cover_img_url, title, artist, album)
     """
-    ytmusic = YTMusic()
+    ytmusic = get_ytmusic_client()
 
     # Search for the artist
     search_results = ytmusic.search(artist_name, filter="artists")
@@ -111,45 +334,109 @@ def search_artist_tracks(artist_name, max_results=10):
 
 
 
-def search_song_tracks(song_name, max_results=10):
+def create_song_details_key(song_id):
+    """Create the cache key holding high-resolution artwork and duration for a song"""
+    return f"song_details{redis_version}:{song_id}"
+
+
+def get_cached_song_details(song_ids):
+    """
+    Read cached high-resolution artwork/duration for several songs in one round trip.
+
+    :param song_ids: list of str, YouTube video IDs
+    :return: dict mapping song_id to {'cover_img_url', 'duration_seconds'} for cached songs only
+    """
+    song_ids = [song_id for song_id in song_ids if song_id]
+    if not song_ids:
+        return {}
+    try:
+        values = redis_client.mget([create_song_details_key(song_id) for song_id in song_ids])
+    except Exception as e:
+        logger.warning(f"Song details cache unavailable: {str(e)}")
+        return {}
+    return {
+        song_id: json.loads(value.decode('utf-8'))
+        for song_id, value in zip(song_ids, values) if value
+    }
+
+
+def fetch_song_details(song_ids):
+    """
+    Fetch high-resolution artwork and duration with get_song for songs missing from the
+    details cache, and store them for later searches.
+
+    :param song_ids: list of str, YouTube video IDs
+    :return: dict mapping song_id to {'cover_img_url', 'duration_seconds'}
+    """
+    details = get_cached_song_details(song_ids)
+    pipe = redis_client.pipeline(transaction=False)
+    for song_id in song_ids:
+        if not song_id or song_id in details:
+            continue
+        try:
+            video_details = get_ytmusic_client().get_song(song_id).get("videoDetails", {})
+        except Exception as e:
+            logger.warning(f"Failed to fetch details for song {song_id}: {str(e)}")
+            continue
+        thumbnails = video_details.get("thumbnail", {}).get("thumbnails", [])
+        song_details = {
+            "cover_img_url": thumbnails[-1]["url"] if thumbnails else "",
+            "duration_seconds": int(video_details.get("lengthSeconds") or 0),
+        }
+        details[song_id] = song_details
+        pipe.setex(create_song_details_key(song_id), SONG_DETAILS_CACHE_EXPIRATION, json.dumps(song_details))
+    try:
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to cache song details: {str(e)}")
+    return details
+
+
+def search_song_tracks(song_name, max_results=10, enrich_in_background=True):
     """
     Search for tracks related to a song name on YouTube Music and return a list of song details.
+    Results are built from the search response alone. High-resolution covers and durations
+    already in the details cache are merged in; missing ones are fetched in the background
+    so that later searches pick them up.
 
     :param song_name: str, name of the song to search
     :param max_results: int, number of songs to return (default: 10)
+    :param enrich_in_background: bool, whether to schedule a details fetch for uncached songs
     :return: list of dicts containing song info (song_id, song_url, cover_img_url, title, artist, album, duration_seconds)
     """
-    ytmusic = YTMusic()
+    ytmusic = get_ytmusic_client()
 
     # Search for the song
     search_results = ytmusic.search(song_name, filter="songs")
     if not search_results:
         return {"error": "No songs found."}
 
+    search_results = search_results[:max_results]  # Limit the number of results
+    song_ids = [song.get("videoId") for song in search_results if song.get("videoId")]
+    cached_details = get_cached_song_details(song_ids)
+
     # Extract song details
     song_list = []
-    for song in search_results[:max_results]:  # Limit the number of results
+    for song in search_results:
         song_id = song.get("videoId")
-
-        # Get full song details for high-resolution cover and duration
-        full_song_data = ytmusic.get_song(song_id) if song_id else {}
-
-        # Extract highest resolution cover image
-        thumbnails = full_song_data.get("videoDetails", {}).get("thumbnail", {}).get("thumbnails", [])
-        full_cover_url = thumbnails[-1]["url"] if thumbnails else song.get("thumbnails", [{}])[-1].get("url", "")
+        details = cached_details.get(song_id, {})
 
         song_info = {
             "song_id": song_id,
             "song_url": f"https://music.youtube.com/watch?v={song_id}" if song_id else None,
-            "cover_img_url": full_cover_url,
+            "cover_img_url": details.get("cover_img_url") or song.get("thumbnails", [{}])[-1].get("url", ""),
             "title": song.get("title"),
             "artist": ", ".join([a["name"] for a in song.get("artists", [])]),
-            "album": song.get("album", {}).get("name"),
-            "duration_seconds": full_song_data.get("videoDetails", {}).get("lengthSeconds", 0),
+            "album": (song.get("album") or {}).get("name"),
+            "duration_seconds": details.get("duration_seconds") or song.get("duration_seconds", 0),
         }
         song_list.append(song_info)
 
-    return song_list[:max_results]  # Limit results
+    missing_ids = [song_id for song_id in song_ids if song_id not in cached_details]
+    if enrich_in_background and missing_ids:
+        _details_pool.submit(fetch_song_details, missing_ids)
+
+    return song_list
 
 
 if __name__=='__main__':
@@ -306,7 +306,7 @@ const AdminDashboard = () => {
     }
   };
 
-  const downloadDataset = async (format = 'json') => {
+  const downloadDataset = async (format = 'csv') => {
     try {
       setLoading(true);
       setError(null);
@@ -317,9 +317,9 @@ const AdminDashboard = () => {
         return;
       }
       
-      // Create a download link
+      // Create a download link; the server streams the zip as it reads the logs
       const link = document.createElement('a');
-      link.href = `/api/user-activity/export/dataset?format=${format}&download=true`;
+      link.href = `/api/user-activity/export/dataset/stream?format=${format}`;
       link.setAttribute('download', `recommendation_data.zip`);
       
       // Use fetch with credentials
@@ -555,10 +555,10 @@ const AdminDashboard = () => {
         <Button 
           variant="contained" 
           color="primary" 
-          onClick={() => downloadDataset('json')}
+          onClick={() => downloadDataset('ndjson')}
           disabled={loading}
         >
-          Download Dataset (JSON)
+          Download Dataset (NDJSON)
         </Button>
         <Button 
           variant="contained" 
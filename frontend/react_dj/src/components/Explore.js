@@ -85,19 +85,20 @@ function Explore() {
     const [rooms, setRooms] = useState([]);
     const [loading, setLoading] = useState(false);
     const [hasMore, setHasMore] = useState(true);
-    const [page, setPage] = useState(1);
+    const [cursor, setCursor] = useState(null);
     const [allRoomsLoaded, setAllRoomsLoaded] = useState(false);
     const loader = useRef(null);
     const initialFetchDone = useRef(false);
     const PAGE_SIZE = 12;
   
-    const fetchRooms = async (pageNum) => {
+    const fetchRooms = async (pageCursor) => {
       if (loading || !hasMore) return;
   
       try {
         setLoading(true);
+        const cursorParam = pageCursor ? `&cursor=${encodeURIComponent(pageCursor)}` : '';
         const response = await fetch(
-          `${API_URL}/api/explore/rooms?page=${pageNum}&limit=${PAGE_SIZE}`
+          `${API_URL}/api/explore/rooms?limit=${PAGE_SIZE}${cursorParam}`
         );
   
         if (!response.ok) throw new Error('Failed to fetch rooms');
@@ -112,11 +113,11 @@ function Explore() {
   
         if (uniqueNewRooms.length > 0) {
           setRooms(prevRooms => [...prevRooms, ...uniqueNewRooms]);
-          setPage(pageNum + 1);
         }
+        setCursor(data.next_cursor);
   
         // Check if all rooms are loaded
-        if (newRooms.length < PAGE_SIZE || uniqueNewRooms.length === 0) {
+        if (!data.hasMore || uniqueNewRooms.length === 0) {
           setHasMore(false);
           setAllRoomsLoaded(true);
         }
@@ -132,14 +133,14 @@ function Explore() {
     const handleObserver = useCallback((entries) => {
       const target = entries[0];
       if (target.isIntersecting && hasMore && !loading) {
-        fetchRooms(page);
+        fetchRooms(cursor);
       }
-    }, [hasMore, loading, page]);
+    }, [hasMore, loading, cursor]);
   
     useEffect(() => {
       // Initial fetch only once
       if (!initialFetchDone.current) {
-        fetchRooms(1);
+        fetchRooms(null);
         initialFetchDone.current = true;
       }
     }, []);
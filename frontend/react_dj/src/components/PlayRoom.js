@@ -214,6 +214,14 @@ function PlayRoom() {
     fetchRoomSettings();
   }, [roomName, navigate, isHostParam, initialModeration]);
 
+  // Initialize socket connection
+  const { 
+    socket, 
+    connectionError, 
+    isConnected,
+    emitPlayerState 
+  } = useSocketConnection(roomName, isHost);
+
   // Get playlist data and management functions
   const { 
     playlist, 
@@ -225,6 +233,8 @@ function PlayRoom() {
     hostData, 
     loading, 
     error, 
+    deltaSync,
+    resyncPlaylist,
     handleTrackDelete, 
     handleApproveRequest, 
     handleRejectRequest, 
@@ -235,15 +245,7 @@ function PlayRoom() {
     updateAiModerationSettings,
     fetchAiModerationHints,
     fetchAiModerationHistory
-  } = usePlaylist(roomName, isHost);
-
-  // Initialize socket connection
-  const { 
-    socket, 
-    connectionError, 
-    isConnected,
-    emitPlayerState 
-  } = useSocketConnection(roomName, isHost);
+  } = usePlaylist(roomName, isHost, isConnected ? socket : null);
 
   // Set connected users from socket data
   useEffect(() => {
@@ -409,21 +411,16 @@ function PlayRoom() {
       const currentPosition = currentTime;
       const wasPlaying = isPlaying;
       
-      // Fetch the latest playlist from the backend
-      const response = await fetch(`${API_URL}/api/room-playlist?room_name=${encodeURIComponent(roomName)}`);
+      // Fetch the latest playlist through the hook so its version stays in step with deltas
+      const refreshedPlaylist = await resyncPlaylist();
       
-      if (!response.ok) {
+      if (!refreshedPlaylist) {
         throw new Error('Failed to refresh playlist');
       }
       
-      const data = await response.json();
-      
-      // Update the playlist state
-      setPlaylist(data.playlist);
-      
       // Find the current track in the new playlist
       if (currentSongId) {
-        const newIndex = data.playlist.findIndex(track => track.song_id === currentSongId);
+        const newIndex = refreshedPlaylist.findIndex(track => track.song_id === currentSongId);
         
         // If the current track still exists in the new playlist, update the player
         if (newIndex !== -1 && newIndex !== currentTrack) {
@@ -450,10 +447,10 @@ function PlayRoom() {
       // Convert page-relative index to absolute index in the full playlist
       const actualIndex = (currentPage - 1) * SONGS_PER_PAGE + selectedIndex;
       
-      // Pass the actual index to the backend
+      // Pass the actual index to the backend (the move arrives as a delta unless a playlist is returned)
       const newPlaylist = await handlePinToTop(actualIndex, currentPlayingIndex);
       if (newPlaylist) {
-        setPlaylist(newPlaylist);
+        if (Array.isArray(newPlaylist)) setPlaylist(newPlaylist);
         showNotificationMessage('Track Pinned', 'Track will play after the current song', 'success');
       }
       return;
@@ -467,7 +464,7 @@ function PlayRoom() {
       // Pass the actual index to the backend with guest flag
       const newPlaylist = await handlePinToTop(actualIndex, currentPlayingIndex, true);
       if (newPlaylist) {
-        setPlaylist(newPlaylist);
+        if (Array.isArray(newPlaylist)) setPlaylist(newPlaylist);
         showNotificationMessage('Track Pinned', 'Track will play after the current song', 'success');
       }
     }
@@ -874,6 +871,7 @@ function PlayRoom() {
                   roomName={roomName}
                   onTrackClick={handlePlaySpecificTrack}
                   onTrackDelete={handleTrackDelete}
+                  deltaSync={deltaSync}
                   onPinToTop={handlePinTrack}
                   stopProgressTracking={stopProgressTracking}
                   onAddMusicClick={handleSearchMusic}
@@ -14,6 +14,7 @@ const PlaylistTrack = ({
   roomName = '',
   onTrackClick = () => {},
   onTrackDelete = () => {},
+  deltaSync = false,
   onPinToTop = () => {},
   stopProgressTracking = () => {}
 }) => {
@@ -105,7 +106,8 @@ const PlaylistTrack = ({
         },
         body: JSON.stringify({
           room_name: roomName,
-          track_id: track.song_id
+          track_id: track.song_id,
+          return_playlist: !deltaSync // The removal arrives as a delta when the socket is connected
         })
       });
   
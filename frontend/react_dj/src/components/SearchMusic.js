@@ -159,6 +159,14 @@ function SearchMusic() {
         }),
       });
 
+      if (response.status === 409) {
+        setNotificationTitle('Already in Playlist');
+        setNotificationMessage('This track is already in the playlist.');
+        setNotificationType('info');
+        setShowNotification(true);
+        return;
+      }
+
       if (!response.ok) {
         throw new Error(`Failed to ${isHost ? 'add' : 'request'} track`);
       }
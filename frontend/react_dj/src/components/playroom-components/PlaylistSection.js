@@ -11,6 +11,7 @@ const PlaylistSection = ({
   roomName,
   onTrackClick,
   onTrackDelete,
+  deltaSync = false, // Playlist changes arrive as socket deltas
   onPinToTop,
   stopProgressTracking,
   onAddMusicClick,
@@ -74,6 +75,7 @@ const PlaylistSection = ({
               roomName={roomName}
               onTrackClick={() => onTrackClick(index)}
               onTrackDelete={onTrackDelete}
+              deltaSync={deltaSync}
               onPinToTop={onPinToTop} // Keep passing the same function, we'll adjust the index in PlayRoom.js
               stopProgressTracking={stopProgressTracking}
             />
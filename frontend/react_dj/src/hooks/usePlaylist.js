@@ -3,12 +3,72 @@ import { useState, useEffect, useRef, useCallback } from 'react';
 import debounce from 'lodash/debounce';
 import { API_URL } from '../config';
 
+// Key identifying a track inside a room playlist (matches playlist_track_key on the backend)
+const playlistTrackKey = (track) =>
+  track.song_id ? track.song_id : `${track.title || ''}:${track.artist || ''}`;
+
+/**
+ * Apply a playlist_delta event to a playlist. Every operation is idempotent, so a delta
+ * that is already reflected in the playlist leaves it unchanged.
+ * @param {Array} playlist - Current playlist
+ * @param {Object} delta - Delta with op insert/append/move/remove
+ * @returns {Array} The patched playlist
+ */
+export const applyPlaylistDelta = (playlist, delta) => {
+  switch (delta.op) {
+    case 'insert': {
+      const next = playlist.filter(track => playlistTrackKey(track) !== delta.track_key);
+      next.splice(Math.min(delta.index, next.length), 0, delta.track);
+      return next;
+    }
+    case 'append': {
+      const keys = new Set(playlist.map(playlistTrackKey));
+      return [...playlist, ...delta.tracks.filter(track => !keys.has(playlistTrackKey(track)))];
+    }
+    case 'move': {
+      const track = playlist.find(t => playlistTrackKey(t) === delta.track_key);
+      if (!track) return playlist;
+      const next = playlist.filter(t => t !== track);
+      next.splice(Math.min(delta.index, next.length), 0, track);
+      return next;
+    }
+    case 'remove':
+      return playlist.filter(track => playlistTrackKey(track) !== delta.track_key);
+    default:
+      return playlist;
+  }
+};
+
+/**
+ * Apply deltas in version order on top of a playlist at a known version.
+ * @param {Array} playlist - Playlist at the given version
+ * @param {number} version - Version the playlist reflects
+ * @param {Array} deltas - playlist_delta events, in any order
+ * @returns {{playlist: Array, version: number, complete: boolean}} complete is false when
+ *   a delta is missing (or is a reset), so the playlist has to be fetched again
+ */
+export const applyPlaylistDeltas = (playlist, version, deltas) => {
+  let next = playlist;
+  let nextVersion = version;
+  for (const delta of [...deltas].sort((a, b) => a.version - b.version)) {
+    if (delta.version <= nextVersion) continue;  // already reflected
+    if (delta.op === 'reset' || delta.version !== nextVersion + 1) {
+      return { playlist: next, version: nextVersion, complete: false };
+    }
+    nextVersion = delta.version;
+    next = applyPlaylistDelta(next, delta);
+  }
+  return { playlist: next, version: nextVersion, complete: true };
+};
+
 /**
  * Custom hook to manage playlist data and room interactions
  * @param {string} roomName - The name of the current room
  * @param {boolean} isHost - Whether the current user is the host of the room
+ * @param {Object} socket - Connected room socket (null while disconnected); playlist
+ *   changes then arrive as playlist_delta events
  */
-const usePlaylist = (roomName, isHost) => {
+const usePlaylist = (roomName, isHost, socket = null) => {
   // State for playlist and related data
   const [playlist, setPlaylist] = useState([]);
   const [pendingRequests, setPendingRequests] = useState([]);
@@ -24,6 +84,92 @@ const usePlaylist = (roomName, isHost) => {
   const mountedRef = useRef(true);
   const pollAttemptsRef = useRef(0);
 
+  // Playlist version the local copy reflects, the full re-fetch in flight (if any) and the
+  // deltas received while it runs
+  const versionRef = useRef(0);
+  const resyncPromiseRef = useRef(null);
+  const queuedDeltasRef = useRef([]);
+  const deltaListenerAttachedRef = useRef(false);
+
+  // Whether our own changes will come back as socket deltas (so responses can skip the playlist)
+  const deltaSync = Boolean(socket);
+
+  /**
+   * Re-fetch the whole playlist, used when a delta reveals a version gap and for manual
+   * refreshes. Deltas received during the fetch are replayed on top of it.
+   * @returns {Promise<Array|null>} The up-to-date playlist, or null if the fetch failed
+   */
+  const resyncPlaylist = useCallback(() => {
+    if (!roomName) return Promise.resolve(null);
+    if (resyncPromiseRef.current) return resyncPromiseRef.current;
+
+    const resync = (async () => {
+      try {
+        for (;;) {
+          const response = await fetch(`${API_URL}/api/room-playlist?room_name=${encodeURIComponent(roomName)}`);
+          if (!response.ok) {
+            throw new Error(`Failed to fetch playlist (${response.status})`);
+          }
+          const data = await response.json();
+          if (!mountedRef.current) return null;
+
+          const queued = queuedDeltasRef.current;
+          queuedDeltasRef.current = [];
+          const { playlist: next, version, complete } =
+            applyPlaylistDeltas(data.playlist || [], data.version || 0, queued);
+          versionRef.current = version;
+          setPlaylist(next);
+          // A delta missed during the fetch means fetching again
+          if (complete) return next;
+        }
+      } catch (err) {
+        console.error('Error re-syncing playlist:', err);
+        queuedDeltasRef.current = [];
+        return null;
+      } finally {
+        resyncPromiseRef.current = null;
+      }
+    })();
+    resyncPromiseRef.current = resync;
+    return resync;
+  }, [roomName]);
+
+  // Apply playlist deltas pushed to the room, re-fetching when one was missed
+  useEffect(() => {
+    if (!socket) return;
+
+    const handlePlaylistDelta = (delta) => {
+      if (delta.room_name !== roomName) return;
+      if (resyncPromiseRef.current) {
+        // Replayed once the fetch tells which version it reflects
+        queuedDeltasRef.current.push(delta);
+        return;
+      }
+      if (delta.version <= versionRef.current) return;  // already reflected
+
+      if (delta.op === 'reset' || delta.version !== versionRef.current + 1) {
+        // Kept for the replay in case the fetch reads an older version
+        queuedDeltasRef.current.push(delta);
+        resyncPlaylist();
+        return;
+      }
+      versionRef.current = delta.version;
+      setPlaylist(prev => applyPlaylistDelta(prev, delta));
+    };
+
+    socket.on('playlist_delta', handlePlaylistDelta);
+
+    // Deltas sent while the socket was disconnected are lost, so re-sync after a reconnect
+    if (deltaListenerAttachedRef.current) {
+      resyncPlaylist();
+    }
+    deltaListenerAttachedRef.current = true;
+
+    return () => {
+      socket.off('playlist_delta', handlePlaylistDelta);
+    };
+  }, [socket, roomName, resyncPlaylist]);
+
   // Debounced fetch function to prevent rapid repeated calls
   const fetchPendingRequests = useCallback(
     debounce(async () => {
@@ -89,6 +235,7 @@ const usePlaylist = (roomName, isHost) => {
         const data = await response.json();
         
         if (mountedRef.current) {
+          versionRef.current = data.version || 0;
           setPlaylist(data.playlist || []);
           setIntroduction(data.introduction || '');
           setSettings(data.settings || {});
@@ -142,15 +289,17 @@ const usePlaylist = (roomName, isHost) => {
     };
   }, [roomName, isHost, fetchPendingRequests]);
 
-  // Track deletion handler
+  // Track deletion handler (without a playlist the removal arrives as a delta)
   const handleTrackDelete = (newPlaylist) => {
-    setPlaylist(newPlaylist);
+    if (Array.isArray(newPlaylist)) {
+      setPlaylist(newPlaylist);
+    }
   };
 
   // Approve request handler
   const handleApproveRequest = (data) => {
-    // Update the main playlist with the newly approved track
-    setPlaylist(prev => [...prev, data.approved_track]);
+    // Update the main playlist with the newly approved track (no-op if its delta arrived first)
+    setPlaylist(prev => applyPlaylistDelta(prev, { op: 'append', tracks: [data.approved_track] }));
     
     // Remove the track from pending requests
     setPendingRequests(prev => 
@@ -248,7 +397,8 @@ const usePlaylist = (roomName, isHost) => {
           track_id: trackToPin.song_id,
           current_playing_index: currentPlayingIndex,
           selected_index: actualIndex,
-          is_guest_pin: isGuestPin // Flag to indicate if this is a guest pin
+          is_guest_pin: isGuestPin, // Flag to indicate if this is a guest pin
+          return_playlist: !deltaSync // The move arrives as a delta when the socket is connected
         })
       });
 
@@ -257,7 +407,11 @@ const usePlaylist = (roomName, isHost) => {
       }
 
       const data = await response.json();
-      return data.playlist;
+      if (data.playlist) {
+        versionRef.current = Math.max(versionRef.current, data.version || 0);
+        return data.playlist;
+      }
+      return true;
       
     } catch (error) {
       console.error('Error pinning track:', error);
@@ -372,6 +526,8 @@ const usePlaylist = (roomName, isHost) => {
     hostData,
     loading,
     error,
+    deltaSync,
+    resyncPlaylist,
     handleTrackDelete,
     handleApproveRequest,
     handleRejectRequest,